@@ -0,0 +1,145 @@
+"""
+Compact per-attempt answer sheet
+One byte per question holds the chosen option and two bitsets hold flagged and revealed
+questions, so a 1,000-question attempt is about 1.25 KB however far it has got. Updates
+are O(1) and the whole sheet serializes to a short binary blob for autosave and export
+"""
+import struct
+import sys
+
+import numpy as np
+
+from exam_schema import OPTION_KEYS
+from item_analysis import FLAGGED
+
+# magic, format version, question count
+HEADER = struct.Struct('<4sBI')
+MAGIC = b'PXAS'
+VERSION = 1
+
+# Byte values in the answer array: 0 is unanswered, 1-4 are options A-D
+_NO_ANSWER = 0
+_OPTION_BYTE = {opt: code + 1 for code, opt in enumerate(OPTION_KEYS)}
+
+
+class AnswerSheet:
+    """Chosen options plus flagged and revealed bitsets for one attempt"""
+
+    __slots__ = ('question_count', '_answers', '_flagged', '_revealed', 'answered_count', 'flagged_count')
+
+    def __init__(self, question_count):
+        self.question_count = question_count
+        self._answers = bytearray(question_count)
+        self._flagged = bytearray((question_count + 7) // 8)
+        self._revealed = bytearray((question_count + 7) // 8)
+        self.answered_count = 0
+        self.flagged_count = 0
+
+    def __len__(self):
+        return self.question_count
+
+    def __sizeof__(self):
+        return (object.__sizeof__(self) + sys.getsizeof(self._answers)
+                + sys.getsizeof(self._flagged) + sys.getsizeof(self._revealed))
+
+    def __eq__(self, other):
+        return isinstance(other, AnswerSheet) and self.to_bytes() == other.to_bytes()
+
+    def __repr__(self):
+        return (f"AnswerSheet({self.question_count} questions, {self.answered_count} answered, "
+                f"{self.flagged_count} flagged)")
+
+    @staticmethod
+    def _test(bits, idx):
+        return bool(bits[idx >> 3] & (1 << (idx & 7)))
+
+    @staticmethod
+    def _set(bits, idx):
+        bits[idx >> 3] |= 1 << (idx & 7)
+
+    def answer(self, idx):
+        """Chosen option letter, or None"""
+        value = self._answers[idx]
+        return OPTION_KEYS[value - 1] if value else None
+
+    def is_answered(self, idx):
+        return self._answers[idx] != _NO_ANSWER
+
+    def is_flagged(self, idx):
+        return self._test(self._flagged, idx)
+
+    def is_revealed(self, idx):
+        return self._test(self._revealed, idx)
+
+    def is_closed(self, idx):
+        """True once a question has been answered or flagged and cannot change"""
+        return self.is_answered(idx) or self.is_flagged(idx)
+
+    def set_answer(self, idx, option):
+        if not self._answers[idx]:
+            self.answered_count += 1
+        self._answers[idx] = _OPTION_BYTE[option]
+
+    def flag(self, idx):
+        if not self.is_flagged(idx):
+            self._set(self._flagged, idx)
+            self.flagged_count += 1
+
+    def reveal(self, idx):
+        self._set(self._revealed, idx)
+
+    def answers(self):
+        """Iterate (idx, option) over answered questions in index order"""
+        for idx in np.flatnonzero(np.frombuffer(bytes(self._answers), dtype=np.uint8)):
+            yield int(idx), OPTION_KEYS[self._answers[idx] - 1]
+
+    def flagged(self):
+        """Flagged question indices in order"""
+        bits = np.unpackbits(np.frombuffer(bytes(self._flagged), dtype=np.uint8), bitorder='little')
+        return [int(idx) for idx in np.flatnonzero(bits[:self.question_count])]
+
+    def codes(self):
+        """int8 array in the item-analysis encoding: option 0-3, UNANSWERED or FLAGGED"""
+        codes = np.frombuffer(bytes(self._answers), dtype=np.uint8).astype(np.int8) - 1
+        bits = np.unpackbits(np.frombuffer(bytes(self._flagged), dtype=np.uint8), bitorder='little')
+        codes[bits[:self.question_count].astype(bool)] = FLAGGED
+        return codes
+
+    def to_bytes(self):
+        """Binary form: header, answer bytes, flagged bits, revealed bits"""
+        return b''.join((HEADER.pack(MAGIC, VERSION, self.question_count),
+                         self._answers, self._flagged, self._revealed))
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, question_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not an answer sheet")
+        sheet = cls(question_count)
+        bitset_size = len(sheet._flagged)
+        offset = HEADER.size
+        expected = offset + question_count + 2 * bitset_size
+        if len(data) != expected:
+            raise ValueError(f"answer sheet is {len(data)} bytes, expected {expected}")
+        sheet._answers[:] = data[offset:offset + question_count]
+        offset += question_count
+        sheet._flagged[:] = data[offset:offset + bitset_size]
+        sheet._revealed[:] = data[offset + bitset_size:]
+        sheet.answered_count = question_count - sheet._answers.count(_NO_ANSWER)
+        sheet.flagged_count = sum(bin(byte).count('1') for byte in sheet._flagged)
+        return sheet
+
+    @classmethod
+    def from_answers(cls, question_count, answers, flagged=(), revealed=None):
+        """Build a sheet from an {idx: option} dict and flagged indices
+
+        Answered questions are revealed unless revealed is given explicitly.
+        """
+        sheet = cls(question_count)
+        for idx, option in answers.items():
+            sheet.set_answer(idx, option)
+        for idx in flagged:
+            sheet.flag(idx)
+        for idx in answers if revealed is None else revealed:
+            sheet.reveal(idx)
+        return sheet
@@ -3,9 +3,30 @@ Physiotherapy Exam System - Streamlit Version
 Beautiful, fast, and deployable to Streamlit Cloud
 """
 import streamlit as st
+import streamlit.components.v1 as components
 import json
 from datetime import datetime, timedelta
 import time
+import uuid
+from contextlib import nullcontext
+
+from answer_sheet import AnswerSheet
+from attempt_clock import DeadlineSweeper, watchdog_interval
+from attempt_journal import AttemptJournal
+from attempt_permutation import AttemptPermutation
+from attempt_store import AttemptStore
+from cohort import CohortRegistry
+from dedup import SCAN_FAILED, DuplicateScanner
+from exam_catalog import CATALOG_URL, ExamCatalog
+from exam_registry import ExamRegistry, estimate_size, thaw
+from exam_sampler import ExamSampler, error_weights, sampled_exam
+from exam_schema import difficulty_breakdown
+from image_cache import ImageCache
+from item_analysis import exam_quality_report
+from metrics import METRICS, METRICS_FILE, METRICS_PORT, PROFILE_DIR, SlowRerunProfiler
+from review_scheduler import ReviewScheduler, grade
+from scoring import ScoreTally
+from search_index import SearchIndex, hits_to_exam
 
 # Page configuration
 st.set_page_config(
@@ -194,10 +215,8 @@ if 'exam_data' not in st.session_state:
     st.session_state.exam_data = None
 if 'current_question' not in st.session_state:
     st.session_state.current_question = 0
-if 'answers' not in st.session_state:
-    st.session_state.answers = {}
-if 'flagged' not in st.session_state:
-    st.session_state.flagged = set()
+if 'sheet' not in st.session_state:
+    st.session_state.sheet = None
 if 'exam_started' not in st.session_state:
     st.session_state.exam_started = False
 if 'exam_finished' not in st.session_state:
@@ -206,58 +225,460 @@ if 'start_time' not in st.session_state:
     st.session_state.start_time = None
 if 'duration_minutes' not in st.session_state:
     st.session_state.duration_minutes = 90
-if 'show_explanation' not in st.session_state:
-    st.session_state.show_explanation = {}
-if 'exam_history' not in st.session_state:
-    st.session_state.exam_history = []
+if 'exam_hash' not in st.session_state:
+    st.session_state.exam_hash = None
+if 'attempt_id' not in st.session_state:
+    st.session_state.attempt_id = None
+if 'deadline' not in st.session_state:
+    st.session_state.deadline = None
+if 'score_tally' not in st.session_state:
+    st.session_state.score_tally = None
+if 'response_times' not in st.session_state:
+    st.session_state.response_times = {}
+if 'last_result' not in st.session_state:
+    st.session_state.last_result = None
+if 'shuffle' not in st.session_state:
+    st.session_state.shuffle = True
+if 'permutation' not in st.session_state:
+    st.session_state.permutation = None
+if 'cohort' not in st.session_state:
+    st.session_state.cohort = None
+
+# st.iframe replaces components.html in newer Streamlit releases
+render_html = getattr(st, 'iframe', None) or components.html
+
+@st.cache_resource
+def get_exam_registry():
+    """Shared exam registry for every session in this server process"""
+    return ExamRegistry()
+
+@st.cache_resource
+def get_deadline_sweeper():
+    """Shared background sweeper that expires attempts past their deadline"""
+    return DeadlineSweeper()
+
+@st.cache_resource
+def get_attempt_journal():
+    """Shared autosave journal; attempts expired by the sweeper are closed in it too"""
+    journal = AttemptJournal()
+    get_deadline_sweeper().add_listener(journal.record_finish)
+    return journal
+
+@st.cache_resource
+def get_attempt_store():
+    """Shared SQLite store for attempts, responses and dashboard aggregates"""
+    return AttemptStore()
+
+@st.cache_resource
+def get_review_scheduler():
+    """Shared spaced-repetition queues for every candidate"""
+    return ReviewScheduler()
+
+@st.cache_resource
+def get_cohort_registry():
+    """Shared cohort schedule and live aggregators; expired cohort attempts are closed in it too"""
+    registry = CohortRegistry()
+    get_deadline_sweeper().add_listener(registry.expire)
+    return registry
+
+@st.cache_resource
+def get_image_cache():
+    """Shared display-sized question images, cached in memory and on disk"""
+    return ImageCache()
+
+@st.cache_resource
+def get_exam_catalog():
+    """Shared local cache of catalog banks, kept in sync in the background when a catalog url is set"""
+    catalog = ExamCatalog()
+    if CATALOG_URL:
+        catalog.start()
+    return catalog
+
+@st.cache_resource
+def get_search_index():
+    """Shared full-text index over every question bank loaded so far"""
+    return SearchIndex()
+
+@st.cache_resource
+def start_metrics():
+    """Register gauges and start the metrics exporters once per server process
+
+    Returns the slow-rerun profiler when profiling is enabled, else None.
+    """
+    METRICS.gauges.register("exam_registry", "Exam registry cache statistics", get_exam_registry().stats)
+    METRICS.gauges.register("image_cache", "Question image cache statistics", get_image_cache().stats)
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+    if METRICS_FILE:
+        METRICS.write_periodically(METRICS_FILE)
+    return SlowRerunProfiler(PROFILE_DIR) if PROFILE_DIR else None
+
+def session_state_size():
+    """Approximate bytes held by this session, excluding the shared exam"""
+    return sum(estimate_size(value) for key, value in st.session_state.to_dict().items() if key != 'exam_data')
+
+@st.cache_data(max_entries=32)
+def get_quality_report(exam_hash, attempt_count, _questions):
+    """Item analysis for an exam, recomputed only when new attempts have been recorded"""
+    with METRICS.step('quality_report'):
+        return exam_quality_report(get_attempt_store(), exam_hash, _questions)
+
+@st.cache_resource
+def get_duplicate_scanner():
+    """Near-duplicate counts per exam file, computed off the script thread"""
+    return DuplicateScanner()
+
+@st.cache_resource(max_entries=8)
+def get_exam_sampler(exam_hash, _questions):
+    """Per-bank stratum index arrays, built once and shared by every session"""
+    return ExamSampler(_questions)
+
+def get_user_id():
+    """Identify the candidate; kept in the URL so history follows them across sessions"""
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = st.query_params.get('user') or f"guest-{uuid.uuid4().hex[:8]}"
+        st.query_params['user'] = st.session_state.user_id
+    return st.session_state.user_id
+
+def change_user_id():
+    """Switch to the candidate ID typed on the welcome screen"""
+    user_id = st.session_state.user_id_input.strip()
+    if user_id:
+        st.session_state.user_id = user_id
+        st.query_params['user'] = user_id
+
+def journal_state():
+    """Snapshot of the current attempt for journal compaction"""
+    return {
+        'attempt_id': st.session_state.attempt_id,
+        'exam_hash': st.session_state.exam_hash,
+        'start_time': st.session_state.start_time.isoformat(),
+        'deadline': st.session_state.deadline,
+        'duration_minutes': st.session_state.duration_minutes,
+        'sheet': st.session_state.sheet,
+        'current_question': st.session_state.current_question,
+        'finished': st.session_state.exam_finished,
+        'shuffle': st.session_state.shuffle,
+        'cohort_id': st.session_state.cohort and st.session_state.cohort['cohort_id'],
+    }
+
+def autosave(compaction_due):
+    """Compact the journal when enough records have accumulated"""
+    if compaction_due:
+        get_attempt_journal().snapshot(journal_state())
+
+def resume_attempt():
+    """Restore an in-progress attempt named in the URL after a reconnect or restart"""
+    if st.session_state.get('resume_checked'):
+        return
+    st.session_state.resume_checked = True
+    
+    attempt_id = st.query_params.get('attempt')
+    if not attempt_id or st.session_state.exam_started:
+        return
+    
+    state = get_attempt_journal().restore(attempt_id)
+    if not state:
+        del st.query_params['attempt']
+        return
+    
+    exam_hash, exam_data = get_exam_registry().load_by_hash(state['exam_hash'])
+    if exam_data is None:
+        st.warning("The exam for your previous attempt is no longer available.")
+        del st.query_params['attempt']
+        return
+    
+    st.session_state.exam_data = exam_data
+    st.session_state.exam_hash = exam_hash
+    st.session_state.attempt_id = attempt_id
+    st.session_state.start_time = datetime.fromisoformat(state['start_time'])
+    st.session_state.deadline = state['deadline']
+    st.session_state.duration_minutes = state['duration_minutes']
+    # Journals written before answer sheets hold an answers dict and a flagged list
+    sheet = state['sheet'] if 'sheet' in state else AnswerSheet.from_answers(
+        len(exam_data['questions']), state['answers'], state['flagged']
+    )
+    st.session_state.sheet = sheet
+    st.session_state.current_question = state['current_question']
+    st.session_state.shuffle = state.get('shuffle', False)
+    permutation = get_permutation()
+    answers = dict(sheet.answers())
+    for idx, answer in answers.items():
+        st.session_state[f"q_{idx}"] = permutation.to_display(idx, answer)
+    st.session_state.score_tally = ScoreTally.from_answers(exam_data['questions'], answers, set(sheet.flagged()))
+    st.session_state.exam_started = True
+    st.session_state.exam_finished = state['finished'] or time.time() >= state['deadline']
+    if not st.session_state.exam_finished:
+        get_deadline_sweeper().register(attempt_id, state['deadline'])
+    if state.get('cohort_id'):
+        rejoin_cohort(state['cohort_id'])
+
+def rejoin_cohort(cohort_id):
+    """Put a resumed attempt back on its cohort's live dashboard with its progress so far"""
+    registry = get_cohort_registry()
+    cohort = registry.get(cohort_id)
+    if cohort is None:
+        return
+    st.session_state.cohort = cohort
+    registry.join(
+        cohort, st.session_state.attempt_id, get_user_id(),
+        answered=st.session_state.sheet.answered_count,
+        correct=st.session_state.score_tally.correct,
+        flagged=st.session_state.sheet.flagged_count,
+        finished=st.session_state.exam_finished
+    )
+
+def join_cohort():
+    """Load the cohort exam named in the URL into a new session"""
+    if st.session_state.get('cohort_checked'):
+        return
+    st.session_state.cohort_checked = True
+    
+    cohort_id = st.query_params.get('cohort')
+    if not cohort_id or st.session_state.exam_started:
+        return
+    
+    cohort = get_cohort_registry().get(cohort_id)
+    exam_data = None
+    if cohort:
+        exam_hash, exam_data = get_exam_registry().load_by_hash(cohort['exam_hash'])
+    if exam_data is None:
+        st.warning("This cohort exam link is not valid on this server.")
+        del st.query_params['cohort']
+        return
+    
+    st.session_state.exam_data = exam_data
+    st.session_state.exam_hash = exam_hash
+    st.session_state.cohort = cohort
+
+def cohort_aggregator():
+    """Live aggregator for the current attempt's cohort, or None outside cohort mode"""
+    if not st.session_state.cohort:
+        return None
+    return get_cohort_registry().aggregator(st.session_state.cohort)
+
+def reset_exam():
+    """Clear the current exam and attempt from the session"""
+    if st.session_state.attempt_id:
+        get_deadline_sweeper().cancel(st.session_state.attempt_id)
+        get_attempt_journal().discard(st.session_state.attempt_id)
+    for param in ('attempt', 'cohort'):
+        if param in st.query_params:
+            del st.query_params[param]
+    
+    st.session_state.exam_data = None
+    st.session_state.exam_hash = None
+    st.session_state.current_question = 0
+    st.session_state.sheet = None
+    st.session_state.exam_started = False
+    st.session_state.exam_finished = False
+    st.session_state.start_time = None
+    st.session_state.attempt_id = None
+    st.session_state.deadline = None
+    st.session_state.score_tally = None
+    st.session_state.response_times = {}
+    st.session_state.question_shown = None
+    st.session_state.review_focus = None
+    st.session_state.permutation = None
+    st.session_state.cohort = None
 
 def load_exam_file(uploaded_file):
     """Load exam from uploaded JSON file"""
+    return load_exam_bytes(uploaded_file.getvalue())
+
+def load_exam_bytes(data):
+    """Parse (or reuse) an exam from raw file bytes and queue it for the search index"""
     try:
-        exam_data = json.load(uploaded_file)
+        with METRICS.step('exam_load'):
+            exam_hash, exam_data = get_exam_registry().load(data)
+        st.session_state.exam_hash = exam_hash
+        get_search_index().submit(exam_hash, exam_data)
         return exam_data
-    except Exception as e:
+    except ValueError as e:
         st.error(f"Error loading exam file: {e}")
         return None
 
+def load_catalog_exam(entry):
+    """Load a catalog bank; its revision is its registry key, so a parsed copy is reused as is"""
+    exam_data = get_exam_registry().get(entry['revision'])
+    if exam_data is not None:
+        st.session_state.exam_hash = entry['revision']
+        return exam_data
+    data = get_exam_catalog().read(entry['id'])
+    if data is None:
+        st.error("This exam is no longer in the local catalog.")
+        return None
+    return load_exam_bytes(data)
+
+def get_permutation():
+    """The current attempt's question and option order, rebuilt from its id when needed"""
+    permutation = st.session_state.permutation
+    if permutation is None or st.session_state.get('permutation_attempt') != st.session_state.attempt_id:
+        permutation = AttemptPermutation.for_attempt(
+            st.session_state.attempt_id,
+            len(st.session_state.exam_data['questions']),
+            shuffle=st.session_state.shuffle
+        )
+        st.session_state.permutation = permutation
+        st.session_state.permutation_attempt = st.session_state.attempt_id
+    return permutation
+
 def calculate_score():
     """Calculate exam score"""
-    if not st.session_state.exam_data:
+    if not st.session_state.score_tally:
         return 0, 0, 0
     
+    with METRICS.step('scoring'):
+        return st.session_state.score_tally.score()
+
+def attempt_responses():
+    """Per-question (idx, answer, is_correct, flagged, time_spent) rows for the store"""
     questions = st.session_state.exam_data['questions']
-    total = len(questions)
-    flagged_count = len(st.session_state.flagged)
-    valid_total = total - flagged_count
+    sheet = st.session_state.sheet
+    times = st.session_state.response_times
+    for idx in range(len(questions)):
+        answer = sheet.answer(idx)
+        is_correct = answer is not None and answer == questions[idx]['correct_answer']
+        yield idx, answer, is_correct, sheet.is_flagged(idx), times.get(idx)
+
+def record_result():
+    """Commit the current attempt to history exactly once and return its result"""
+    result = st.session_state.last_result
+    if result and result['attempt_id'] == st.session_state.attempt_id:
+        return result
     
-    correct = 0
-    for idx, q in enumerate(questions):
-        if idx in st.session_state.flagged:
+    correct, total, percentage = calculate_score()
+    result = {
+        'attempt_id': st.session_state.attempt_id,
+        'user_id': get_user_id(),
+        'exam_hash': st.session_state.exam_hash,
+        'exam_title': st.session_state.exam_data['exam_title'],
+        'started_at': st.session_state.start_time.timestamp(),
+        'finished_at': time.time(),
+        'correct': correct,
+        'total': total,
+        'percentage': percentage,
+        'flagged': st.session_state.sheet.flagged_count
+    }
+    # INSERT OR IGNORE on the attempt id keeps this idempotent across sessions and resumes
+    with METRICS.step('record_result'):
+        if get_attempt_store().record_attempt(result, attempt_responses()):
+            schedule_reviews()
+    st.session_state.last_result = result
+    return result
+
+def schedule_reviews():
+    """Feed the finished attempt into the candidate's spaced-repetition queue"""
+    exam_hash = st.session_state.exam_hash
+    # Questions of drawn or review exams are scheduled against the exam they came from
+    sources = get_attempt_store().question_sources(exam_hash)
+    reviews = []
+    suspended = []
+    for idx, answer, is_correct, flagged, time_spent in attempt_responses():
+        card = sources.get(idx, (exam_hash, idx))
+        if flagged:
+            suspended.append(card)
+        elif answer is not None:
+            reviews.append((*card, grade(answer, is_correct, time_spent)))
+    scheduler = get_review_scheduler()
+    scheduler.review(get_user_id(), reviews)
+    scheduler.suspend(get_user_id(), suspended)
+
+# Questions per "Review due questions" session
+REVIEW_SESSION_SIZE = 30
+
+def load_review_exam():
+    """Build an exam from the candidate's most overdue review cards"""
+    questions = []
+    sources = []
+    exams = {}
+    registry = get_exam_registry()
+    for exam_hash, idx in get_review_scheduler().due(get_user_id(), REVIEW_SESSION_SIZE):
+        if exam_hash not in exams:
+            exams[exam_hash] = registry.load_by_hash(exam_hash)[1]
+        source = exams[exam_hash]
+        if source is None or idx >= len(source['questions']):
             continue
-        if idx in st.session_state.answers:
-            if st.session_state.answers[idx] == q['correct_answer']:
-                correct += 1
-    
-    percentage = (correct / valid_total * 100) if valid_total > 0 else 0
+        questions.append(thaw(source['questions'][idx]))
+        sources.append((exam_hash, idx))
+    if not questions:
+        return None
     
-    return correct, valid_total, percentage
+    exam = {
+        'exam_title': "Review: Due Questions",
+        'total_questions': len(questions),
+        'difficulty_breakdown': difficulty_breakdown(questions),
+        'questions': questions
+    }
+    exam_hash, exam_data = registry.load(json.dumps(exam).encode('utf-8'))
+    get_attempt_store().record_question_sources(exam_hash, sources)
+    st.session_state.exam_hash = exam_hash
+    return exam_data
+
+def record_response_time(idx):
+    """Store how long the candidate spent on a question before answering or flagging"""
+    shown_at = st.session_state.get('question_shown_at')
+    if shown_at:
+        st.session_state.response_times[idx] = time.time() - shown_at
 
 def get_time_remaining():
     """Get remaining time in seconds"""
-    if not st.session_state.start_time:
+    if not st.session_state.deadline:
         return st.session_state.duration_minutes * 60
     
-    elapsed = (datetime.now() - st.session_state.start_time).total_seconds()
-    remaining = (st.session_state.duration_minutes * 60) - elapsed
+    remaining = st.session_state.deadline - time.time()
     
     return max(0, int(remaining))
 
+def deadline_passed():
+    """Check the server-side deadline for the current attempt"""
+    if not st.session_state.deadline:
+        return False
+    if time.time() >= st.session_state.deadline:
+        return True
+    return get_deadline_sweeper().is_expired(st.session_state.attempt_id)
+
+def start_attempt():
+    """Begin a new attempt with an absolute deadline"""
+    cohort = st.session_state.cohort
+    st.session_state.attempt_id = uuid.uuid4().hex
+    if cohort:
+        # Everyone in a cohort shares its start time and deadline, however late they join
+        st.session_state.start_time = datetime.fromtimestamp(cohort['start_at'])
+        st.session_state.deadline = cohort['deadline']
+        st.session_state.duration_minutes = round((cohort['deadline'] - cohort['start_at']) / 60)
+        st.session_state.shuffle = cohort['shuffle']
+    else:
+        st.session_state.start_time = datetime.now()
+        st.session_state.deadline = time.time() + st.session_state.duration_minutes * 60
+    question_count = len(st.session_state.exam_data['questions'])
+    st.session_state.sheet = AnswerSheet(question_count)
+    st.session_state.score_tally = ScoreTally(question_count)
+    st.session_state.exam_started = True
+    get_deadline_sweeper().register(st.session_state.attempt_id, st.session_state.deadline)
+    
+    # Autosave: the attempt id in the URL lets a reconnecting browser resume
+    get_attempt_journal().start(
+        st.session_state.attempt_id,
+        question_count,
+        exam_hash=st.session_state.exam_hash,
+        start_time=st.session_state.start_time.isoformat(),
+        deadline=st.session_state.deadline,
+        duration_minutes=st.session_state.duration_minutes,
+        shuffle=st.session_state.shuffle,
+        cohort_id=cohort and cohort['cohort_id']
+    )
+    st.query_params['attempt'] = st.session_state.attempt_id
+    if cohort:
+        get_cohort_registry().join(cohort, st.session_state.attempt_id, get_user_id())
+
 def format_time(seconds):
     """Format seconds to MM:SS"""
     minutes = seconds // 60
     secs = seconds % 60
     return f"{minutes:02d}:{secs:02d}"
 
+@METRICS.timed_screen('welcome')
 def show_welcome_screen():
     """Display welcome screen"""
     st.markdown('<div class="header-title">🎓 Physiotherapy Exam System</div>', unsafe_allow_html=True)
@@ -266,10 +687,20 @@ def show_welcome_screen():
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col2:
+        st.text_input(
+            "Candidate ID",
+            value=get_user_id(),
+            key="user_id_input",
+            on_change=change_user_id,
+            help="Your exam history is saved under this ID"
+        )
+        
+        show_exam_catalog()
+        
         st.markdown("### 📂 Load Exam File")
         uploaded_file = st.file_uploader(
             "Upload your exam JSON file",
-            type=['json'],
+            type=['json', 'pxqb'],
             help="Load an exam file generated by the Question Generator"
         )
         
@@ -279,18 +710,30 @@ def show_welcome_screen():
                 st.session_state.exam_data = exam_data
                 st.success(f"✅ Loaded: {exam_data['exam_title']}")
                 st.rerun()
+        
+        due = get_review_scheduler().due_count(get_user_id())
+        if due:
+            if st.button(f"🔁 Review Due Questions ({due} due)", use_container_width=True):
+                exam_data = load_review_exam()
+                if exam_data:
+                    st.session_state.exam_data = exam_data
+                    st.rerun()
+                st.warning("The exams these questions came from are no longer available")
+        
+        show_exam_builder()
     
     # Show statistics if available
-    if st.session_state.exam_history:
+    summary = get_attempt_store().user_summary(get_user_id())
+    if summary:
         st.markdown("---")
         st.markdown("### 📊 Your Performance")
         
         col1, col2, col3, col4 = st.columns(4)
         
-        total_exams = len(st.session_state.exam_history)
-        avg_score = sum(h['percentage'] for h in st.session_state.exam_history) / total_exams
-        best_score = max(h['percentage'] for h in st.session_state.exam_history)
-        worst_score = min(h['percentage'] for h in st.session_state.exam_history)
+        total_exams = summary['attempts']
+        avg_score = summary['average']
+        best_score = summary['best']
+        worst_score = summary['worst']
         
         with col1:
             st.markdown(f"""
@@ -324,6 +767,170 @@ def show_welcome_screen():
             </div>
             """, unsafe_allow_html=True)
 
+def show_exam_catalog():
+    """Pick an exam from the synced catalog instead of uploading it"""
+    banks = get_exam_catalog().banks()
+    if not banks:
+        return
+    
+    st.markdown("### 📚 Exam Catalog")
+    entry = st.selectbox("Choose an exam", banks, format_func=lambda entry: entry['title'],
+                         label_visibility="collapsed")
+    if st.button("Load Selected Exam", type="primary", use_container_width=True):
+        exam_data = load_catalog_exam(entry)
+        if exam_data:
+            st.session_state.exam_data = exam_data
+            st.rerun()
+
+def show_exam_builder():
+    """Assemble a custom exam from every question bank loaded so far"""
+    with st.expander("🔎 Build an Exam from the Question Bank"):
+        indexing = get_search_index().indexing()
+        if indexing:
+            st.caption(f"⏳ {indexing} question bank{'s are' if indexing != 1 else ' is'} still being indexed "
+                       "and will be searchable shortly.")
+        with st.form("exam_builder"):
+            topics = st.text_input("Topics", placeholder='e.g. rotator cuff, "gait cycle"')
+            total = st.number_input("Number of questions", min_value=1, max_value=500, value=40)
+            difficulties = st.multiselect("Difficulty", ['easy', 'medium', 'hard'], default=['medium'])
+            fill = st.checkbox("Top up with other difficulties if there are not enough matches")
+            submitted = st.form_submit_button("Build Exam", use_container_width=True)
+        
+        if not submitted:
+            return
+        mix = {difficulty: 1 for difficulty in difficulties} or None
+        hits, shortfall = get_search_index().assemble(topics, int(total), difficulty_mix=mix, fill=fill)
+        if not hits:
+            st.warning("No questions match these topics")
+            return
+        short = ", ".join(f"{missing} {difficulty}" for difficulty, missing in shortfall.items())
+        if shortfall and not fill:
+            st.warning(f"Not enough matching questions: {short} short. Ask for fewer questions, "
+                       "or tick the top-up option to fill the gap with other difficulties.")
+            return
+        if shortfall:
+            topped_up = sum(shortfall.values())
+            st.toast(f"Not enough {'/'.join(shortfall)} matches, so {topped_up} "
+                     f"question{'s' if topped_up != 1 else ''} came from other difficulties", icon="⚠️")
+        if len(hits) < total:
+            st.toast(f"Only {len(hits)} of {int(total)} questions match these topics", icon="⚠️")
+        exam = hits_to_exam(hits, f"Custom Exam: {topics}", source_query=topics)
+        exam_hash, exam_data = get_exam_registry().load(json.dumps(exam).encode('utf-8'))
+        get_attempt_store().record_question_sources(exam_hash, ((hit['exam_hash'], hit['question_idx'])
+                                                                for hit in hits))
+        st.session_state.exam_hash = exam_hash
+        st.session_state.exam_data = exam_data
+        st.rerun()
+
+# Banks larger than this offer to draw a shorter exam from them
+SAMPLE_MIN_BANK_SIZE = 50
+
+def show_exam_sampler(exam_data):
+    """Draw a fresh exam from a large bank with difficulty and topic quotas"""
+    bank_hash = st.session_state.exam_hash
+    sampler = get_exam_sampler(bank_hash, exam_data['questions'])
+    
+    with st.expander("🎲 Draw a Fresh Exam from this Bank"):
+        with st.form("exam_sampler"):
+            total = st.number_input("Number of questions", min_value=1,
+                                    max_value=sampler.question_count, value=min(100, sampler.question_count))
+            cols = st.columns(len(sampler.difficulties))
+            mix = {}
+            for col, difficulty in zip(cols, sampler.difficulties):
+                with col:
+                    mix[difficulty] = st.number_input(f"{(difficulty or 'unlabelled').title()} %", min_value=0,
+                                                      max_value=100, value=100 // len(sampler.difficulties))
+            topics = [topic for topic in sampler.topics if topic]
+            chosen_topics = st.multiselect("Topics (all if empty)", topics) if topics else []
+            focus = st.checkbox("Focus on questions I have got wrong before")
+            submitted = st.form_submit_button("Draw Exam", use_container_width=True)
+        
+        if not submitted:
+            return
+        store = get_attempt_store()
+        weights = None
+        if focus:
+            counts = store.user_error_counts(get_user_id(), bank_hash)
+            weights = error_weights(counts, sampler.question_count)
+        try:
+            indices = sampler.sample(
+                int(total),
+                difficulty_mix=mix if any(mix.values()) else None,
+                topic_mix={topic: 1 for topic in chosen_topics} or None,
+                weights=weights
+            )
+        except ValueError as e:
+            st.error(str(e))
+            return
+        exam = sampled_exam(exam_data, indices, source_exam_hash=bank_hash)
+        exam_hash, drawn = get_exam_registry().load(json.dumps(exam).encode('utf-8'))
+        store.record_question_sources(exam_hash, ((bank_hash, idx) for idx in indices))
+        st.session_state.exam_hash = exam_hash
+        st.session_state.exam_data = drawn
+        st.rerun()
+
+# How often the setup screen checks whether the near-duplicate scan has finished
+DUPLICATE_POLL_SECONDS = 2
+
+def show_duplicate_warning(exam_hash, questions):
+    """Near-duplicate warning, filled in by a fragment once the background scan finishes"""
+    scanner = get_duplicate_scanner()
+    pending = scanner.count(exam_hash, questions) is None
+    
+    @st.fragment(run_every=timedelta(seconds=DUPLICATE_POLL_SECONDS) if pending else None)
+    def duplicate_warning():
+        duplicates = scanner.count(exam_hash, questions)
+        if duplicates is None:
+            st.caption("🔍 Checking for near-duplicate questions…")
+        elif pending:
+            # The scan just finished; a full rerun shows the result and drops the polling timer
+            st.rerun(scope="app")
+        elif duplicates == SCAN_FAILED:
+            st.caption("The near-duplicate check could not be run for this exam.")
+        elif duplicates:
+            st.warning(f"⚠️ {duplicates} questions look like near-duplicates of earlier ones in this exam, "
+                       "so the difficulty breakdown may overstate its coverage.")
+    
+    duplicate_warning()
+
+def show_question_quality(exam_data):
+    """Item-analysis summary from previous candidates' attempts at this exam"""
+    exam_hash = st.session_state.exam_hash
+    attempt_count = get_attempt_store().exam_attempt_count(exam_hash)
+    report = get_quality_report(exam_hash, attempt_count, exam_data['questions'])
+    if not report:
+        return
+    
+    flagged_items = [row for row in report if row['issues']]
+    with st.expander(f"🔍 Question Quality ({attempt_count} attempts, {len(flagged_items)} questions to review)"):
+        st.caption("p-value is the share of candidates answering correctly; discrimination is the "
+                   "correlation between getting the question right and the rest of the exam score.")
+        st.dataframe(flagged_items or report, hide_index=True, use_container_width=True)
+
+def show_cohort_scheduler(exam_data):
+    """Schedule this exam for a cohort sitting it together, with a proctor dashboard"""
+    with st.expander("👥 Schedule a Cohort Exam"):
+        with st.form("cohort_scheduler"):
+            starts_in = st.number_input("Starts in (minutes)", min_value=0, max_value=7 * 24 * 60, value=10)
+            duration = st.number_input("Duration (minutes)", min_value=5, max_value=600,
+                                       value=st.session_state.duration_minutes)
+            shuffle = st.checkbox("Shuffle question and answer order", value=True)
+            submitted = st.form_submit_button("Schedule Cohort", use_container_width=True)
+        
+        if submitted:
+            st.session_state.scheduled_cohort = get_cohort_registry().create(
+                st.session_state.exam_hash, exam_data['exam_title'], len(exam_data['questions']),
+                time.time() + starts_in * 60, duration, shuffle
+            )
+        
+        cohort = st.session_state.get('scheduled_cohort')
+        if cohort and cohort['exam_hash'] == st.session_state.exam_hash:
+            starts = datetime.fromtimestamp(cohort['start_at'])
+            st.success(f"Scheduled for {starts:%d %b %H:%M}, ending {datetime.fromtimestamp(cohort['deadline']):%H:%M}")
+            st.markdown(f"Candidate link: [?cohort={cohort['cohort_id']}](?cohort={cohort['cohort_id']})")
+            st.markdown(f"Proctor link (keep private): [?proctor={cohort['proctor_key']}](?proctor={cohort['proctor_key']})")
+
+@METRICS.timed_screen('setup')
 def show_exam_setup():
     """Display exam setup screen"""
     exam_data = st.session_state.exam_data
@@ -364,6 +971,15 @@ def show_exam_setup():
             </div>
             """, unsafe_allow_html=True)
         
+        show_duplicate_warning(st.session_state.exam_hash, exam_data['questions'])
+        
+        show_question_quality(exam_data)
+        
+        if len(exam_data['questions']) > SAMPLE_MIN_BANK_SIZE:
+            show_exam_sampler(exam_data)
+        
+        show_cohort_scheduler(exam_data)
+        
         st.markdown("### ⏱️ Exam Duration")
         
         duration = st.slider(
@@ -377,6 +993,12 @@ def show_exam_setup():
         
         st.session_state.duration_minutes = duration
         
+        st.session_state.shuffle = st.checkbox(
+            "Shuffle question and answer order",
+            value=st.session_state.shuffle,
+            help="Each attempt gets its own order, so answers cannot be shared by letter"
+        )
+        
         st.markdown(f"<p style='text-align: center; font-size: 1.2rem; color: #64748b;'>You will have <strong>{duration} minutes</strong> to complete {exam_data['total_questions']} questions</p>", unsafe_allow_html=True)
         
         st.markdown("")
@@ -385,33 +1007,201 @@ def show_exam_setup():
         
         with col_y:
             if st.button("🚀 Start Exam", type="primary", use_container_width=True):
-                st.session_state.exam_started = True
-                st.session_state.start_time = datetime.now()
+                start_attempt()
                 st.rerun()
 
-def show_exam_screen():
-    """Display exam question screen"""
+def finish_exam():
+    """Mark the exam as finished"""
+    st.session_state.exam_finished = True
+    if st.session_state.attempt_id:
+        get_deadline_sweeper().cancel(st.session_state.attempt_id)
+        get_attempt_journal().record_finish(st.session_state.attempt_id)
+        aggregator = cohort_aggregator()
+        if aggregator:
+            aggregator.finish(st.session_state.attempt_id)
+
+def next_question():
+    """Advance to the next question, or finish on the last one"""
+    if st.session_state.current_question < len(st.session_state.exam_data['questions']) - 1:
+        st.session_state.current_question += 1
+        autosave(get_attempt_journal().record_navigation(
+            st.session_state.attempt_id, st.session_state.current_question
+        ))
+    else:
+        finish_exam()
+
+def submit_answer(idx):
+    """Record the selected option for a question and reveal its explanation"""
+    if deadline_passed():
+        # Late submissions are not recorded
+        finish_exam()
+        return
+    if st.session_state.sheet.is_closed(idx):
+        return
+    
+    question = st.session_state.exam_data['questions'][idx]
+    # The radio holds the letter as displayed; answers are kept in canonical letters
+    answer = get_permutation().to_canonical(idx, st.session_state[f"q_{idx}"])
+    st.session_state.sheet.set_answer(idx, answer)
+    st.session_state.sheet.reveal(idx)
+    record_response_time(idx)
+    is_correct = answer == question['correct_answer']
+    st.session_state.score_tally.record_answer(is_correct, question.get('difficulty'))
+    autosave(get_attempt_journal().record_answer(st.session_state.attempt_id, idx, answer))
+    aggregator = cohort_aggregator()
+    if aggregator:
+        aggregator.record_answer(st.session_state.attempt_id, idx, is_correct)
+
+def flag_question(idx):
+    """Flag a question as irrelevant and move on"""
+    if deadline_passed():
+        finish_exam()
+        return
+    if st.session_state.sheet.is_closed(idx):
+        return
+    
+    st.session_state.sheet.flag(idx)
+    record_response_time(idx)
+    st.session_state.score_tally.record_flag(st.session_state.exam_data['questions'][idx].get('difficulty'))
+    autosave(get_attempt_journal().record_flag(st.session_state.attempt_id, idx))
+    aggregator = cohort_aggregator()
+    if aggregator:
+        aggregator.record_flag(st.session_state.attempt_id)
+    st.toast("Question flagged! It won't count towards your score.", icon="🚩")
+    next_question()
+
+def show_exam_timer():
+    """Exam countdown plus a watchdog that notices the deadline"""
+    show_countdown(get_time_remaining())
+    show_deadline_watchdog(st.session_state.deadline)
+
+def show_countdown(remaining):
+    """Countdown timer that ticks in the browser without server reruns"""
+    # The browser counts down from the server's remaining time, so client clock skew does not matter
+    render_html(f"""
+    <div id="timer" style="font-family: 'Source Sans Pro', sans-serif; font-weight: 700; font-size: 1.2rem; color: #1e293b;"></div>
+    <script>
+        const end = Date.now() + {remaining * 1000};
+        const timer = document.getElementById("timer");
+        function tick() {{
+            const left = Math.max(0, Math.round((end - Date.now()) / 1000));
+            const minutes = String(Math.floor(left / 60)).padStart(2, "0");
+            const seconds = String(left % 60).padStart(2, "0");
+            timer.textContent = "⏱️ " + minutes + ":" + seconds;
+            timer.style.color = left < 300 ? "#ef4444" : "#1e293b";
+            if (left > 0) setTimeout(tick, (end - Date.now()) % 1000 || 1000);
+        }}
+        tick();
+    </script>
+    """, height=40)
+
+def show_deadline_watchdog(deadline):
+    """Rerun once when the deadline is reached so expiry is noticed without an interaction"""
+    if not deadline:
+        return
+    armed = False
+
+    @st.fragment(run_every=timedelta(seconds=watchdog_interval(deadline)))
+    def deadline_watchdog():
+        nonlocal armed
+        if deadline_passed():
+            finish_exam()
+            st.rerun()
+        elif armed:
+            # The timer fired before the deadline; a full rerun re-arms it for the time left
+            st.rerun()
+        armed = True
+    
+    deadline_watchdog()
+
+def show_question_image(q):
+    """Display-sized image for a question that references one"""
+    ref = q.get('image')
+    if not ref:
+        return
+    image = get_image_cache().get(ref)
+    if image is None:
+        st.caption("🖼️ Image unavailable")
+        return
+    st.image(image[0], caption=q.get('image_caption'))
+
+def prefetch_question_image(position):
+    """Render the image of the question at a display position ahead of time"""
+    questions = st.session_state.exam_data['questions']
+    if position < len(questions):
+        ref = questions[get_permutation().question_at(position)].get('image')
+        if ref:
+            get_image_cache().prefetch(ref)
+
+def show_explanations(idx, current_q, user_answer):
+    """Display feedback and per-option explanations for an answered question"""
+    permutation = get_permutation()
+    correct_answer = current_q['correct_answer']
+    is_correct = user_answer == correct_answer
+    
+    if is_correct:
+        st.markdown("""
+        <div class="feedback-correct">
+            <strong style="color: #22c55e; font-size: 1.2rem;">✓ Correct!</strong>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown(f"""
+        <div class="feedback-incorrect">
+            <strong style="color: #ef4444; font-size: 1.2rem;">✗ Incorrect</strong><br>
+            <span style="color: #991b1b;">Correct answer: {permutation.to_display(idx, correct_answer)}</span>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("### 📚 Explanations")
+    
+    for label, opt in zip(['A', 'B', 'C', 'D'], permutation.options(idx)):
+        explanation = current_q['explanations'][opt]
+        
+        if opt == correct_answer:
+            css_class = "explanation-correct"
+            icon = "✓"
+            color = "#22c55e"
+        elif opt == user_answer and opt != correct_answer:
+            css_class = "explanation-incorrect"
+            icon = "✗"
+            color = "#ef4444"
+        else:
+            css_class = "explanation-neutral"
+            icon = "○"
+            color = "#64748b"
+        
+        st.markdown(f"""
+        <div class="explanation {css_class}">
+            <strong style="color: {color};">{icon} Option {label}:</strong><br>
+            <span style="color: {color};">{explanation}</span>
+        </div>
+        """, unsafe_allow_html=True)
+
+@st.fragment
+@METRICS.timed_screen('question_panel')
+def show_question_panel():
+    """Question card, answer controls and explanations; reruns without the rest of the page"""
+    if deadline_passed():
+        finish_exam()
+    if st.session_state.exam_finished:
+        # Finishing needs the full app to route to the results screen
+        st.rerun()
+    
     exam_data = st.session_state.exam_data
     questions = exam_data['questions']
-    current_idx = st.session_state.current_question
+    permutation = get_permutation()
+    position = st.session_state.current_question
+    current_idx = permutation.question_at(position)
     current_q = questions[current_idx]
     
-    # Top bar with progress and timer
-    col1, col2 = st.columns([3, 1])
+    if st.session_state.get('question_shown') != current_idx:
+        st.session_state.question_shown = current_idx
+        st.session_state.question_shown_at = time.time()
     
-    with col1:
-        progress = (current_idx + 1) / len(questions)
-        st.progress(progress)
-        st.markdown(f"<div class='progress-text'>Question {current_idx + 1} of {len(questions)}</div>", unsafe_allow_html=True)
-    
-    with col2:
-        remaining = get_time_remaining()
-        if remaining == 0:
-            st.session_state.exam_finished = True
-            st.rerun()
-        
-        timer_class = "timer-warning" if remaining < 300 else "timer-normal"
-        st.markdown(f"<div class='{timer_class}'>⏱️ {format_time(remaining)}</div>", unsafe_allow_html=True)
+    progress = (position + 1) / len(questions)
+    st.progress(progress)
+    st.markdown(f"<div class='progress-text'>Question {position + 1} of {len(questions)}</div>", unsafe_allow_html=True)
     
     # Question card
     st.markdown(f"""
@@ -419,16 +1209,20 @@ def show_exam_screen():
         <div class="question-text">{current_q['question']}</div>
     </div>
     """, unsafe_allow_html=True)
+    show_question_image(current_q)
+    # The next image renders in the background while this question is read
+    prefetch_question_image(position + 1)
     
     # Options
-    answered = current_idx in st.session_state.answers
-    user_answer = st.session_state.answers.get(current_idx)
-    show_explanation = st.session_state.show_explanation.get(current_idx, False)
+    sheet = st.session_state.sheet
+    answered = sheet.is_answered(current_idx)
+    user_answer = sheet.answer(current_idx)
+    show_explanation = sheet.is_revealed(current_idx)
     
-    selected_option = st.radio(
+    st.radio(
         "Select your answer:",
         options=['A', 'B', 'C', 'D'],
-        format_func=lambda x: f"{x}. {current_q['options'][x]}",
+        format_func=lambda x: f"{x}. {current_q['options'][permutation.to_canonical(current_idx, x)]}",
         key=f"q_{current_idx}",
         disabled=answered,
         label_visibility="collapsed"
@@ -439,101 +1233,46 @@ def show_exam_screen():
     
     with col1:
         if not answered:
-            if st.button("🚩 Flag as Irrelevant", use_container_width=True):
-                st.session_state.flagged.add(current_idx)
-                st.info("Question flagged! It won't count towards your score.")
-                time.sleep(1)
-                if current_idx < len(questions) - 1:
-                    st.session_state.current_question += 1
-                    st.rerun()
-                else:
-                    st.session_state.exam_finished = True
-                    st.rerun()
+            st.button("🚩 Flag as Irrelevant", use_container_width=True,
+                      on_click=flag_question, args=(current_idx,))
     
     with col2:
         if not answered:
-            if st.button("✓ Submit Answer", type="primary", use_container_width=True):
-                st.session_state.answers[current_idx] = selected_option
-                st.session_state.show_explanation[current_idx] = True
-                st.rerun()
+            st.button("✓ Submit Answer", type="primary", use_container_width=True,
+                      on_click=submit_answer, args=(current_idx,))
     
     with col3:
         if answered:
-            if current_idx < len(questions) - 1:
-                if st.button("Next →", type="primary", use_container_width=True):
-                    st.session_state.current_question += 1
-                    st.rerun()
-            else:
-                if st.button("Finish Exam", type="primary", use_container_width=True):
-                    st.session_state.exam_finished = True
-                    st.rerun()
+            label = "Next →" if position < len(questions) - 1 else "Finish Exam"
+            st.button(label, type="primary", use_container_width=True, on_click=next_question)
     
     with col4:
-        if st.button("⏸️", use_container_width=True, help="Pause and exit"):
-            st.session_state.exam_finished = True
-            st.rerun()
+        st.button("⏸️", use_container_width=True, help="Pause and exit", on_click=finish_exam)
     
     # Show feedback and explanations
     if show_explanation:
-        correct_answer = current_q['correct_answer']
-        is_correct = user_answer == correct_answer
-        
-        if is_correct:
-            st.markdown("""
-            <div class="feedback-correct">
-                <strong style="color: #22c55e; font-size: 1.2rem;">✓ Correct!</strong>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-            <div class="feedback-incorrect">
-                <strong style="color: #ef4444; font-size: 1.2rem;">✗ Incorrect</strong><br>
-                <span style="color: #991b1b;">Correct answer: {correct_answer}</span>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("### 📚 Explanations")
-        
-        for opt in ['A', 'B', 'C', 'D']:
-            explanation = current_q['explanations'][opt]
-            
-            if opt == correct_answer:
-                css_class = "explanation-correct"
-                icon = "✓"
-                color = "#22c55e"
-            elif opt == user_answer and opt != correct_answer:
-                css_class = "explanation-incorrect"
-                icon = "✗"
-                color = "#ef4444"
-            else:
-                css_class = "explanation-neutral"
-                icon = "○"
-                color = "#64748b"
-            
-            st.markdown(f"""
-            <div class="explanation {css_class}">
-                <strong style="color: {color};">{icon} Option {opt}:</strong><br>
-                <span style="color: {color};">{explanation}</span>
-            </div>
-            """, unsafe_allow_html=True)
+        show_explanations(current_idx, current_q, user_answer)
 
-def show_results_screen():
-    """Display results screen"""
-    correct, total, percentage = calculate_score()
+@METRICS.timed_screen('exam')
+def show_exam_screen():
+    """Display exam question screen"""
+    # Timer and question panel are fragments: each interaction reruns only its own panel
+    _, timer_col = st.columns([3, 1])
     
-    exam_data = st.session_state.exam_data
-    flagged_count = len(st.session_state.flagged)
+    with timer_col:
+        show_exam_timer()
     
-    # Save to history
-    result = {
-        'date': datetime.now().isoformat(),
-        'exam_title': exam_data['exam_title'],
-        'correct': correct,
-        'total': total,
-        'percentage': percentage,
-        'flagged': flagged_count
-    }
-    st.session_state.exam_history.append(result)
+    show_question_panel()
+
+@METRICS.timed_screen('results')
+def show_results_screen():
+    """Display results screen"""
+    # Save to history (only on the first render of this attempt's results)
+    result = record_result()
+    correct = result['correct']
+    total = result['total']
+    percentage = result['percentage']
+    flagged_count = result['flagged']
     
     st.markdown('<div class="header-title">🎉 Exam Complete!</div>', unsafe_allow_html=True)
     
@@ -569,14 +1308,7 @@ def show_results_screen():
         with col_a:
             if st.button("🏠 Back to Home", type="primary", use_container_width=True):
                 # Reset everything
-                st.session_state.exam_data = None
-                st.session_state.current_question = 0
-                st.session_state.answers = {}
-                st.session_state.flagged = set()
-                st.session_state.exam_started = False
-                st.session_state.exam_finished = False
-                st.session_state.start_time = None
-                st.session_state.show_explanation = {}
+                reset_exam()
                 st.rerun()
         
         with col_b:
@@ -584,61 +1316,308 @@ def show_results_screen():
                 st.session_state.show_review = True
                 st.rerun()
 
-def main():
-    """Main application flow"""
+@METRICS.timed_screen('lobby')
+def show_cohort_lobby():
+    """Waiting room for a cohort exam; everyone starts at the same time"""
+    cohort = st.session_state.cohort
+    exam_data = st.session_state.exam_data
+    
+    st.markdown('<div class="header-title">👥 Cohort Exam</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="header-subtitle">{exam_data["exam_title"]}</div>', unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    
+    with col2:
+        now = time.time()
+        duration = round((cohort['deadline'] - cohort['start_at']) / 60)
+        st.markdown(f"<p style='text-align: center; font-size: 1.2rem; color: #64748b;'>{exam_data['total_questions']} questions, <strong>{duration} minutes</strong>, starting at <strong>{datetime.fromtimestamp(cohort['start_at']):%H:%M}</strong></p>", unsafe_allow_html=True)
+        
+        if now >= cohort['deadline']:
+            st.warning("This cohort exam has ended.")
+            if st.button("🏠 Back to Home", use_container_width=True):
+                reset_exam()
+                st.rerun()
+        elif now < cohort['start_at']:
+            st.info("The exam starts automatically for everyone at the same time. Please keep this page open.")
+            show_countdown(int(cohort['start_at'] - now))
+            show_cohort_start_watchdog(cohort['start_at'])
+        else:
+            # The cohort clock is already running, so late arrivals go straight in too
+            start_attempt()
+            st.rerun()
+
+def show_cohort_start_watchdog(start_at):
+    """Start the attempt in every waiting lobby once the cohort's start time arrives"""
+    armed = False
+
+    @st.fragment(run_every=timedelta(seconds=watchdog_interval(start_at)))
+    def start_watchdog():
+        nonlocal armed
+        if time.time() >= start_at:
+            if not st.session_state.exam_started:
+                start_attempt()
+            st.rerun()
+        elif armed:
+            # The timer fired before the start time; a full rerun re-arms it for the time left
+            st.rerun()
+        armed = True
+    
+    start_watchdog()
+
+# The dashboard only reads cached aggregator snapshots, so refreshing it is cheap
+PROCTOR_REFRESH_SECONDS = 5
+
+def distribution_rows(counts, label):
+    """Histogram bins as rows for a bar chart"""
+    width = 100 // len(counts)
+    return [{label: f"{low}-{low + width}%", 'Candidates': count}
+            for low, count in zip(range(0, 100, width), counts)]
+
+@st.fragment(run_every=timedelta(seconds=PROCTOR_REFRESH_SECONDS))
+def show_cohort_progress(cohort):
+    """Live counts, distributions and leaderboard for a cohort"""
+    snapshot = get_cohort_registry().aggregator(cohort).snapshot()
+    now = time.time()
+    if now < cohort['start_at']:
+        st.info(f"Starts in {format_time(int(cohort['start_at'] - now))}")
+    elif now < cohort['deadline']:
+        st.info(f"In progress: {format_time(int(cohort['deadline'] - now))} remaining")
+    else:
+        st.success("Finished")
+    
+    stats = [
+        (snapshot['candidates'], "Candidates"),
+        (snapshot['finished'], "Finished"),
+        (f"{snapshot['average_answered']:.1f}", "Avg. Answered"),
+        (f"{snapshot['average_correct']:.1f}", "Avg. Correct"),
+    ]
+    for col, (value, label) in zip(st.columns(len(stats)), stats):
+        with col:
+            st.markdown(f"""
+            <div class="stat-card">
+                <div class="stat-value">{value}</div>
+                <div class="stat-label">{label}</div>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    col_a, col_b = st.columns(2)
+    with col_a:
+        st.markdown("#### Progress")
+        st.bar_chart(distribution_rows(snapshot['progress'], 'Completed'), x='Completed', y='Candidates')
+    with col_b:
+        st.markdown("#### Scores")
+        st.bar_chart(distribution_rows(snapshot['scores'], 'Score'), x='Score', y='Candidates')
+    
+    st.markdown("#### 🏆 Leaderboard")
+    if snapshot['leaderboard']:
+        st.dataframe(snapshot['leaderboard'], hide_index=True, use_container_width=True)
+    else:
+        st.caption("No candidates have joined yet")
+    
+    if snapshot['hardest']:
+        st.markdown("#### Hardest Questions So Far")
+        st.dataframe(snapshot['hardest'], hide_index=True, use_container_width=True)
+
+@METRICS.timed_screen('proctor')
+def show_proctor_dashboard(proctor_key):
+    """Live view of a cohort for its proctor"""
+    cohort = get_cohort_registry().by_proctor_key(proctor_key)
+    if cohort is None:
+        st.error("This proctor link is not valid on this server.")
+        return
+    
+    st.markdown('<div class="header-title">📡 Proctor Dashboard</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="header-subtitle">{cohort["title"]}</div>', unsafe_allow_html=True)
+    st.markdown(f"Candidate link: [?cohort={cohort['cohort_id']}](?cohort={cohort['cohort_id']}) · "
+                f"{datetime.fromtimestamp(cohort['start_at']):%d %b %H:%M}–{datetime.fromtimestamp(cohort['deadline']):%H:%M}")
+    show_cohort_progress(cohort)
+
+def route(info):
+    """Show the screen for the current state; its name is stored in info['screen']"""
+    proctor_key = st.query_params.get('proctor')
+    if proctor_key:
+        info['screen'] = 'proctor'
+        show_proctor_dashboard(proctor_key)
+        return
+    
+    resume_attempt()
+    join_cohort()
     
     # Check if showing review
     if st.session_state.get('show_review', False):
+        info['screen'] = 'review'
         show_review_screen()
         return
     
     # Route to appropriate screen
     if st.session_state.exam_finished:
+        info['screen'] = 'results'
         show_results_screen()
     elif st.session_state.exam_started:
+        info['screen'] = 'exam'
         show_exam_screen()
+    elif st.session_state.cohort:
+        info['screen'] = 'lobby'
+        show_cohort_lobby()
     elif st.session_state.exam_data:
+        info['screen'] = 'setup'
         show_exam_setup()
     else:
+        info['screen'] = 'welcome'
         show_welcome_screen()
 
+def main():
+    """Main application flow, timed and optionally profiled per rerun"""
+    profiler = start_metrics()
+    started = time.perf_counter()
+    info = {'screen': 'unknown'}
+    try:
+        with profiler.profile() if profiler else nullcontext(info) as info:
+            route(info)
+    finally:
+        # st.rerun() unwinds through here too, so interrupted reruns are still counted
+        METRICS.rerun_seconds.observe(time.perf_counter() - started, screen=info['screen'])
+        METRICS.session_state_bytes.observe(session_state_size())
+
+REVIEW_STATUSES = {
+    'correct': "✓ Correct",
+    'incorrect': "✗ Incorrect",
+    'flagged': "🚩 Flagged",
+    'unanswered': "⊘ Not Answered",
+}
+
+REVIEW_FILTERS = {
+    'All': None,
+    'Incorrect': 'incorrect',
+    'Flagged': 'flagged',
+    'Unanswered': 'unanswered',
+    'Correct': 'correct',
+}
+
+REVIEW_PAGE_SIZES = [10, 25, 50]
+
+def get_review_index():
+    """Per-question statuses and counts, computed once per attempt"""
+    index = st.session_state.get('review_index')
+    if index and index['attempt_id'] == st.session_state.attempt_id:
+        return index
+    
+    questions = st.session_state.exam_data['questions']
+    permutation = get_permutation()
+    sheet = st.session_state.sheet
+    by_status = {status: [] for status in REVIEW_STATUSES}
+    statuses = []
+    # Statuses are listed by display position, the numbering the candidate saw
+    for position in range(len(questions)):
+        idx = permutation.question_at(position)
+        q = questions[idx]
+        answer = sheet.answer(idx)
+        if sheet.is_flagged(idx):
+            status = 'flagged'
+        elif answer is not None:
+            status = 'correct' if answer == q['correct_answer'] else 'incorrect'
+        else:
+            status = 'unanswered'
+        statuses.append(status)
+        by_status[status].append(position)
+    
+    index = {
+        'attempt_id': st.session_state.attempt_id,
+        'statuses': statuses,
+        'by_status': by_status,
+    }
+    st.session_state.review_index = index
+    return index
+
+def reset_review_page():
+    """Return to the first page when the filter changes"""
+    st.session_state.review_page = 1
+
+def jump_to_question():
+    """Show the page containing the requested question"""
+    if st.session_state.review_jump is None:
+        return
+    idx = st.session_state.review_jump - 1
+    st.session_state.review_filter = 'All'
+    st.session_state.review_page = idx // st.session_state.review_page_size + 1
+    st.session_state.review_focus = idx
+
+def show_review_question(position, idx, q, status):
+    """Render one question in the review list, with options in the order the candidate saw"""
+    expanded = st.session_state.get('review_focus') == position
+    with st.expander(f"Question {position + 1}: {REVIEW_STATUSES[status]}", expanded=expanded):
+        st.markdown(f"**{q['question']}**")
+        show_question_image(q)
+        st.markdown("")
+        
+        user_answer = st.session_state.sheet.answer(idx)
+        for label, opt in zip(['A', 'B', 'C', 'D'], get_permutation().options(idx)):
+            if opt == q['correct_answer']:
+                st.success(f"✓ {label}. {q['options'][opt]} (Correct)")
+            elif user_answer == opt:
+                st.error(f"✗ {label}. {q['options'][opt]} (Your Answer)")
+            else:
+                st.info(f"○ {label}. {q['options'][opt]}")
+
+@METRICS.timed_screen('review')
 def show_review_screen():
-    """Show detailed review of answers"""
+    """Show detailed review of answers, one page at a time"""
     st.markdown('<div class="header-title">📝 Answer Review</div>', unsafe_allow_html=True)
     
     if st.button("← Back to Results"):
         st.session_state.show_review = False
         st.rerun()
     
-    exam_data = st.session_state.exam_data
-    questions = exam_data['questions']
+    questions = st.session_state.exam_data['questions']
+    index = get_review_index()
     
-    for idx, q in enumerate(questions):
-        if idx in st.session_state.flagged:
-            status = "🚩 Flagged"
-            status_color = "#f59e0b"
-        elif idx in st.session_state.answers:
-            if st.session_state.answers[idx] == q['correct_answer']:
-                status = "✓ Correct"
-                status_color = "#22c55e"
-            else:
-                status = "✗ Incorrect"
-                status_color = "#ef4444"
-        else:
-            status = "⊘ Not Answered"
-            status_color = "#94a3b8"
-        
-        with st.expander(f"Question {idx + 1}: {status}", expanded=False):
-            st.markdown(f"**{q['question']}**")
-            st.markdown("")
-            
-            for opt in ['A', 'B', 'C', 'D']:
-                if opt == q['correct_answer']:
-                    st.success(f"✓ {opt}. {q['options'][opt]} (Correct)")
-                elif idx in st.session_state.answers and st.session_state.answers[idx] == opt:
-                    st.error(f"✗ {opt}. {q['options'][opt]} (Your Answer)")
-                else:
-                    st.info(f"○ {opt}. {q['options'][opt]}")
+    if 'review_page_size' not in st.session_state:
+        st.session_state.review_page_size = REVIEW_PAGE_SIZES[0]
+    
+    col1, col2, col3 = st.columns([3, 1, 1])
+    
+    with col1:
+        review_filter = st.radio(
+            "Show",
+            options=list(REVIEW_FILTERS),
+            format_func=lambda f: f if REVIEW_FILTERS[f] is None else f"{f} ({len(index['by_status'][REVIEW_FILTERS[f]])})",
+            key="review_filter",
+            horizontal=True,
+            on_change=reset_review_page
+        )
+    
+    with col2:
+        page_size = st.selectbox("Per page", REVIEW_PAGE_SIZES, key="review_page_size")
+    
+    with col3:
+        st.number_input(
+            "Go to question",
+            min_value=1,
+            max_value=len(questions),
+            value=None,
+            step=1,
+            key="review_jump",
+            on_change=jump_to_question
+        )
+    
+    status = REVIEW_FILTERS[review_filter]
+    matches = range(len(questions)) if status is None else index['by_status'][status]
+    
+    if not matches:
+        st.info("No questions match this filter.")
+        return
+    
+    page_count = (len(matches) + page_size - 1) // page_size
+    if st.session_state.get('review_page', 1) > page_count:
+        st.session_state.review_page = page_count
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key="review_page")
+    
+    # Only the visible page's widgets are built
+    start = (page - 1) * page_size
+    permutation = get_permutation()
+    for position in matches[start:start + page_size]:
+        idx = permutation.question_at(position)
+        show_review_question(position, idx, questions[idx], index['statuses'][position])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,91 @@
+"""
+Server-authoritative attempt deadlines
+A single background thread sleeps until the earliest deadline and expires attempts
+even when their browser never reruns the script
+"""
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def watchdog_interval(target, now=None):
+    """Whole seconds until just after an epoch time, at least one
+
+    Rounds up and adds a second, so a timer armed with it never fires before the target.
+    """
+    if now is None:
+        now = time.time()
+    return max(math.ceil(target - now) + 1, 1)
+
+
+class DeadlineSweeper:
+    """Tracks absolute per-attempt deadlines and expires them from a background thread"""
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._expired = set()
+        self._listeners = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="deadline-sweeper", daemon=True)
+        self._thread.start()
+
+    def register(self, attempt_id, deadline):
+        """Start tracking an attempt that must finish by the given epoch time"""
+        with self._cond:
+            self._deadlines[attempt_id] = deadline
+            self._expired.discard(attempt_id)
+            heapq.heappush(self._heap, (deadline, next(self._counter), attempt_id))
+            self._cond.notify()
+
+    def cancel(self, attempt_id):
+        """Stop tracking an attempt that finished or was abandoned"""
+        with self._cond:
+            self._deadlines.pop(attempt_id, None)
+            self._expired.discard(attempt_id)
+
+    def deadline(self, attempt_id):
+        """Return the registered deadline for an attempt, or None"""
+        with self._cond:
+            return self._deadlines.get(attempt_id)
+
+    def is_expired(self, attempt_id):
+        """Return True once the sweeper has expired the attempt"""
+        with self._cond:
+            return attempt_id in self._expired
+
+    def add_listener(self, callback):
+        """Call callback(attempt_id) from the sweeper thread whenever an attempt expires"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, attempt_id = self._heap[0]
+                wait = deadline - time.time()
+                if wait > 0:
+                    # Woken early by a new registration, which may be sooner
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                # Skip stale heap entries left by cancel() or re-registration
+                if self._deadlines.get(attempt_id) != deadline:
+                    continue
+                del self._deadlines[attempt_id]
+                self._expired.add(attempt_id)
+                listeners = list(self._listeners)
+
+            for callback in listeners:
+                try:
+                    callback(attempt_id)
+                except Exception:
+                    logger.exception("deadline listener failed for attempt %s", attempt_id)
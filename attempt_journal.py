@@ -0,0 +1,227 @@
+"""
+Crash-safe attempt journal
+Every answer, flag and navigation event is appended as a fixed-size binary record to a
+per-attempt log. A background thread fsyncs dirty logs in batches, and periodic JSON
+snapshots keep replay short. After a restart an attempt is rebuilt by loading its
+snapshot and replaying the log on top
+"""
+import base64
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from answer_sheet import AnswerSheet
+from exam_schema import OPTION_KEYS
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.environ.get("PHYSIO_JOURNAL_DIR", ".exam_journals")
+FSYNC_INTERVAL = float(os.environ.get("PHYSIO_JOURNAL_FSYNC_INTERVAL", "0.2"))
+SNAPSHOT_EVERY = 64
+MAX_OPEN_FILES = 256
+
+# op, question index, value
+RECORD = struct.Struct('<BIB')
+
+OP_ANSWER = 1
+OP_FLAG = 2
+OP_NAVIGATE = 3
+OP_FINISH = 4
+
+
+def new_state(attempt_id, question_count=None, **meta):
+    """Return the initial journal state for an attempt
+
+    With a question count, answers and flags are kept in an AnswerSheet under 'sheet';
+    without one, in the 'answers' dict and 'flagged' list older journals used.
+    """
+    state = {
+        'attempt_id': attempt_id,
+        'current_question': 0,
+        'finished': False,
+    }
+    if question_count is None:
+        state.update(answers={}, flagged=[])
+    else:
+        state['sheet'] = AnswerSheet(question_count)
+    state.update(meta)
+    return state
+
+
+def apply_record(state, op, idx, value):
+    """Apply one journal record to a state dict; records are idempotent"""
+    sheet = state.get('sheet')
+    if op == OP_ANSWER:
+        if sheet is not None:
+            sheet.set_answer(idx, OPTION_KEYS[value])
+            sheet.reveal(idx)
+        else:
+            state['answers'][idx] = OPTION_KEYS[value]
+    elif op == OP_FLAG:
+        if sheet is not None:
+            sheet.flag(idx)
+        elif idx not in state['flagged']:
+            state['flagged'].append(idx)
+    elif op == OP_NAVIGATE:
+        state['current_question'] = idx
+    elif op == OP_FINISH:
+        state['finished'] = True
+
+
+class AttemptJournal:
+    """Append-only per-attempt journals with batched fsyncs and snapshot compaction"""
+
+    def __init__(self, directory=JOURNAL_DIR, fsync_interval=FSYNC_INTERVAL,
+                 snapshot_every=SNAPSHOT_EVERY, max_open_files=MAX_OPEN_FILES):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.max_open_files = max_open_files
+        self._fds = OrderedDict()
+        self._dirty = set()
+        self._pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._fsync_interval = fsync_interval
+        self._thread = threading.Thread(target=self._flush_loop, name="journal-fsync", daemon=True)
+        self._thread.start()
+
+    def _log_path(self, attempt_id):
+        return os.path.join(self.directory, f"{attempt_id}.log")
+
+    def _snapshot_path(self, attempt_id):
+        return os.path.join(self.directory, f"{attempt_id}.snap")
+
+    def _fd(self, attempt_id):
+        # Caller holds self._lock
+        fd = self._fds.get(attempt_id)
+        if fd is not None:
+            self._fds.move_to_end(attempt_id)
+            return fd
+        fd = os.open(self._log_path(attempt_id), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._fds[attempt_id] = fd
+        while len(self._fds) > self.max_open_files:
+            old_id, old_fd = self._fds.popitem(last=False)
+            self._close_fd(old_id, old_fd)
+        return fd
+
+    def _close_fd(self, attempt_id, fd):
+        # Caller holds self._lock
+        if attempt_id in self._dirty:
+            os.fsync(fd)
+            self._dirty.discard(attempt_id)
+        os.close(fd)
+
+    def start(self, attempt_id, question_count=None, **meta):
+        """Create the journal for a new attempt with its metadata as the first snapshot"""
+        self.snapshot(new_state(attempt_id, question_count, **meta))
+
+    def append(self, attempt_id, op, idx=0, value=0):
+        """Append one record; returns True when the attempt is due for a snapshot"""
+        record = RECORD.pack(op, idx, value)
+        with self._lock:
+            os.write(self._fd(attempt_id), record)
+            self._dirty.add(attempt_id)
+            pending = self._pending.get(attempt_id, 0) + 1
+            self._pending[attempt_id] = pending
+        return pending >= self.snapshot_every
+
+    def record_answer(self, attempt_id, idx, option):
+        return self.append(attempt_id, OP_ANSWER, idx, OPTION_KEYS.index(option))
+
+    def record_flag(self, attempt_id, idx):
+        return self.append(attempt_id, OP_FLAG, idx)
+
+    def record_navigation(self, attempt_id, idx):
+        return self.append(attempt_id, OP_NAVIGATE, idx)
+
+    def record_finish(self, attempt_id):
+        """Close an attempt; safe to call from the deadline sweeper thread"""
+        if os.path.exists(self._snapshot_path(attempt_id)):
+            self.append(attempt_id, OP_FINISH)
+
+    def snapshot(self, state):
+        """Atomically write a snapshot of the full state and truncate the log"""
+        attempt_id = state['attempt_id']
+        path = self._snapshot_path(attempt_id)
+        tmp_path = f"{path}.tmp"
+        if isinstance(state.get('sheet'), AnswerSheet):
+            state = dict(state, sheet=base64.b64encode(state['sheet'].to_bytes()).decode('ascii'))
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # A crash before the truncate only replays records already in the snapshot,
+        # which is harmless because records are idempotent
+        with self._lock:
+            os.ftruncate(self._fd(attempt_id), 0)
+            self._pending[attempt_id] = 0
+
+    def restore(self, attempt_id):
+        """Rebuild an attempt's state from its snapshot and log, or return None"""
+        try:
+            with open(self._snapshot_path(attempt_id), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if 'sheet' in state:
+            try:
+                state['sheet'] = AnswerSheet.from_bytes(base64.b64decode(state['sheet']))
+            except (ValueError, struct.error):
+                logger.exception("unreadable answer sheet in snapshot for attempt %s", attempt_id)
+                return None
+        else:
+            state['answers'] = {int(k): v for k, v in state['answers'].items()}
+
+        try:
+            with open(self._log_path(attempt_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+
+        # A torn final record from a crash mid-write is ignored
+        usable = len(data) - len(data) % RECORD.size
+        for op, idx, value in RECORD.iter_unpack(data[:usable]):
+            apply_record(state, op, idx, value)
+        return state
+
+    def discard(self, attempt_id):
+        """Remove an attempt's journal once its result has been recorded"""
+        with self._lock:
+            fd = self._fds.pop(attempt_id, None)
+            if fd is not None:
+                self._dirty.discard(attempt_id)
+                os.close(fd)
+            self._pending.pop(attempt_id, None)
+        for path in (self._log_path(attempt_id), self._snapshot_path(attempt_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        """fsync every log written since the last flush"""
+        with self._lock:
+            # Duplicate the fds so appends can continue, and evicted fds can close,
+            # while the batch is being synced
+            dirty = [(attempt_id, os.dup(self._fds[attempt_id])) for attempt_id in self._dirty
+                     if attempt_id in self._fds]
+            self._dirty.clear()
+        for attempt_id, fd in dirty:
+            try:
+                os.fsync(fd)
+            except OSError:
+                logger.exception("journal fsync failed for attempt %s", attempt_id)
+            finally:
+                os.close(fd)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._fsync_interval)
+            self.flush()
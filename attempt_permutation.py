@@ -0,0 +1,70 @@
+"""
+Per-attempt question and option shuffling
+Each attempt sees the shared exam through a seeded permutation: a question order plus,
+for every question, one of the 24 orderings of options A-D stored as a single byte. The
+bank itself is never copied, and the permutation is rebuilt from the attempt id alone,
+so resumed attempts see the same order. Answers are always recorded in canonical letters
+"""
+import hashlib
+import itertools
+
+import numpy as np
+
+from exam_schema import OPTION_KEYS
+
+# All orderings of the four options; a question's permutation is an index into this table
+OPTION_ORDERS = tuple(itertools.permutations(OPTION_KEYS))
+_DISPLAY_POSITION = tuple({opt: pos for pos, opt in enumerate(order)} for order in OPTION_ORDERS)
+_IDENTITY = OPTION_ORDERS.index(OPTION_KEYS)
+
+
+def attempt_seed(attempt_id):
+    """Stable 64-bit seed derived from an attempt id"""
+    return int.from_bytes(hashlib.blake2b(attempt_id.encode(), digest_size=8).digest(), 'little')
+
+
+class AttemptPermutation:
+    """Maps display positions and letters to canonical question indices and options"""
+
+    __slots__ = ('question_order', 'option_orders', '_positions')
+
+    def __init__(self, seed, question_count, shuffle_questions=True, shuffle_options=True):
+        rng = np.random.default_rng(seed)
+        if shuffle_questions:
+            self.question_order = rng.permutation(question_count).astype(np.uint32)
+        else:
+            self.question_order = np.arange(question_count, dtype=np.uint32)
+        if shuffle_options:
+            self.option_orders = rng.integers(0, len(OPTION_ORDERS), size=question_count, dtype=np.uint8)
+        else:
+            self.option_orders = np.full(question_count, _IDENTITY, dtype=np.uint8)
+        self._positions = None
+
+    @classmethod
+    def for_attempt(cls, attempt_id, question_count, shuffle=True):
+        return cls(attempt_seed(attempt_id), question_count, shuffle, shuffle)
+
+    def __len__(self):
+        return len(self.question_order)
+
+    def question_at(self, position):
+        """Canonical index of the question shown at a display position"""
+        return int(self.question_order[position])
+
+    def position_of(self, idx):
+        """Display position of a canonical question index"""
+        if self._positions is None:
+            self._positions = np.argsort(self.question_order).astype(np.uint32)
+        return int(self._positions[idx])
+
+    def options(self, idx):
+        """Canonical option letters of a question in display order"""
+        return OPTION_ORDERS[self.option_orders[idx]]
+
+    def to_canonical(self, idx, letter):
+        """Canonical option for the letter a candidate saw"""
+        return OPTION_ORDERS[self.option_orders[idx]][OPTION_KEYS.index(letter)]
+
+    def to_display(self, idx, option):
+        """Letter a canonical option is shown under"""
+        return OPTION_KEYS[_DISPLAY_POSITION[self.option_orders[idx]][option]]
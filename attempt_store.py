@@ -0,0 +1,343 @@
+"""
+Persistent attempt and history store (SQLite)
+Attempts, per-question responses and timings are written in one batched transaction per
+attempt; per-user dashboard aggregates are maintained on write so reads are O(1)
+"""
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get("PHYSIO_DB_PATH", "physio_exam.db")
+POOL_SIZE = int(os.environ.get("PHYSIO_DB_POOL_SIZE", "8"))
+
+# Rows per query when exporting attempts, so large exports never hold a read open for long
+EXPORT_CHUNK_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    attempt_id   TEXT PRIMARY KEY,
+    user_id      TEXT NOT NULL,
+    exam_hash    TEXT NOT NULL,
+    exam_title   TEXT NOT NULL,
+    started_at   REAL NOT NULL,
+    finished_at  REAL NOT NULL,
+    correct      INTEGER NOT NULL,
+    total        INTEGER NOT NULL,
+    percentage   REAL NOT NULL,
+    flagged      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts (user_id, finished_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_exam ON attempts (exam_hash, finished_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_title ON attempts (exam_title, finished_at);
+
+CREATE TABLE IF NOT EXISTS responses (
+    attempt_id    TEXT NOT NULL,
+    question_idx  INTEGER NOT NULL,
+    exam_hash     TEXT NOT NULL,
+    answer        TEXT,
+    is_correct    INTEGER NOT NULL,
+    flagged       INTEGER NOT NULL,
+    time_spent    REAL,
+    PRIMARY KEY (attempt_id, question_idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_responses_question ON responses (exam_hash, question_idx);
+
+-- Exams drawn from a larger bank map their questions back to it, so a candidate's
+-- history on a bank includes every exam sampled from it
+CREATE TABLE IF NOT EXISTS question_sources (
+    exam_hash     TEXT NOT NULL,
+    question_idx  INTEGER NOT NULL,
+    source_hash   TEXT NOT NULL,
+    source_idx    INTEGER NOT NULL,
+    PRIMARY KEY (exam_hash, question_idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_question_sources_source ON question_sources (source_hash);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id           TEXT PRIMARY KEY,
+    attempts          INTEGER NOT NULL,
+    total_percentage  REAL NOT NULL,
+    best              REAL NOT NULL,
+    worst             REAL NOT NULL
+);
+"""
+
+
+class SqliteStore:
+    """Pooled SQLite connections in WAL mode; subclasses set schema"""
+
+    schema = ""
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self.connection() as conn:
+            conn.executescript(self.schema)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection from the pool"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and run the block in a single write transaction"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class AttemptStore(SqliteStore):
+    """Attempts, responses and per-user aggregates"""
+
+    schema = SCHEMA
+
+    def __init__(self, path=DB_PATH, pool_size=POOL_SIZE):
+        super().__init__(path, pool_size)
+
+    def record_attempt(self, attempt, responses):
+        """Persist a finished attempt and its responses; returns False if it was already recorded
+
+        attempt is a dict with attempt_id, user_id, exam_hash, exam_title, started_at,
+        finished_at, correct, total, percentage and flagged. responses is an iterable of
+        (question_idx, answer, is_correct, flagged, time_spent) tuples.
+        """
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO attempts
+                   (attempt_id, user_id, exam_hash, exam_title, started_at, finished_at,
+                    correct, total, percentage, flagged)
+                   VALUES (:attempt_id, :user_id, :exam_hash, :exam_title, :started_at,
+                           :finished_at, :correct, :total, :percentage, :flagged)""",
+                attempt
+            )
+            if cursor.rowcount == 0:
+                return False
+
+            conn.executemany(
+                """INSERT INTO responses
+                   (attempt_id, question_idx, exam_hash, answer, is_correct, flagged, time_spent)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                ((attempt['attempt_id'], idx, attempt['exam_hash'], answer, int(is_correct),
+                  int(flagged), time_spent)
+                 for idx, answer, is_correct, flagged, time_spent in responses)
+            )
+            conn.execute(
+                """INSERT INTO user_stats (user_id, attempts, total_percentage, best, worst)
+                   VALUES (:user_id, 1, :percentage, :percentage, :percentage)
+                   ON CONFLICT (user_id) DO UPDATE SET
+                       attempts = attempts + 1,
+                       total_percentage = total_percentage + excluded.total_percentage,
+                       best = MAX(best, excluded.best),
+                       worst = MIN(worst, excluded.worst)""",
+                attempt
+            )
+        return True
+
+    def user_summary(self, user_id):
+        """Return dashboard aggregates for a user, or None if they have no attempts"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT attempts, total_percentage, best, worst FROM user_stats WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'attempts': row['attempts'],
+            'average': row['total_percentage'] / row['attempts'],
+            'best': row['best'],
+            'worst': row['worst'],
+        }
+
+    def user_attempts(self, user_id, limit=20):
+        """Most recent attempts for a user"""
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT * FROM attempts WHERE user_id = ? ORDER BY finished_at DESC LIMIT ?",
+                (user_id, limit)
+            )]
+
+    def exam_attempt_count(self, exam_hash):
+        """Number of recorded attempts for an exam"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM attempts WHERE exam_hash = ?", (exam_hash,)
+            ).fetchone()[0]
+
+    def question_stats(self, exam_hash, question_idx):
+        """Answer counts, correct rate, flag rate and mean time for one question"""
+        with self.connection() as conn:
+            row = conn.execute(
+                """SELECT COUNT(*) AS responses,
+                          SUM(answer IS NOT NULL) AS answered,
+                          SUM(is_correct) AS correct,
+                          SUM(flagged) AS flagged,
+                          AVG(time_spent) AS mean_time
+                   FROM responses WHERE exam_hash = ? AND question_idx = ?""",
+                (exam_hash, question_idx)
+            ).fetchone()
+        return dict(row)
+
+    def record_question_sources(self, exam_hash, sources):
+        """Remember that question i of exam_hash is question sources[i] = (source_hash, source_idx)"""
+        with self.transaction() as conn:
+            conn.executemany(
+                """INSERT OR IGNORE INTO question_sources (exam_hash, question_idx, source_hash, source_idx)
+                   VALUES (?, ?, ?, ?)""",
+                ((exam_hash, idx, source_hash, int(source_idx))
+                 for idx, (source_hash, source_idx) in enumerate(sources))
+            )
+
+    def question_sources(self, exam_hash):
+        """{question_idx: (source_hash, source_idx)} for an exam assembled from other exams"""
+        with self.connection() as conn:
+            return {row['question_idx']: (row['source_hash'], row['source_idx']) for row in conn.execute(
+                "SELECT question_idx, source_hash, source_idx FROM question_sources WHERE exam_hash = ?",
+                (exam_hash,)
+            )}
+
+    def user_error_counts(self, user_id, exam_hash):
+        """Per-question (answered, wrong) counts for a user on an exam or bank
+
+        Responses to exams drawn from the bank are counted against the bank question
+        they were drawn from. Returns {question_idx: (answered, wrong)}.
+        """
+        with self.connection() as conn:
+            rows = conn.execute(
+                """SELECT COALESCE(s.source_idx, r.question_idx) AS idx,
+                          SUM(r.answer IS NOT NULL) AS answered,
+                          SUM(r.answer IS NOT NULL AND NOT r.is_correct) AS wrong
+                   FROM attempts a
+                   JOIN responses r ON r.attempt_id = a.attempt_id
+                   LEFT JOIN question_sources s
+                          ON s.exam_hash = r.exam_hash AND s.question_idx = r.question_idx
+                   WHERE a.user_id = ? AND (r.exam_hash = ? OR s.source_hash = ?)
+                   GROUP BY idx""",
+                (user_id, exam_hash, exam_hash)
+            ).fetchall()
+        return {row['idx']: (row['answered'], row['wrong']) for row in rows}
+
+    @staticmethod
+    def _export_filter(exam_title=None, since=None, until=None):
+        """WHERE clause and parameters selecting attempts by exam title and finish time
+
+        A title containing *, ? or [ is matched as a glob pattern, otherwise exactly.
+        since and until are epoch times; until is exclusive.
+        """
+        clauses = []
+        params = []
+        if exam_title:
+            clauses.append("a.exam_title GLOB ?" if any(c in exam_title for c in '*?[') else "a.exam_title = ?")
+            params.append(exam_title)
+        if since is not None:
+            clauses.append("a.finished_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("a.finished_at < ?")
+            params.append(until)
+        return " AND ".join(clauses) or "1", params
+
+    def export_attempts(self, exam_title=None, since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """Yield matching attempts in finish order, reading chunk_size rows per query
+
+        Pages are fetched by keyset on (finished_at, attempt_id), so each query is an
+        index range scan and memory stays flat however many attempts match.
+        """
+        where, params = self._export_filter(exam_title, since, until)
+        last = (float('-inf'), '')
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    f"""SELECT * FROM attempts a
+                        WHERE {where} AND (a.finished_at, a.attempt_id) > (?, ?)
+                        ORDER BY a.finished_at, a.attempt_id LIMIT ?""",
+                    (*params, *last, chunk_size)
+                ).fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < chunk_size:
+                return
+            last = (rows[-1]['finished_at'], rows[-1]['attempt_id'])
+
+    def export_summary(self, exam_title=None, since=None, until=None, bins=10):
+        """Count, mean, best and worst score and a score histogram over matching attempts"""
+        where, params = self._export_filter(exam_title, since, until)
+        with self.connection() as conn:
+            row = conn.execute(
+                f"""SELECT COUNT(*) AS attempts, COUNT(DISTINCT a.user_id) AS candidates,
+                           AVG(a.percentage) AS average, MAX(a.percentage) AS best,
+                           MIN(a.percentage) AS worst, MIN(a.finished_at) AS first_finished,
+                           MAX(a.finished_at) AS last_finished
+                    FROM attempts a WHERE {where}""",
+                params
+            ).fetchone()
+            histogram = [0] * bins
+            for bucket in conn.execute(
+                f"""SELECT MIN(CAST(a.percentage * ? / 100 AS INTEGER), ?) AS bucket, COUNT(*) AS n
+                    FROM attempts a WHERE {where} GROUP BY bucket""",
+                (bins, bins - 1, *params)
+            ):
+                histogram[bucket['bucket']] = bucket['n']
+        summary = dict(row)
+        summary['histogram'] = histogram
+        return summary
+
+    def export_question_stats(self, exam_title=None, since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """Yield per-question response counts over matching attempts, by exam and question
+
+        Each exam's questions are paged by keyset on question_idx, chunk_size rows per
+        query, and the connection goes back to the pool before any row is yielded.
+        """
+        where, params = self._export_filter(exam_title, since, until)
+        with self.connection() as conn:
+            exams = conn.execute(
+                f"""SELECT DISTINCT a.exam_title, a.exam_hash FROM attempts a
+                    WHERE {where} ORDER BY a.exam_title, a.exam_hash""",
+                params
+            ).fetchall()
+        for exam in exams:
+            last = -1
+            while True:
+                with self.connection() as conn:
+                    rows = conn.execute(
+                        f"""SELECT r.question_idx,
+                                   COUNT(*) AS responses,
+                                   SUM(r.answer IS NOT NULL) AS answered,
+                                   SUM(r.is_correct) AS correct,
+                                   SUM(r.flagged) AS flagged,
+                                   AVG(r.time_spent) AS mean_time
+                            FROM attempts a JOIN responses r ON r.attempt_id = a.attempt_id
+                            WHERE {where} AND a.exam_title = ? AND r.exam_hash = ? AND r.question_idx > ?
+                            GROUP BY r.question_idx
+                            ORDER BY r.question_idx LIMIT ?""",
+                        (*params, exam['exam_title'], exam['exam_hash'], last, chunk_size)
+                    ).fetchall()
+                for row in rows:
+                    yield {'exam_title': exam['exam_title'], 'exam_hash': exam['exam_hash'], **dict(row)}
+                if len(rows) < chunk_size:
+                    break
+                last = rows[-1]['question_idx']
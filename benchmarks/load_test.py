@@ -0,0 +1,266 @@
+"""
+Multi-session load test for the exam app
+Drives simulated candidates through welcome -> setup -> exam -> results -> review with
+Streamlit's AppTest against a synthetic bank, then reports rerun latency percentiles per
+screen, memory per session and throughput. Results can be stored as a baseline and later
+runs compared against it, failing when a latency or memory figure regresses
+
+    python benchmarks/load_test.py --sessions 20 --concurrency 4 --bank-size 5000
+    python benchmarks/load_test.py --save-baseline     record benchmarks/baseline.json
+    python benchmarks/load_test.py --compare           exit 1 on regression
+
+Baselines are only comparable on the same machine and settings; the settings are stored
+with the baseline and a comparison refuses to run if they differ.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Worker processes import the app modules too
+sys.path.insert(0, ROOT)
+
+# Allowed slowdown before a metric counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Sessions replayed under tracemalloc to measure memory per session
+MEMORY_SESSIONS = 5
+
+SCREENS = ('welcome', 'setup', 'exam', 'results', 'review')
+
+
+def synthetic_exam(size, seed=0):
+    """An exam in the standard schema with size generated questions"""
+    rng = random.Random(seed)
+    words = ("rotator cuff gait stance swing shoulder knee ligament tendon muscle nerve spine "
+             "cervical lumbar hip ankle scapula patella meniscus fascia").split()
+    questions = []
+    for idx in range(size):
+        stem = " ".join(rng.choices(words, k=12))
+        questions.append({
+            'question': f"Q{idx + 1}: which finding best explains {stem}?",
+            'options': {opt: " ".join(rng.choices(words, k=6)) for opt in 'ABCD'},
+            'explanations': {opt: " ".join(rng.choices(words, k=20)) for opt in 'ABCD'},
+            'correct_answer': rng.choice('ABCD'),
+            'difficulty': rng.choice(['easy', 'medium', 'hard']),
+            'topic': rng.choice(words[:6]),
+        })
+    return {'exam_title': f"Synthetic bank ({size} questions)", 'questions': questions}
+
+
+def _button(at, prefix):
+    for button in at.button:
+        if button.label.startswith(prefix):
+            return button
+    raise LookupError(f"no button starting with {prefix!r}: {[b.label for b in at.button]}")
+
+
+class Session:
+    """One simulated candidate; records (screen, seconds) for every rerun"""
+
+    def __init__(self, exam_hash, exam_data, answers, timeout, seed):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.exam_hash = exam_hash
+        self.exam_data = exam_data
+        self.answers = answers
+        self.rng = random.Random(seed)
+        self.timings = []
+
+    def _run(self, screen, action=None):
+        if action:
+            action()
+        started = time.perf_counter()
+        self.at.run()
+        self.timings.append((screen, time.perf_counter() - started))
+        if self.at.exception:
+            raise RuntimeError(f"{screen}: {self.at.exception[0].value}")
+
+    def run(self):
+        at = self.at
+        self._run('welcome')
+        # AppTest cannot drive the file uploader; load the exam as the uploader would
+        at.session_state['exam_data'] = self.exam_data
+        at.session_state['exam_hash'] = self.exam_hash
+        self._run('setup')
+        self._run('exam', _button(at, "🚀 Start Exam").click)
+        for _ in range(self.answers):
+            at.radio[0].set_value(self.rng.choice('ABCD'))
+            self._run('exam', _button(at, "✓ Submit").click)
+            self._run('exam', _button(at, "Next").click)
+        self._run('results', _button(at, "⏸️").click)
+        self._run('review', _button(at, "📊 View Review").click)
+        return self.timings
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    if not len(values):
+        return {}
+    return {
+        'count': int(len(values)),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(values.max()), 2),
+    }
+
+
+def load_exam(bank_size, seed):
+    """Register the synthetic bank as an upload would; returns (exam_hash, exam_data)"""
+    from exam_registry import ExamRegistry
+
+    return ExamRegistry().load(json.dumps(synthetic_exam(bank_size, seed)).encode('utf-8'))
+
+
+def run_sessions(bank_size, answers, seeds, timeout):
+    """Run simulated sessions one after another in this process
+
+    Returns (timings per session, seconds spent after the warm-up session).
+    """
+    exam_hash, exam_data = load_exam(bank_size, 0)
+    # Warm-up session: imports, cached resources and bytecode are not part of the numbers
+    Session(exam_hash, exam_data, 1, timeout, 0).run()
+    started = time.perf_counter()
+    timings = [Session(exam_hash, exam_data, answers, timeout, seed).run() for seed in seeds]
+    return timings, time.perf_counter() - started
+
+
+def run_benchmark(sessions, concurrency, bank_size, answers, timeout=60, seed=0):
+    """Run the load test and return the report
+
+    AppTest is not thread-safe, so concurrent candidates are separate processes sharing
+    the same database, journal and bank directories.
+    """
+    answers = min(answers, bank_size - 1)
+    seeds = [seed + i + 1 for i in range(sessions)]
+    shards = [seeds[i::concurrency] for i in range(concurrency) if seeds[i::concurrency]]
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [pool.submit(run_sessions, bank_size, answers, shard, timeout) for shard in shards]
+        outcomes = [future.result() for future in futures]
+    results = [session for timings, _ in outcomes for session in timings]
+    elapsed = max(seconds for _, seconds in outcomes)
+
+    # Memory is measured in a separate pass because tracing allocations slows every rerun
+    exam_hash, exam_data = load_exam(bank_size, 0)
+    Session(exam_hash, exam_data, 1, timeout, 0).run()
+    memory_sessions = min(sessions, MEMORY_SESSIONS)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    live = [Session(exam_hash, exam_data, answers, timeout, s) for s in seeds[:memory_sessions]]
+    for session in live:
+        session.run()
+    gc.collect()
+    # The sessions are still referenced, so their state counts towards traced memory
+    session_memory = (tracemalloc.get_traced_memory()[0] - before) / memory_sessions
+    tracemalloc.stop()
+
+    timings = [t for session in results for t in session]
+    by_screen = {screen: percentiles([s for name, s in timings if name == screen]) for screen in SCREENS}
+    return {
+        'settings': {
+            'sessions': sessions,
+            'concurrency': concurrency,
+            'bank_size': bank_size,
+            'answers': answers,
+            'python': sys.version.split()[0],
+            'cpus': os.cpu_count(),
+        },
+        'reruns': percentiles([s for _, s in timings]),
+        'screens': by_screen,
+        'memory_per_session_kb': round(session_memory / 1024, 1),
+        'throughput': {
+            'reruns_per_s': round(len(timings) / elapsed, 1),
+            'sessions_per_s': round(sessions / elapsed, 2),
+            'elapsed_s': round(elapsed, 2),
+        },
+    }
+
+
+def compare(report, baseline, tolerance):
+    """List metrics in report that are worse than baseline by more than tolerance"""
+    regressions = []
+
+    def check(name, current, previous):
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{name}: {current} vs baseline {previous} (+{(current / previous - 1) * 100:.0f}%)")
+
+    for stat in ('p50_ms', 'p95_ms', 'p99_ms'):
+        check(f"reruns {stat}", report['reruns'][stat], baseline['reruns'].get(stat))
+        for screen in SCREENS:
+            current = report['screens'].get(screen, {}).get(stat)
+            previous = baseline['screens'].get(screen, {}).get(stat)
+            if current is not None:
+                check(f"{screen} {stat}", current, previous)
+    check("memory_per_session_kb", report['memory_per_session_kb'], baseline['memory_per_session_kb'])
+    # Lower throughput is a regression, so compare the inverse
+    check("seconds per rerun", 1 / report['throughput']['reruns_per_s'], 1 / baseline['throughput']['reruns_per_s'])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the exam app with simulated sessions")
+    parser.add_argument('--sessions', type=int, default=20, help="simulated candidates")
+    parser.add_argument('--concurrency', type=int, default=4, help="sessions running at once")
+    parser.add_argument('--bank-size', type=int, default=1000, help="questions in the synthetic bank")
+    parser.add_argument('--answers', type=int, default=10, help="questions each candidate answers")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--compare', action='store_true', help="exit 1 if this run regresses on the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before failing")
+    parser.add_argument('-o', '--output', help="also write the report JSON here")
+    args = parser.parse_args(argv)
+
+    # Point every store at a scratch directory before the app modules are imported
+    scratch = tempfile.mkdtemp(prefix="physio-bench-")
+    os.environ.setdefault("PHYSIO_DB_PATH", os.path.join(scratch, "bench.db"))
+    os.environ.setdefault("PHYSIO_SEARCH_DB_PATH", os.path.join(scratch, "index.db"))
+    os.environ.setdefault("PHYSIO_JOURNAL_DIR", os.path.join(scratch, "journals"))
+    os.environ.setdefault("PHYSIO_BANK_DIR", os.path.join(scratch, "banks"))
+    os.environ.setdefault("PHYSIO_IMAGE_CACHE_DIR", os.path.join(scratch, "images"))
+    os.environ.setdefault("PHYSIO_CATALOG_DIR", os.path.join(scratch, "catalog"))
+
+    report = run_benchmark(args.sessions, args.concurrency, args.bank_size, args.answers, seed=args.seed)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+
+    if args.compare:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        if baseline['settings'] != report['settings']:
+            sys.exit(f"Baseline settings differ: {baseline['settings']} vs {report['settings']}")
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Headless bulk grading of answer sheets
+Sheets from paper or offline sittings are read in chunks, packed into the same int8 code
+matrix used by item analysis and graded with whole-array comparisons against the answer
+key. Per-candidate results stream out as they are graded and cohort statistics are kept
+in fixed-size accumulators, so memory stays flat for millions of sheets. Chunks can be
+graded on several processes
+
+Sheet formats:
+    JSONL  {"candidate_id": "c1", "answers": ["A", null, "C", ...], "flagged": [4]}
+           answers may also be {"1": "A", "3": "C"}; question numbers are 1-based
+    CSV    candidate_id,Q1,Q2,...  with a letter, blank, or F (flagged) in each cell
+    Unreadable JSONL lines are skipped and reported as invalid_sheets in the summary
+
+    python bulk_grade.py exam.json sheets.jsonl -o results.csv --summary summary.json -w 4
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from exam_schema import OPTION_KEYS, validate_exam
+from item_analysis import FLAGGED, UNANSWERED, answer_key
+
+CHUNK_SIZE = 10000
+
+FLAG_MARKS = {'F', 'FLAG', 'FLAGGED', '*'}
+
+RESULT_FIELDS = ['candidate_id', 'correct', 'total', 'answered', 'flagged', 'percentage']
+
+_CODES = {opt: code for code, opt in enumerate(OPTION_KEYS)}
+
+# Exact-match lookup for the common cell values; anything else takes the slow path
+_FAST_CODES = {None: UNANSWERED, '': UNANSWERED}
+for _opt, _code in _CODES.items():
+    _FAST_CODES[_opt] = _FAST_CODES[_opt.lower()] = _code
+for _mark in FLAG_MARKS:
+    _FAST_CODES[_mark] = _FAST_CODES[_mark.lower()] = FLAGGED
+_INVALID = object()
+
+# Per-worker state, set by _init_worker
+_worker_key = None
+_worker_difficulties = None
+
+
+def _cell_code(value):
+    """Code for one answer cell; returns None for an unreadable mark"""
+    if value is None:
+        return UNANSWERED
+    value = str(value).strip().upper()
+    if not value:
+        return UNANSWERED
+    if value in FLAG_MARKS:
+        return FLAGGED
+    return _CODES.get(value)
+
+
+def _row_codes(values):
+    """Codes for a sequence of cells; returns (codes, invalid count)"""
+    codes = [_FAST_CODES.get(value, _INVALID) if isinstance(value, (str, type(None))) else _INVALID
+             for value in values]
+    invalid = 0
+    if _INVALID in codes:
+        for pos, code in enumerate(codes):
+            if code is _INVALID:
+                code = _cell_code(values[pos])
+                if code is None:
+                    invalid += 1
+                    code = UNANSWERED
+                codes[pos] = code
+    return codes, invalid
+
+
+def _question_index(number, question_count):
+    """0-based index for a 1-based question number, or None if it is not a valid one"""
+    try:
+        idx = int(number) - 1
+    except (TypeError, ValueError):
+        return None
+    return idx if 0 <= idx < question_count else None
+
+
+def encode_json_sheets(lines, question_count):
+    """Parse JSONL sheets into (candidate_ids, code matrix, invalid mark count, invalid sheet count)
+
+    Lines that are not a JSON object with a list or object of answers and a list of
+    flags are left out of the matrix and counted as invalid sheets.
+    """
+    candidates = []
+    matrix = np.full((len(lines), question_count), UNANSWERED, dtype=np.int8)
+    invalid = 0
+    invalid_sheets = 0
+    for line in lines:
+        try:
+            sheet = json.loads(line)
+        except ValueError:
+            sheet = None
+        if not isinstance(sheet, dict):
+            invalid_sheets += 1
+            continue
+        answers = sheet.get('answers') or {}
+        flagged = sheet.get('flagged') or []
+        if not isinstance(answers, (dict, list)) or not isinstance(flagged, list):
+            invalid_sheets += 1
+            continue
+        row = len(candidates)
+        candidates.append(str(sheet.get('candidate_id', '')))
+        if isinstance(answers, dict):
+            for number, value in answers.items():
+                idx = _question_index(number, question_count)
+                code = _cell_code(value)
+                if code is None or idx is None:
+                    invalid += 1
+                    continue
+                matrix[row, idx] = code
+        else:
+            codes, bad = _row_codes(answers[:question_count])
+            matrix[row, :len(codes)] = codes
+            invalid += bad + max(0, len(answers) - question_count)
+        for number in flagged:
+            idx = _question_index(number, question_count)
+            if idx is None:
+                invalid += 1
+                continue
+            matrix[row, idx] = FLAGGED
+    return candidates, matrix[:len(candidates)], invalid, invalid_sheets
+
+
+def encode_csv_sheets(rows, columns, question_count):
+    """Parse CSV rows into (candidate_ids, code matrix, invalid mark count)
+
+    columns maps each question index to its column position in the row.
+    """
+    candidates = []
+    matrix = np.full((len(rows), question_count), UNANSWERED, dtype=np.int8)
+    invalid = 0
+    indices = [idx for idx, _ in columns]
+    for row, values in enumerate(rows):
+        candidates.append(values[0] if values else '')
+        cells = [values[col] if col < len(values) else '' for _, col in columns]
+        codes, bad = _row_codes(cells)
+        matrix[row, indices] = codes
+        invalid += bad
+    return candidates, matrix, invalid
+
+
+def grade_matrix(matrix, key):
+    """Per-sheet (correct, total, answered, flagged, percentage) arrays"""
+    flagged = (matrix == FLAGGED).sum(axis=1)
+    answered = (matrix >= 0).sum(axis=1)
+    correct = (matrix == key[None, :]).sum(axis=1)
+    total = matrix.shape[1] - flagged
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = np.where(total > 0, correct / total * 100, 0.0)
+    return correct, total, answered, flagged, percentage
+
+
+class CohortSummary:
+    """Fixed-size running statistics over graded sheets; partial summaries merge"""
+
+    def __init__(self, question_count, difficulties):
+        self.sheets = 0
+        self.invalid_sheets = 0
+        self.invalid_marks = 0
+        self.percentage_sum = 0.0
+        self.percentage_sq_sum = 0.0
+        self.min = None
+        self.max = None
+        # One bin per whole percentage point gives percentiles without keeping the scores
+        self.histogram = np.zeros(101, dtype=np.int64)
+        self.question_correct = np.zeros(question_count, dtype=np.int64)
+        self.question_valid = np.zeros(question_count, dtype=np.int64)
+        self.question_flagged = np.zeros(question_count, dtype=np.int64)
+        self.option_counts = np.zeros((question_count, len(OPTION_KEYS)), dtype=np.int64)
+        self.difficulties = difficulties
+
+    def add(self, matrix, key, percentage, invalid=0, invalid_sheets=0):
+        self.invalid_sheets += invalid_sheets
+        if not len(matrix):
+            return
+        self.sheets += len(matrix)
+        self.invalid_marks += invalid
+        self.percentage_sum += float(percentage.sum())
+        self.percentage_sq_sum += float((percentage ** 2).sum())
+        low, high = float(percentage.min()), float(percentage.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.histogram += np.bincount(np.floor(percentage).astype(np.int64).clip(0, 100), minlength=101)
+        self.question_correct += (matrix == key[None, :]).sum(axis=0)
+        self.question_valid += (matrix != FLAGGED).sum(axis=0)
+        self.question_flagged += (matrix == FLAGGED).sum(axis=0)
+        for code in range(len(OPTION_KEYS)):
+            self.option_counts[:, code] += (matrix == code).sum(axis=0)
+
+    def merge(self, other):
+        self.invalid_sheets += other.invalid_sheets
+        if not other.sheets:
+            return
+        self.sheets += other.sheets
+        self.invalid_marks += other.invalid_marks
+        self.percentage_sum += other.percentage_sum
+        self.percentage_sq_sum += other.percentage_sq_sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.histogram += other.histogram
+        self.question_correct += other.question_correct
+        self.question_valid += other.question_valid
+        self.question_flagged += other.question_flagged
+        self.option_counts += other.option_counts
+
+    def _percentile(self, p):
+        cumulative = np.cumsum(self.histogram)
+        return int(np.searchsorted(cumulative, p / 100 * self.sheets))
+
+    def report(self):
+        """Cohort summary as plain JSON-serialisable data"""
+        if not self.sheets:
+            return {'sheets': 0, 'invalid_sheets': self.invalid_sheets}
+        mean = self.percentage_sum / self.sheets
+        variance = max(0.0, self.percentage_sq_sum / self.sheets - mean ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p_value = self.question_correct / self.question_valid
+        by_difficulty = {}
+        for difficulty in sorted(set(self.difficulties)):
+            mask = np.array([d == difficulty for d in self.difficulties])
+            valid = int(self.question_valid[mask].sum())
+            by_difficulty[difficulty] = round(float(self.question_correct[mask].sum()) / valid * 100, 2) if valid else None
+        return {
+            'sheets': self.sheets,
+            'mean_percentage': round(mean, 2),
+            'std_percentage': round(float(np.sqrt(variance)), 2),
+            'min_percentage': round(self.min, 2),
+            'max_percentage': round(self.max, 2),
+            # Percentiles are to the nearest whole percentage point
+            'p10_percentage': self._percentile(10),
+            'median_percentage': self._percentile(50),
+            'p90_percentage': self._percentile(90),
+            'percent_correct_by_difficulty': by_difficulty,
+            'invalid_sheets': self.invalid_sheets,
+            'invalid_marks': self.invalid_marks,
+            'questions': [
+                {
+                    'question': idx + 1,
+                    'p_value': None if np.isnan(p_value[idx]) else round(float(p_value[idx]), 3),
+                    'flagged': int(self.question_flagged[idx]),
+                    **{f"{opt}_count": int(self.option_counts[idx, k]) for k, opt in enumerate(OPTION_KEYS)},
+                }
+                for idx in range(len(p_value))
+            ],
+        }
+
+
+def grade_chunk(chunk, key, difficulties, csv_columns=None):
+    """Grade one chunk of raw sheets; returns (result rows, partial CohortSummary)"""
+    if csv_columns is None:
+        candidates, matrix, invalid, invalid_sheets = encode_json_sheets(chunk, len(key))
+    else:
+        candidates, matrix, invalid = encode_csv_sheets(chunk, csv_columns, len(key))
+        invalid_sheets = 0
+    correct, total, answered, flagged, percentage = grade_matrix(matrix, key)
+    rows = [
+        (candidate, int(c), int(t), int(a), int(f), round(float(p), 2))
+        for candidate, c, t, a, f, p in zip(candidates, correct, total, answered, flagged, percentage)
+    ]
+    summary = CohortSummary(len(key), difficulties)
+    summary.add(matrix, key, percentage, invalid, invalid_sheets)
+    return rows, summary
+
+
+def _init_worker(key, difficulties):
+    global _worker_key, _worker_difficulties
+    _worker_key = key
+    _worker_difficulties = difficulties
+
+
+def _grade_in_worker(chunk, csv_columns):
+    return grade_chunk(chunk, _worker_key, _worker_difficulties, csv_columns)
+
+
+def read_chunks(path, question_count, chunk_size=CHUNK_SIZE):
+    """Yield (chunk, csv_columns) from a JSONL or CSV sheet file without loading it whole"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = []
+            for col, name in enumerate(header[1:], start=1):
+                number = name.strip().upper().lstrip('Q')
+                if number.isdigit() and 1 <= int(number) <= question_count:
+                    columns.append((int(number) - 1, col))
+            while True:
+                chunk = list(islice(reader, chunk_size))
+                if not chunk:
+                    return
+                yield chunk, columns
+        else:
+            lines = (line for line in f if line.strip())
+            while True:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    return
+                yield chunk, None
+
+
+def grade_file(path, exam_data, workers=1, chunk_size=CHUNK_SIZE):
+    """Yield per-chunk result rows in input order; the summary is in the final StopIteration
+
+    Use grade_stream for the common case.
+    """
+    key = answer_key(exam_data['questions'])
+    difficulties = [q.get('difficulty') or 'unknown' for q in exam_data['questions']]
+    summary = CohortSummary(len(key), difficulties)
+    chunks = read_chunks(path, len(key), chunk_size)
+
+    if workers <= 1:
+        for chunk, columns in chunks:
+            rows, partial = grade_chunk(chunk, key, difficulties, columns)
+            summary.merge(partial)
+            yield rows
+        return summary
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(key, difficulties)) as pool:
+        # Ordered window of a couple of chunks per worker bounds memory like pdf_ingest
+        window = workers * 2
+        in_flight = deque()
+        for chunk, columns in chunks:
+            in_flight.append(pool.submit(_grade_in_worker, chunk, columns))
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            rows, partial = in_flight.popleft().result()
+            next_chunk = next(chunks, None)
+            if next_chunk is not None:
+                in_flight.append(pool.submit(_grade_in_worker, *next_chunk))
+            summary.merge(partial)
+            yield rows
+    return summary
+
+
+def grade_stream(path, exam_data, write_row, workers=1, chunk_size=CHUNK_SIZE):
+    """Grade every sheet in path, calling write_row(row) in input order; returns the cohort report"""
+    chunks = grade_file(path, exam_data, workers, chunk_size)
+    while True:
+        try:
+            rows = next(chunks)
+        except StopIteration as done:
+            return done.value.report()
+        for row in rows:
+            write_row(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade answer sheets against an exam's answer key")
+    parser.add_argument('exam', help="exam JSON")
+    parser.add_argument('sheets', help="answer sheets (.jsonl or .csv)")
+    parser.add_argument('-o', '--output', help="per-candidate results, .csv or .jsonl (default: CSV on stdout)")
+    parser.add_argument('--summary', help="write the cohort summary JSON here (default: stderr)")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="grading processes (default: 1; 0 for CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="sheets per chunk")
+    args = parser.parse_args(argv)
+
+    with open(args.exam, 'r', encoding='utf-8') as f:
+        exam_data = validate_exam(json.load(f))
+    workers = args.workers or os.cpu_count() or 1
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if args.output and args.output.lower().endswith('.jsonl'):
+            def write_row(row):
+                out.write(json.dumps(dict(zip(RESULT_FIELDS, row)), ensure_ascii=False) + "\n")
+        else:
+            writer = csv.writer(out)
+            writer.writerow(RESULT_FIELDS)
+            write_row = writer.writerow
+        report = grade_stream(args.sheets, exam_data, write_row, workers, args.chunk_size)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        report = {k: v for k, v in report.items() if k != 'questions'}
+        print(json.dumps(report, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Synchronized cohort exams
+A cohort is one paper sat by many candidates with a shared start time and deadline.
+Cohorts are persisted in SQLite; live progress is kept by an in-process aggregator per
+cohort that every answer, flag and finish updates in O(1), so the proctor dashboard
+reads counters and histograms instead of scanning candidates' session state
+"""
+import secrets
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from attempt_store import DB_PATH, POOL_SIZE, SqliteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cohorts (
+    cohort_id       TEXT PRIMARY KEY,
+    proctor_key     TEXT NOT NULL UNIQUE,
+    exam_hash       TEXT NOT NULL,
+    title           TEXT NOT NULL,
+    question_count  INTEGER NOT NULL,
+    start_at        REAL NOT NULL,
+    deadline        REAL NOT NULL,
+    shuffle         INTEGER NOT NULL,
+    created_at      REAL NOT NULL
+);
+"""
+
+# Progress and score distributions are shown in 10% bins; 100% shares the top bin
+DISTRIBUTION_BINS = 10
+LEADERBOARD_SIZE = 10
+
+# Questions need this many responses before they are ranked as hardest
+MIN_RESPONSES = 5
+
+
+def _bin(value, total):
+    if total <= 0:
+        return 0
+    return min(DISTRIBUTION_BINS - 1, value * DISTRIBUTION_BINS // total)
+
+
+class CohortAggregator:
+    """Live counters for one cohort, updated in O(1) per response
+
+    Each candidate's progress and score fall in one bin of two histograms, and in one
+    bucket of a by-correct-count index for the leaderboard; an update moves it between
+    bins and buckets. Snapshots are cached until the next update, so any number of
+    proctor refreshes cost one snapshot per change.
+    """
+
+    def __init__(self, question_count):
+        self.question_count = question_count
+        # attempt_id -> [user_id, answered, correct, flagged, finished]
+        self._candidates = {}
+        self._progress = [0] * DISTRIBUTION_BINS
+        self._scores = [0] * DISTRIBUTION_BINS
+        # correct count -> attempt ids in the order they reached it (dicts as ordered sets)
+        self._by_correct = [{} for _ in range(question_count + 1)]
+        self._question_answered = np.zeros(question_count, dtype=np.int32)
+        self._question_correct = np.zeros(question_count, dtype=np.int32)
+        self.answered = 0
+        self.correct = 0
+        self.flagged = 0
+        self.finished = 0
+        self.version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _bins(self, candidate):
+        _, answered, correct, flagged, _ = candidate
+        return (_bin(answered + flagged, self.question_count),
+                _bin(correct, self.question_count - flagged))
+
+    def _update(self, attempt_id, candidate, answered=0, correct=0, flagged=0):
+        # Caller holds self._lock
+        progress_bin, score_bin = self._bins(candidate)
+        self._progress[progress_bin] -= 1
+        self._scores[score_bin] -= 1
+        if correct:
+            del self._by_correct[candidate[2]][attempt_id]
+            self._by_correct[candidate[2] + correct][attempt_id] = None
+        candidate[1] += answered
+        candidate[2] += correct
+        candidate[3] += flagged
+        progress_bin, score_bin = self._bins(candidate)
+        self._progress[progress_bin] += 1
+        self._scores[score_bin] += 1
+        self.answered += answered
+        self.correct += correct
+        self.flagged += flagged
+        self.version += 1
+
+    def join(self, attempt_id, user_id, answered=0, correct=0, flagged=0, finished=False):
+        """Add a candidate, with their progress so far when resuming; joining twice is a no-op"""
+        with self._lock:
+            if attempt_id in self._candidates:
+                return
+            candidate = [user_id, 0, 0, 0, False]
+            self._candidates[attempt_id] = candidate
+            self._progress[0] += 1
+            self._scores[0] += 1
+            self._by_correct[0][attempt_id] = None
+            self._update(attempt_id, candidate, answered, correct, flagged)
+            if finished:
+                candidate[4] = True
+                self.finished += 1
+
+    def record_answer(self, attempt_id, idx, is_correct):
+        with self._lock:
+            candidate = self._candidates.get(attempt_id)
+            if candidate is None or candidate[4]:
+                return
+            self._question_answered[idx] += 1
+            self._question_correct[idx] += bool(is_correct)
+            self._update(attempt_id, candidate, answered=1, correct=int(bool(is_correct)))
+
+    def record_flag(self, attempt_id):
+        with self._lock:
+            candidate = self._candidates.get(attempt_id)
+            if candidate is None or candidate[4]:
+                return
+            self._update(attempt_id, candidate, flagged=1)
+
+    def finish(self, attempt_id):
+        with self._lock:
+            candidate = self._candidates.get(attempt_id)
+            if candidate is None or candidate[4]:
+                return
+            candidate[4] = True
+            self.finished += 1
+            self.version += 1
+
+    def leaderboard(self, size=LEADERBOARD_SIZE):
+        """Top candidates by correct answers; ties go to whoever got there first"""
+        with self._lock:
+            return self._leaderboard(size)
+
+    def _leaderboard(self, size):
+        # Caller holds self._lock; walks buckets from the top, so cost is O(questions + size)
+        rows = []
+        for correct in range(self.question_count, -1, -1):
+            for attempt_id in self._by_correct[correct]:
+                user_id, answered, _, flagged, finished = self._candidates[attempt_id]
+                valid = self.question_count - flagged
+                rows.append({
+                    'rank': len(rows) + 1,
+                    'candidate': user_id,
+                    'correct': correct,
+                    'answered': answered,
+                    'score %': round(correct / valid * 100, 1) if valid else 0.0,
+                    'finished': finished,
+                })
+                if len(rows) == size:
+                    return rows
+        return rows
+
+    def snapshot(self):
+        """Counts, distributions, leaderboard and hardest questions, cached per version"""
+        with self._lock:
+            if self._snapshot is not None and self._snapshot['version'] == self.version:
+                return self._snapshot
+            candidates = len(self._candidates)
+            answered = self._question_answered
+            rated = np.flatnonzero(answered >= MIN_RESPONSES)
+            p_values = self._question_correct[rated] / answered[rated]
+            hardest = rated[np.argsort(p_values, kind='stable')][:LEADERBOARD_SIZE]
+            self._snapshot = {
+                'version': self.version,
+                'candidates': candidates,
+                'finished': self.finished,
+                'answered': self.answered,
+                'flagged': self.flagged,
+                'average_answered': self.answered / candidates if candidates else 0.0,
+                'average_correct': self.correct / candidates if candidates else 0.0,
+                'progress': list(self._progress),
+                'scores': list(self._scores),
+                'leaderboard': self._leaderboard(LEADERBOARD_SIZE),
+                'hardest': [
+                    {'question': int(idx) + 1, 'responses': int(answered[idx]),
+                     'correct %': round(float(self._question_correct[idx] / answered[idx]) * 100, 1)}
+                    for idx in hardest
+                ],
+            }
+            return self._snapshot
+
+
+class CohortRegistry(SqliteStore):
+    """Scheduled cohorts and the live aggregator of each one in use in this process"""
+
+    schema = SCHEMA
+
+    def __init__(self, path=DB_PATH, pool_size=POOL_SIZE):
+        super().__init__(path, pool_size)
+        self._lock = threading.Lock()
+        self._aggregators = {}
+        # attempt_id -> cohort_id, so deadline expiries reach the right aggregator
+        self._attempts = {}
+
+    def create(self, exam_hash, title, question_count, start_at, duration_minutes, shuffle=True):
+        """Schedule a cohort and return it; share cohort_id with candidates, proctor_key with proctors"""
+        cohort = {
+            'cohort_id': uuid.uuid4().hex[:10],
+            'proctor_key': secrets.token_urlsafe(16),
+            'exam_hash': exam_hash,
+            'title': title,
+            'question_count': question_count,
+            'start_at': start_at,
+            'deadline': start_at + duration_minutes * 60,
+            'shuffle': bool(shuffle),
+            'created_at': time.time(),
+        }
+        with self.transaction() as conn:
+            conn.execute(
+                """INSERT INTO cohorts
+                   (cohort_id, proctor_key, exam_hash, title, question_count, start_at, deadline,
+                    shuffle, created_at)
+                   VALUES (:cohort_id, :proctor_key, :exam_hash, :title, :question_count, :start_at,
+                           :deadline, :shuffle, :created_at)""",
+                cohort
+            )
+        return cohort
+
+    def _fetch(self, column, value):
+        with self.connection() as conn:
+            row = conn.execute(f"SELECT * FROM cohorts WHERE {column} = ?", (value,)).fetchone()
+        if row is None:
+            return None
+        cohort = dict(row)
+        cohort['shuffle'] = bool(cohort['shuffle'])
+        return cohort
+
+    def get(self, cohort_id):
+        return self._fetch('cohort_id', cohort_id)
+
+    def by_proctor_key(self, proctor_key):
+        return self._fetch('proctor_key', proctor_key)
+
+    def aggregator(self, cohort):
+        """The live aggregator for a cohort, created on first use"""
+        with self._lock:
+            aggregator = self._aggregators.get(cohort['cohort_id'])
+            if aggregator is None:
+                aggregator = self._aggregators[cohort['cohort_id']] = CohortAggregator(cohort['question_count'])
+            return aggregator
+
+    def join(self, cohort, attempt_id, user_id, **progress):
+        """Add an attempt to its cohort's aggregator and return the aggregator"""
+        aggregator = self.aggregator(cohort)
+        aggregator.join(attempt_id, user_id, **progress)
+        with self._lock:
+            self._attempts[attempt_id] = cohort['cohort_id']
+        return aggregator
+
+    def expire(self, attempt_id):
+        """Deadline sweeper listener: mark an expired cohort attempt finished"""
+        with self._lock:
+            cohort_id = self._attempts.get(attempt_id)
+            aggregator = self._aggregators.get(cohort_id)
+        if aggregator is not None:
+            aggregator.finish(attempt_id)
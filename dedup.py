@@ -0,0 +1,237 @@
+"""
+Near-duplicate question detection with MinHash + LSH
+Each question's stem and options are shingled into word n-grams and summarised by a
+MinHash signature. Signatures are split into bands and bucketed, so candidate pairs are
+found in near-linear time and new questions can be inserted incrementally
+
+    python dedup.py exam.json                 report near-duplicates
+    python dedup.py exam.json -o merged.json  write the exam with duplicates removed
+"""
+import argparse
+import hashlib
+import json
+import logging
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from exam_schema import OPTION_KEYS, difficulty_breakdown, validate_exam
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.8
+
+# DuplicateScanner count for an exam whose scan raised
+SCAN_FAILED = -1
+
+# Mersenne prime for the universal hash family
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def question_text(question):
+    """Stem plus options, which together identify a question"""
+    return " ".join([question['question'], *(question['options'][opt] for opt in OPTION_KEYS)])
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Word n-gram shingles hashed to 32-bit integers"""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), 'little') for g in set(grams)),
+        dtype=np.uint64
+    )
+
+
+class MinHashLSH:
+    """Incremental MinHash/LSH index over questions"""
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, threshold=SIMILARITY_THRESHOLD, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        # 32-bit coefficients keep a * x + b below 2**64 for 32-bit shingle hashes
+        self._a = rng.integers(1, int(_MAX_HASH), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MAX_HASH), size=num_perm, dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def signature(self, text):
+        """MinHash signature of a text: the minimum of each permuted shingle hash"""
+        values = shingles(text)
+        if not len(values):
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # (a * x + b) mod p, truncated to 32 bits, for every shingle and permutation at once
+        hashed = (np.outer(values, self._a) + self._b) % _PRIME & _MAX_HASH
+        return hashed.min(axis=0)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def similarity(self, key_a, key_b):
+        """Estimated Jaccard similarity of two indexed items"""
+        return float(np.mean(self.signatures[key_a] == self.signatures[key_b]))
+
+    def query(self, text=None, signature=None):
+        """Return [(key, similarity)] of indexed items at or above the threshold"""
+        if signature is None:
+            signature = self.signature(text)
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        matches = []
+        for key in candidates:
+            score = float(np.mean(self.signatures[key] == signature))
+            if score >= self.threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda m: -m[1])
+        return matches
+
+    def insert(self, key, text=None, signature=None):
+        """Add an item; returns its near-duplicates found before insertion"""
+        if signature is None:
+            signature = self.signature(text)
+        matches = self.query(signature=signature)
+        self.signatures[key] = signature
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+        return matches
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key):
+        return key in self.signatures
+
+
+def find_duplicates(questions, index=None, key_prefix=''):
+    """Insert questions into an index; returns [(idx, duplicate_of_key, similarity)]
+
+    Pass an existing index to check a new exam against previously added banks.
+    """
+    if index is None:
+        index = MinHashLSH()
+    duplicates = []
+    for idx, question in enumerate(questions):
+        matches = index.insert(f"{key_prefix}{idx}", question_text(question))
+        if matches:
+            duplicates.append((idx, *matches[0]))
+    return duplicates
+
+
+class DuplicateScanner:
+    """Counts near-duplicates per exam on a background thread, so callers never wait on MinHash
+
+    Counts are keyed by exam hash and the most recent max_entries are kept.
+    """
+
+    def __init__(self, max_entries=32, workers=1):
+        self.max_entries = max_entries
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dedup")
+
+    def submit(self, key, questions):
+        """Start counting an exam's near-duplicates unless it is already counted or queued"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = self._executor.submit(self._scan, key, questions)
+                while len(self._futures) > self.max_entries:
+                    self._futures.popitem(last=False)
+            else:
+                self._futures.move_to_end(key)
+            return future
+
+    @staticmethod
+    def _scan(key, questions):
+        try:
+            return len(find_duplicates(questions))
+        except Exception:
+            logger.exception("near-duplicate scan failed for exam %s", key)
+            return SCAN_FAILED
+
+    def count(self, key, questions):
+        """Near-duplicate count for an exam, None while it is being computed or SCAN_FAILED"""
+        future = self.submit(key, questions)
+        return future.result() if future.done() else None
+
+
+class DeduplicatingWriter:
+    """Wraps an ExamWriter and drops questions that near-duplicate ones already written"""
+
+    def __init__(self, writer, index=None):
+        self.writer = writer
+        self.index = MinHashLSH() if index is None else index
+        self.skipped = 0
+
+    def write(self, question):
+        text = question_text(question)
+        signature = self.index.signature(text)
+        if self.index.query(signature=signature):
+            self.skipped += 1
+            return
+        self.writer.write(question)
+        self.index.insert(len(self.index), signature=signature)
+
+
+def merge_duplicates(exam_data, index=None):
+    """Return (exam without near-duplicate questions, duplicates found)
+
+    The first occurrence of each question is kept and difficulty_breakdown is
+    recomputed from the kept questions.
+    """
+    questions = exam_data['questions']
+    duplicates = find_duplicates(questions, index)
+    dropped = {idx for idx, _, _ in duplicates}
+    kept = [q for idx, q in enumerate(questions) if idx not in dropped]
+    breakdown = difficulty_breakdown(kept)
+
+    merged = dict(exam_data)
+    merged['questions'] = kept
+    merged['total_questions'] = len(kept)
+    if breakdown:
+        merged['difficulty_breakdown'] = breakdown
+    return merged, duplicates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find or remove near-duplicate questions in an exam")
+    parser.add_argument('exam', help="exam JSON")
+    parser.add_argument('-o', '--output', help="write the exam with near-duplicates removed")
+    parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                        help="estimated Jaccard similarity treated as a duplicate")
+    args = parser.parse_args(argv)
+
+    with open(args.exam, 'r', encoding='utf-8') as f:
+        exam_data = validate_exam(json.load(f))
+
+    merged, duplicates = merge_duplicates(exam_data, MinHashLSH(threshold=args.threshold))
+    for idx, key, score in duplicates:
+        print(f"question {idx + 1} ~ question {int(key) + 1} (similarity {score:.2f})", file=sys.stderr)
+    print(f"{len(duplicates)} near-duplicates in {len(exam_data['questions'])} questions", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
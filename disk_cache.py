@@ -0,0 +1,43 @@
+"""
+Size-bounded sharded disk caches
+The page text and image caches keep one file per entry under two-character shard
+directories and refresh a file's mtime on every hit, so both are pruned the same way:
+oldest modification time first until the files fit the byte budget
+"""
+import os
+
+
+def prune_lru(directory, max_bytes):
+    """Delete the least-recently-used entries under directory's shards until the total size
+    is at most max_bytes; returns the number of files removed
+
+    Files still being written end in .tmp and are left alone. An entry removed by another
+    process in the meantime is skipped rather than counted.
+    """
+    entries = []
+    total = 0
+    for shard in os.scandir(directory):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    entries.sort()
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        removed += 1
+    return removed
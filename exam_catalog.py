@@ -0,0 +1,294 @@
+"""
+Exam catalog sync
+Banks are pulled from an HTTP catalog into a local revision cache, so candidates pick an
+exam from a list instead of uploading the file. Every request is conditional (ETag /
+If-Modified-Since) over one pooled session, and a bank is only replaced when its content
+hash changes. Any static file server can host the catalog, e.g. `python -m http.server`
+
+Catalog protocol (GET {url}):
+    {"banks": [{"id": "shoulder", "title": "Shoulder Complex", "url": "shoulder.json"}, ...]}
+    bank urls are resolved against the catalog url; banks are exam JSON or .pxqb files
+
+    python exam_catalog.py sync --url http://localhost:8000/catalog.json
+    python exam_catalog.py list
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from exam_registry import content_hash
+from exam_schema import ExamValidationError, validate_exam
+from question_bank import BANK_EXTENSION, is_bank, validate_bank
+
+logger = logging.getLogger(__name__)
+
+CATALOG_URL = os.environ.get("PHYSIO_CATALOG_URL")
+CATALOG_DIR = os.environ.get("PHYSIO_CATALOG_DIR", ".exam_catalog")
+CATALOG_SYNC_INTERVAL = float(os.environ.get("PHYSIO_CATALOG_SYNC_INTERVAL", "300"))
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# Earlier revisions of each bank kept on disk, for attempts still in progress on them
+KEEP_REVISIONS = 3
+
+MANIFEST = "manifest.json"
+
+
+class CatalogError(RuntimeError):
+    """Raised when the catalog or a bank cannot be fetched or is malformed"""
+
+
+def _validators(response):
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def _conditional_headers(entry):
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def check_bank(data):
+    """Return the file extension for valid bank bytes, raising CatalogError otherwise"""
+    try:
+        if is_bank(data):
+            validate_bank(data)
+            return BANK_EXTENSION
+        validate_exam(json.loads(data))
+    except (ValueError, ExamValidationError) as e:
+        raise CatalogError(f"not a valid exam: {e}") from e
+    return '.json'
+
+
+class ExamCatalog:
+    """Local revision cache of the banks listed by an HTTP catalog
+
+    The manifest records, per bank, the current revision (its content hash, which is
+    also its exam registry key), earlier revisions and the HTTP validators of the last
+    fetch. Listing and reading banks never touch the network.
+    """
+
+    def __init__(self, url=CATALOG_URL, directory=CATALOG_DIR, workers=4, timeout=30):
+        self.url = url
+        self.directory = directory
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=RETRY_STATUSES, allowed_methods={'GET'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._sync_lock = threading.Lock()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'banks'), exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def _bank_path(self, revision, extension):
+        return os.path.join(self.directory, 'banks', revision + extension)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'catalog': {}, 'banks': {}}
+        except json.JSONDecodeError:
+            logger.exception("catalog manifest is corrupt; starting from an empty cache")
+            return {'catalog': {}, 'banks': {}}
+
+    def _write_manifest(self, manifest):
+        path = self._manifest_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._manifest = manifest
+
+    def _get(self, url, entry):
+        """Conditional GET; returns None when the cached copy is still current"""
+        try:
+            response = self.session.get(url, headers=_conditional_headers(entry), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise CatalogError(f"{url}: {e}") from e
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            raise CatalogError(f"{url}: HTTP {response.status_code}")
+        return response
+
+    def _fetch_listing(self, manifest):
+        """The catalog's bank listing, re-downloaded only if it changed"""
+        cached = manifest['catalog']
+        response = self._get(self.url, cached if cached.get('listing') is not None else {})
+        if response is None:
+            return cached['listing'], False
+        try:
+            listing = response.json()['banks']
+        except (ValueError, KeyError, TypeError) as e:
+            raise CatalogError(f"{self.url}: malformed catalog") from e
+        if not isinstance(listing, list) or not all(
+                isinstance(item, dict) and 'id' in item and 'url' in item for item in listing):
+            raise CatalogError(f"{self.url}: every catalog entry needs an id and a url")
+        manifest['catalog'] = {'listing': listing, 'fetched_at': time.time(), **_validators(response)}
+        return listing, True
+
+    def _sync_bank(self, item, entry):
+        """Fetch one bank; returns its updated manifest entry and whether its content changed"""
+        url = urljoin(self.url, item['url'])
+        # Validators only apply while the bank is still fetched from the same url
+        response = self._get(url, entry if entry.get('url') == url else {})
+        entry = dict(entry, id=item['id'], title=item.get('title') or item['id'], url=url)
+        if response is None:
+            return entry, False
+        entry.update(_validators(response))
+        data = response.content
+        revision = content_hash(data)
+        if revision == entry.get('revision'):
+            # Servers without validators resend unchanged banks; nothing to apply
+            return entry, False
+
+        extension = check_bank(data)
+        path = self._bank_path(revision, extension)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        history = [entry['revision'], *entry.get('history', [])] if entry.get('revision') else []
+        entry.update(revision=revision, extension=extension, size=len(data),
+                     history=history[:KEEP_REVISIONS], synced_at=time.time())
+        return entry, True
+
+    def sync(self):
+        """Bring the local cache up to date with the catalog
+
+        Returns {'catalog': bool, 'updated': [...], 'unchanged': [...], 'removed': [...],
+        'failed': {id: message}}. A bank that fails keeps its previous revision.
+        """
+        if not self.url:
+            raise CatalogError("no catalog url configured")
+        with self._sync_lock:
+            with self._lock:
+                manifest = json.loads(json.dumps(self._manifest))
+            listing, catalog_changed = self._fetch_listing(manifest)
+            report = {'catalog': catalog_changed, 'updated': [], 'unchanged': [], 'removed': [], 'failed': {}}
+
+            old_banks = manifest['banks']
+            banks = {}
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {item['id']: pool.submit(self._sync_bank, item, old_banks.get(item['id'], {}))
+                           for item in listing}
+                for bank_id, future in futures.items():
+                    try:
+                        entry, changed = future.result()
+                    except CatalogError as e:
+                        logger.warning("catalog bank %s not synced: %s", bank_id, e)
+                        report['failed'][bank_id] = str(e)
+                        if bank_id in old_banks:
+                            banks[bank_id] = old_banks[bank_id]
+                        continue
+                    banks[bank_id] = entry
+                    report['updated' if changed else 'unchanged'].append(bank_id)
+            report['removed'] = [bank_id for bank_id in old_banks if bank_id not in banks]
+
+            manifest['banks'] = banks
+            self._write_manifest(manifest)
+            self._prune(manifest)
+            return report
+
+    def _prune(self, manifest):
+        """Delete bank files no longer referenced by any current or kept revision"""
+        keep = set()
+        for entry in manifest['banks'].values():
+            for revision in (entry['revision'], *entry.get('history', [])):
+                keep.add(revision)
+        directory = os.path.join(self.directory, 'banks')
+        for name in os.listdir(directory):
+            revision, extension = os.path.splitext(name)
+            if extension in ('.json', BANK_EXTENSION) and revision not in keep:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def banks(self):
+        """Banks available locally, sorted by title"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._manifest['banks'].values() if entry.get('revision')]
+        return sorted(entries, key=lambda entry: entry['title'].lower())
+
+    def read(self, bank_id):
+        """Bytes of a bank's current revision, or None if it is not cached"""
+        with self._lock:
+            entry = self._manifest['banks'].get(bank_id)
+        if not entry or not entry.get('revision'):
+            return None
+        try:
+            with open(self._bank_path(entry['revision'], entry['extension']), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def start(self, interval=CATALOG_SYNC_INTERVAL):
+        """Sync now and then every interval seconds from a daemon thread"""
+        def run():
+            while True:
+                try:
+                    report = self.sync()
+                    if report['updated'] or report['removed']:
+                        logger.info("catalog sync: %d updated, %d removed, %d failed",
+                                    len(report['updated']), len(report['removed']), len(report['failed']))
+                except CatalogError as e:
+                    logger.warning("catalog sync failed: %s", e)
+                except Exception:
+                    logger.exception("catalog sync failed")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name="catalog-sync", daemon=True)
+        thread.start()
+        return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync exam banks from an HTTP catalog")
+    parser.add_argument('--dir', default=CATALOG_DIR, help="local catalog cache")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync_cmd = commands.add_parser('sync', help="fetch changed banks")
+    sync_cmd.add_argument('--url', default=CATALOG_URL, required=CATALOG_URL is None, help="catalog url")
+    commands.add_parser('list', help="banks in the local cache")
+    args = parser.parse_args(argv)
+
+    if args.command == 'sync':
+        catalog = ExamCatalog(args.url, args.dir)
+        started = time.perf_counter()
+        try:
+            report = catalog.sync()
+        except CatalogError as e:
+            parser.exit(1, f"sync failed: {e}\n")
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in ExamCatalog(None, args.dir).banks():
+            print(f"{entry['id']:24} {entry['revision'][:12]}  {entry['size']:>10,}  {entry['title']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Process-wide exam registry
+Parses each exam file once, keyed by content hash, and hands sessions a shared read-only view
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+
+from exam_schema import validate_exam
+from question_bank import BANK_EXTENSION, QuestionBank, is_bank, validate_bank
+
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get("PHYSIO_EXAM_CACHE_MB", "512"))
+BANK_DIR = os.environ.get("PHYSIO_BANK_DIR", ".exam_banks")
+
+# Memory charged for a memory-mapped bank: the mapping itself is backed by the page cache
+BANK_ENTRY_SIZE = 4096
+
+
+def content_hash(data):
+    """Return the SHA-256 hex digest used as the registry key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def freeze(value):
+    """Recursively convert dicts and lists into read-only equivalents"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Convert a frozen or bank-backed exam back into plain JSON-serialisable data"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return [thaw(v) for v in value]
+    return value
+
+
+def estimate_size(value):
+    """Approximate deep memory footprint of a parsed exam in bytes"""
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (dict, MappingProxyType)):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return total
+
+
+class ExamRegistry:
+    """Content-addressed LRU cache of parsed, validated, read-only exams"""
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, data):
+        """Return (exam_hash, read-only exam) for raw file bytes, parsing only on a miss"""
+        key = content_hash(data)
+        exam = self.get(key)
+        if exam is not None:
+            return key, exam
+
+        if is_bank(data):
+            exam = self._open_bank(key, data)
+            size = BANK_ENTRY_SIZE
+        else:
+            exam = freeze(validate_exam(json.loads(data)))
+            size = estimate_size(exam)
+            self._spool(key, data, '.json')
+
+        with self._lock:
+            if key in self._entries:
+                # Another session parsed the same file concurrently
+                self._entries.move_to_end(key)
+                return key, self._entries[key][0]
+            self.misses += 1
+            self._entries[key] = (exam, size)
+            self.memory_used += size
+            self._evict()
+        return key, exam
+
+    def get(self, key):
+        """Return a cached exam by hash, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def load_by_hash(self, key):
+        """Return (key, exam) for a previously loaded exam, re-reading its spooled copy if evicted"""
+        exam = self.get(key)
+        if exam is not None:
+            return key, exam
+        for extension in (BANK_EXTENSION, '.json'):
+            path = os.path.join(BANK_DIR, key + extension)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return self.load(f.read())
+        return key, None
+
+    def _spool(self, key, data, extension):
+        """Keep one on-disk copy of each exam source so it survives restarts"""
+        os.makedirs(BANK_DIR, exist_ok=True)
+        path = os.path.join(BANK_DIR, key + extension)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def _open_bank(self, key, data):
+        """Validate an uploaded bank, spool it to disk once and map it read-only"""
+        validate_bank(data)
+        return QuestionBank(self._spool(key, data, BANK_EXTENSION)).as_exam()
+
+    def _evict(self):
+        # Keep at least the most recent entry even if it alone exceeds the budget
+        while self.memory_used > self.memory_budget and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.memory_used -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Return cache counters for display and monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'memory_used': self.memory_used,
+                'memory_budget': self.memory_budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,211 @@
+"""
+Stratified and adaptive exam sampling
+A bank's questions are grouped once into (difficulty, topic) strata held as NumPy index
+arrays. Drawing an exam then only allocates quotas across strata and samples inside each
+one, so a 100-question exam comes out of a 200k-question bank in milliseconds. Questions
+can be weighted by a candidate's past error rate to focus practice on weak areas
+
+    python exam_sampler.py bank.json -n 100 --mix medium=0.6,easy=0.2,hard=0.2 -o exam.json
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from exam_registry import thaw
+from exam_schema import difficulty_breakdown, validate_exam
+from search_index import parse_mix
+
+UNLABELLED = ''
+
+# Beta(1, 1) prior on each question's error rate, so unseen questions score 0.5
+PRIOR_WRONG = 1
+PRIOR_RIGHT = 1
+
+
+def question_topic(question):
+    """A question's topic: its 'topic' field, else its first tag"""
+    topic = question.get('topic')
+    if not topic:
+        tags = question.get('tags') or []
+        topic = tags if isinstance(tags, str) else (tags[0] if tags else UNLABELLED)
+    return str(topic).strip().lower()
+
+
+def _encode(labels):
+    """Map labels to small integer codes; returns (codes, names)"""
+    names = sorted(set(labels))
+    code_of = {name: code for code, name in enumerate(names)}
+    return np.fromiter((code_of[label] for label in labels), dtype=np.int32, count=len(labels)), names
+
+
+def _round_quotas(shares, total):
+    """Largest-remainder rounding of shares (summing to 1) to integers summing to total"""
+    exact = shares * total
+    quotas = np.floor(exact).astype(np.int64)
+    short = total - int(quotas.sum())
+    if short > 0:
+        quotas[np.argsort(quotas - exact, kind='stable')[:short]] += 1
+    return quotas
+
+
+def _fill(quotas, capacity, shares, amount):
+    """Add up to amount to quotas, in proportion to shares, without exceeding capacity"""
+    while amount > 0:
+        spare = capacity - quotas
+        if spare.sum() == 0:
+            break
+        weights = np.where(spare > 0, shares + 1e-9, 0.0)
+        extra = np.minimum(_round_quotas(weights / weights.sum(), min(amount, int(spare.sum()))), spare)
+        if not extra.any():
+            extra[np.argmax(spare)] = 1
+        quotas += extra
+        amount -= int(extra.sum())
+    return quotas
+
+
+def error_weights(counts, question_count, focus=0.7):
+    """Sampling weights that favour questions a candidate tends to get wrong
+
+    counts is {question_idx: (answered, wrong)} as returned by
+    AttemptStore.user_error_counts. focus=0 samples uniformly; focus=1 weights
+    purely by the smoothed error rate.
+    """
+    answered = np.zeros(question_count)
+    wrong = np.zeros(question_count)
+    for idx, (n_answered, n_wrong) in counts.items():
+        if 0 <= idx < question_count:
+            answered[idx] = n_answered
+            wrong[idx] = n_wrong
+    error_rate = (wrong + PRIOR_WRONG) / (answered + PRIOR_WRONG + PRIOR_RIGHT)
+    # Scale so an unseen question keeps weight 1 at any focus
+    return (1 - focus) + focus * 2 * error_rate
+
+
+class ExamSampler:
+    """Draws fresh exams from a bank with difficulty and topic quotas"""
+
+    def __init__(self, questions):
+        self.question_count = len(questions)
+        difficulties = [str(q.get('difficulty') or UNLABELLED).lower() for q in questions]
+        topics = [question_topic(q) for q in questions]
+        self.difficulty_codes, self.difficulties = _encode(difficulties)
+        self.topic_codes, self.topics = _encode(topics)
+
+        # One sort groups question indices by stratum; each stratum is a slice of it
+        cells = self.difficulty_codes * len(self.topics) + self.topic_codes
+        order = np.argsort(cells, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(cells[order], np.arange(len(self.difficulties) * len(self.topics) + 1))
+        self.capacity = np.diff(bounds).reshape(len(self.difficulties), len(self.topics))
+        self._strata = [order[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    @staticmethod
+    def _mix_shares(mix, names):
+        """Normalised share per label, or None to follow the bank's own proportions"""
+        if not mix:
+            return None
+        shares = np.array([float(mix.get(name, 0)) for name in names])
+        if shares.sum() <= 0:
+            raise ValueError(f"mix {mix} matches none of {', '.join(n or '(none)' for n in names)}")
+        return shares / shares.sum()
+
+    def allocate(self, total, difficulty_mix=None, topic_mix=None):
+        """Questions to draw from each (difficulty, topic) stratum
+
+        Requested mixes are honoured as closely as the bank allows; a stratum that runs
+        short is topped up from the same difficulty first, then from the rest of the bank.
+        """
+        capacity = self.capacity
+        total = min(total, int(capacity.sum()))
+        p_difficulty = self._mix_shares(difficulty_mix, self.difficulties)
+        p_topic = self._mix_shares(topic_mix, self.topics)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if p_difficulty is not None and p_topic is not None:
+                shares = np.outer(p_difficulty, p_topic)
+            elif p_difficulty is not None:
+                within = capacity / capacity.sum(axis=1, keepdims=True)
+                shares = p_difficulty[:, None] * np.nan_to_num(within)
+            elif p_topic is not None:
+                within = capacity / capacity.sum(axis=0, keepdims=True)
+                shares = p_topic[None, :] * np.nan_to_num(within)
+            else:
+                shares = capacity / capacity.sum()
+        shares = shares / shares.sum()
+
+        quotas = np.minimum(_round_quotas(shares.ravel(), total).reshape(shares.shape), capacity)
+        if p_difficulty is not None:
+            row_targets = _round_quotas(shares.sum(axis=1), total)
+            for row in range(len(self.difficulties)):
+                missing = int(row_targets[row] - quotas[row].sum())
+                if missing > 0:
+                    quotas[row] = _fill(quotas[row], capacity[row], shares[row], missing)
+        missing = total - int(quotas.sum())
+        if missing > 0:
+            quotas = _fill(quotas.ravel(), capacity.ravel(), shares.ravel(), missing).reshape(shares.shape)
+        return quotas
+
+    def sample(self, total, difficulty_mix=None, topic_mix=None, weights=None, seed=None):
+        """Draw question indices for a fresh exam, shuffled
+
+        weights is an optional per-question array (e.g. from error_weights); inside each
+        stratum questions are drawn without replacement with probability proportional
+        to their weight.
+        """
+        rng = np.random.default_rng(seed)
+        quotas = self.allocate(total, difficulty_mix, topic_mix).ravel()
+        picked = []
+        for stratum, quota in zip(self._strata, quotas):
+            if quota == 0:
+                continue
+            if quota >= len(stratum):
+                picked.append(stratum)
+            elif weights is None:
+                picked.append(rng.choice(stratum, quota, replace=False))
+            else:
+                # Efraimidis-Spirakis: the k smallest Exp(1) / w keys are a weighted sample
+                keys = rng.exponential(size=len(stratum)) / np.maximum(weights[stratum], 1e-12)
+                picked.append(stratum[np.argpartition(keys, quota - 1)[:quota]])
+        if not picked:
+            return np.empty(0, dtype=np.int32)
+        return rng.permutation(np.concatenate(picked))
+
+
+def sampled_exam(exam_data, indices, exam_title=None, **extra):
+    """Build an exam in the standard schema from the drawn question indices"""
+    questions = [thaw(exam_data['questions'][int(idx)]) for idx in indices]
+    return {
+        'exam_title': exam_title or exam_data['exam_title'],
+        'total_questions': len(questions),
+        'difficulty_breakdown': difficulty_breakdown(questions),
+        'questions': questions,
+        **extra,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Draw a fresh exam from a large question bank")
+    parser.add_argument('bank', help="exam JSON to sample from")
+    parser.add_argument('-n', '--total', type=int, required=True, help="questions in the new exam")
+    parser.add_argument('--mix', type=parse_mix, help="difficulty shares, e.g. medium=0.6,easy=0.2,hard=0.2")
+    parser.add_argument('--topics', type=parse_mix, help="topic shares, e.g. gait=1,shoulder=1")
+    parser.add_argument('--seed', type=int, help="random seed for a reproducible draw")
+    parser.add_argument('--title', help="title of the new exam")
+    parser.add_argument('-o', '--output', required=True, help="exam JSON to write")
+    args = parser.parse_args(argv)
+
+    with open(args.bank, 'r', encoding='utf-8') as f:
+        bank = validate_exam(json.load(f))
+
+    sampler = ExamSampler(bank['questions'])
+    indices = sampler.sample(args.total, args.mix, args.topics, seed=args.seed)
+    exam = sampled_exam(bank, indices, args.title)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(exam, f, ensure_ascii=False, indent=2)
+    print(f"Drew {len(indices)} of {len(bank['questions'])} questions: {exam['difficulty_breakdown']}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Exam file schema shared by the app, the bank converter and the tools
+"""
+import json
+import os
+
+OPTION_KEYS = ('A', 'B', 'C', 'D')
+
+
+class ExamValidationError(ValueError):
+    """Raised when an exam file does not match the expected schema"""
+
+
+def validate_question(q, idx=0):
+    """Check a single question; idx is only used in error messages"""
+    if not isinstance(q, dict):
+        raise ExamValidationError(f"question {idx + 1} must be a JSON object")
+    for field in ('question', 'options', 'explanations', 'correct_answer'):
+        if field not in q:
+            raise ExamValidationError(f"question {idx + 1} is missing '{field}'")
+    for field in ('options', 'explanations'):
+        if not isinstance(q[field], dict):
+            raise ExamValidationError(f"question {idx + 1} '{field}' must be a JSON object")
+        missing = [opt for opt in OPTION_KEYS if opt not in q[field]]
+        if missing:
+            raise ExamValidationError(
+                f"question {idx + 1} '{field}' is missing {', '.join(missing)}"
+            )
+    if not isinstance(q['correct_answer'], str) or q['correct_answer'] not in OPTION_KEYS:
+        raise ExamValidationError(
+            f"question {idx + 1} has invalid correct_answer {q['correct_answer']!r}"
+        )
+    # Images are referenced by a path relative to the asset directory, never embedded
+    if 'image' in q and (not isinstance(q['image'], str) or not q['image']):
+        raise ExamValidationError(f"question {idx + 1} 'image' must be a file path")
+    return q
+
+
+def difficulty_breakdown(questions):
+    """Count questions per difficulty label"""
+    breakdown = {}
+    for q in questions:
+        difficulty = q.get('difficulty')
+        if difficulty:
+            breakdown[difficulty] = breakdown.get(difficulty, 0) + 1
+    return breakdown
+
+
+def validate_exam(exam_data):
+    """Check the exam schema used by the app and fill in derived fields"""
+    if not isinstance(exam_data, dict):
+        raise ExamValidationError("exam file must contain a JSON object")
+    if 'exam_title' not in exam_data:
+        raise ExamValidationError("missing 'exam_title'")
+
+    questions = exam_data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        raise ExamValidationError("'questions' must be a non-empty list")
+
+    for idx, q in enumerate(questions):
+        validate_question(q, idx)
+
+    exam_data.setdefault('total_questions', len(questions))
+    exam_data.setdefault('difficulty_breakdown', {})
+    return exam_data
+
+
+class ExamWriter:
+    """Streams questions into an exam JSON file as they become available
+
+    The file is written to a temporary path and renamed on close, so readers never see
+    a half-written exam. difficulty_breakdown and total_questions are derived from the
+    questions written.
+    """
+
+    def __init__(self, path, exam_title, **extra):
+        self.path = path
+        self.exam_title = exam_title
+        self.extra = extra
+        self.count = 0
+        self.breakdown = {}
+        self._tmp_path = f"{path}.partial"
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self._file.write('{"exam_title": %s, "questions": [' % json.dumps(exam_title, ensure_ascii=False))
+
+    def write(self, question):
+        """Validate and append one question"""
+        validate_question(question, self.count)
+        if self.count:
+            self._file.write(',')
+        self._file.write('\n' + json.dumps(question, ensure_ascii=False))
+        self._file.flush()
+        self.count += 1
+        difficulty = question.get('difficulty')
+        if difficulty:
+            self.breakdown[difficulty] = self.breakdown.get(difficulty, 0) + 1
+
+    def close(self):
+        """Finish the JSON document and move it into place"""
+        trailer = {'total_questions': self.count, 'difficulty_breakdown': self.breakdown, **self.extra}
+        self._file.write('\n]')
+        for key, value in trailer.items():
+            self._file.write(f", {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}")
+        self._file.write('}\n')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the partial file for inspection but never publish it
+            self._file.close()
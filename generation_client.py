@@ -0,0 +1,270 @@
+"""
+Question-generation client
+Sends batches of source-text chunks to the generation backend over a pooled HTTP session,
+keeps a bounded number of requests in flight, retries transient failures with exponential
+backoff and streams finished questions into the exam JSON as each batch completes
+
+Backend protocol (POST {url}):
+    request   {"chunks": [str, ...], "questions_per_chunk": int, "include_explanations": true}
+    response  {"questions": [question, ...], "usage": {"output_tokens": int}}
+
+    python generation_client.py pages.jsonl -o exam.json --title "Shoulder Complex" --url http://localhost:8000/generate
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dedup import DeduplicatingWriter
+from exam_schema import ExamValidationError, ExamWriter
+
+GENERATOR_URL = os.environ.get("PHYSIO_GENERATOR_URL", "http://localhost:8000/generate")
+GENERATOR_API_KEY = os.environ.get("PHYSIO_GENERATOR_API_KEY")
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Rough characters-per-token ratio, used when the backend does not report usage
+CHARS_PER_TOKEN = 4
+
+
+class GenerationError(RuntimeError):
+    """Raised when a batch still fails after all retries"""
+
+
+class GenerationStats:
+    """Thread-safe request latency and token throughput counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.output_tokens = 0
+        self.questions = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.started_at = time.perf_counter()
+
+    def record(self, latency, tokens, questions):
+        with self._lock:
+            self.latencies.append(latency)
+            self.output_tokens += tokens
+            self.questions += questions
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_batches += 1
+
+    def summary(self):
+        """Return throughput and latency percentiles"""
+        with self._lock:
+            elapsed = time.perf_counter() - self.started_at
+            latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        return {
+            'requests': len(latencies),
+            'questions': self.questions,
+            'output_tokens': self.output_tokens,
+            'elapsed_s': round(elapsed, 3),
+            'tokens_per_s': round(self.output_tokens / elapsed, 1) if elapsed else 0.0,
+            'latency_p50_s': round(percentile(50), 3),
+            'latency_p95_s': round(percentile(95), 3),
+            'latency_max_s': round(latencies[-1], 3) if latencies else 0.0,
+            'retries': self.retries,
+            'failed_batches': self.failed_batches,
+        }
+
+
+def batched(chunks, batch_size):
+    """Group chunks into lists of batch_size"""
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_pages(pages, max_chars=6000):
+    """Join page texts into chunks of roughly max_chars, splitting only between pages"""
+    chunk = []
+    size = 0
+    for text in pages:
+        if chunk and size + len(text) > max_chars:
+            yield "\n".join(chunk)
+            chunk = []
+            size = 0
+        chunk.append(text)
+        size += len(text)
+    if chunk:
+        yield "\n".join(chunk)
+
+
+class GenerationClient:
+    """Pooled, concurrency-limited client for the generation backend"""
+
+    def __init__(self, url=GENERATOR_URL, api_key=GENERATOR_API_KEY, max_in_flight=8,
+                 batch_size=4, questions_per_chunk=5, max_retries=4, backoff=0.5, timeout=180):
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.questions_per_chunk = questions_per_chunk
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = GenerationStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f"Bearer {api_key}"
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # Full jitter keeps many clients from retrying in lockstep
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _parse_body(self, response):
+        """Return (questions, output tokens or None) from a backend response
+
+        A body that is not JSON, or not an object with a 'questions' list, will not
+        improve on retry, so it fails the batch straight away.
+        """
+        try:
+            body = response.json()
+        except ValueError as e:
+            self.stats.record_failure()
+            raise GenerationError(f"backend response is not JSON: {e}") from e
+        questions = body.get('questions') if isinstance(body, dict) else None
+        if not isinstance(questions, list):
+            self.stats.record_failure()
+            raise GenerationError("backend response has no 'questions' list")
+        usage = body.get('usage')
+        return questions, usage.get('output_tokens') if isinstance(usage, dict) else None
+
+    def generate_batch(self, chunks):
+        """POST one batch of chunks, retrying transient failures; returns the questions"""
+        payload = {
+            'chunks': chunks,
+            'questions_per_chunk': self.questions_per_chunk,
+            'include_explanations': True,
+        }
+        for attempt in range(self.max_retries + 1):
+            response = None
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    questions, tokens = self._parse_body(response)
+                    if tokens is None:
+                        tokens = len(response.content) // CHARS_PER_TOKEN
+                    self.stats.record(time.perf_counter() - started, tokens, len(questions))
+                    return questions
+            except (requests.ConnectionError, requests.Timeout):
+                pass
+            if attempt == self.max_retries:
+                break
+            self.stats.record_retry()
+            time.sleep(self._retry_delay(attempt, response))
+
+        self.stats.record_failure()
+        raise GenerationError(f"batch of {len(chunks)} chunks failed after {self.max_retries + 1} attempts")
+
+    @staticmethod
+    def _handle_error(error, on_error):
+        if on_error is None:
+            raise error
+        on_error(error)
+
+    def generate(self, chunks, writer, on_error=None):
+        """Generate questions for all chunks, writing each batch to writer as it completes
+
+        Batches are submitted lazily so at most max_in_flight requests (and their
+        responses) are held at once. on_error(exc) is called for batches that fail or
+        for invalid questions, which are skipped; without it the first failure is raised.
+        """
+        batches = batched(chunks, self.batch_size)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            in_flight = set()
+            for batch in batches:
+                in_flight.add(pool.submit(self.generate_batch, batch))
+                if len(in_flight) >= self.max_in_flight:
+                    break
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        questions = future.result()
+                    except (GenerationError, ValueError, requests.HTTPError) as e:
+                        questions = []
+                        self._handle_error(e, on_error)
+                    for question in questions:
+                        try:
+                            writer.write(question)
+                        except ExamValidationError as e:
+                            self._handle_error(e, on_error)
+                    next_batch = next(batches, None)
+                    if next_batch is not None:
+                        in_flight.add(pool.submit(self.generate_batch, next_batch))
+        return self.stats.summary()
+
+
+def read_pages(path):
+    """Page texts from a pdf_ingest JSONL file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)['text']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate an exam JSON from extracted textbook pages")
+    parser.add_argument('pages', help="JSONL produced by pdf_ingest.py")
+    parser.add_argument('-o', '--output', required=True, help="exam JSON to write")
+    parser.add_argument('--title', required=True, help="exam title")
+    parser.add_argument('--url', default=GENERATOR_URL, help="generation endpoint")
+    parser.add_argument('--in-flight', type=int, default=8, help="concurrent requests")
+    parser.add_argument('--batch-size', type=int, default=4, help="chunks per request")
+    parser.add_argument('--per-chunk', type=int, default=5, help="questions per chunk")
+    parser.add_argument('--chunk-chars', type=int, default=6000, help="approximate characters per chunk")
+    parser.add_argument('--keep-duplicates', action='store_true', help="do not drop near-duplicate questions")
+    args = parser.parse_args(argv)
+
+    client = GenerationClient(url=args.url, max_in_flight=args.in_flight, batch_size=args.batch_size,
+                              questions_per_chunk=args.per_chunk)
+    chunks = chunk_pages(read_pages(args.pages), args.chunk_chars)
+    with ExamWriter(args.output, args.title) as exam_writer:
+        writer = exam_writer if args.keep_duplicates else DeduplicatingWriter(exam_writer)
+        summary = client.generate(chunks, writer, on_error=lambda e: print(f"warning: {e}", file=sys.stderr))
+    if not args.keep_duplicates:
+        summary['near_duplicates_dropped'] = writer.skipped
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Display-sized question images
+Questions reference image files under the asset directory instead of embedding them.
+Each image is decoded with Pillow only when first shown, downscaled to display width and
+re-encoded, and the result is kept in a memory LRU backed by a disk cache shared by
+every session and server process. Upcoming images can be rendered ahead of time on a
+small thread pool, so the candidate rarely waits for one
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from disk_cache import prune_lru
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIR = os.environ.get("PHYSIO_ASSET_DIR", "exam_assets")
+IMAGE_CACHE_DIR = os.environ.get("PHYSIO_IMAGE_CACHE_DIR", ".image_cache")
+IMAGE_CACHE_MB = int(os.environ.get("PHYSIO_IMAGE_CACHE_MB", "512"))
+IMAGE_MEMORY_MB = int(os.environ.get("PHYSIO_IMAGE_MEMORY_MB", "64"))
+
+# Widest the question card shows an image, and a cap for tall scans
+DISPLAY_WIDTH = 800
+MAX_HEIGHT = 1200
+JPEG_QUALITY = 85
+
+# Bump when rendering changes so stale variants are not reused
+CACHE_VERSION = 1
+
+# Prune the disk cache after this many new variants
+PRUNE_EVERY = 64
+
+# Variants are PNG or JPEG; the format is told apart by the PNG file signature
+PNG_SIGNATURE = b'\x89PNG'
+
+
+def resolve_asset(ref, asset_dir=ASSET_DIR):
+    """Path of an image reference inside the asset directory, or None if it points outside"""
+    root = os.path.realpath(asset_dir)
+    path = os.path.realpath(os.path.join(root, ref))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def render_variant(path, width=DISPLAY_WIDTH, max_height=MAX_HEIGHT):
+    """Decode an image at display size and re-encode it; returns (bytes, mime type)"""
+    with Image.open(path) as image:
+        # JPEGs can decode straight at a reduced scale, skipping most of the full-size work
+        image.draft(None, (width, max_height))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, max_height), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        # Diagrams with transparency or a palette stay lossless; photos and X-rays become JPEG
+        if image.mode in ('RGBA', 'LA', 'P', 'PA') or 'transparency' in image.info:
+            image.save(out, format='PNG', optimize=True)
+            return out.getvalue(), 'image/png'
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return out.getvalue(), 'image/jpeg'
+
+
+class ImageCache:
+    """Memory-plus-disk LRU of rendered image variants with background prefetching
+
+    Variants are keyed by the source file's path, size and modification time plus the
+    display settings, so replacing an asset on disk renders it afresh. Concurrent
+    requests for the same image, foreground or prefetch, share one render.
+    """
+
+    def __init__(self, asset_dir=ASSET_DIR, directory=IMAGE_CACHE_DIR, max_mb=IMAGE_CACHE_MB,
+                 memory_mb=IMAGE_MEMORY_MB, width=DISPLAY_WIDTH, workers=2):
+        self.asset_dir = asset_dir
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.memory_budget = memory_mb * 1024 * 1024
+        self.width = width
+        self.memory_used = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-cache")
+        os.makedirs(directory, exist_ok=True)
+
+    def _key(self, ref):
+        path = resolve_asset(ref, self.asset_dir)
+        if path is None:
+            return None, None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
+        raw = f"{CACHE_VERSION}:{path}:{stat.st_size}:{stat.st_mtime_ns}:{self.width}"
+        return hashlib.sha256(raw.encode()).hexdigest(), path
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _remember(self, key, entry):
+        # Caller holds self._lock
+        if key in self._entries:
+            return
+        self._entries[key] = entry
+        self.memory_used += len(entry[0])
+        while self.memory_used > self.memory_budget and len(self._entries) > 1:
+            _, (data, _) = self._entries.popitem(last=False)
+            self.memory_used -= len(data)
+
+    def _load(self, key, path):
+        """Read a variant from disk or render it; runs on the thread pool"""
+        disk_path = self._path(key)
+        try:
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+            entry = (data, 'image/png' if data.startswith(PNG_SIGNATURE) else 'image/jpeg')
+            os.utime(disk_path)
+            disk_hit = True
+        except FileNotFoundError:
+            entry = render_variant(path, self.width)
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(entry[0])
+            os.replace(tmp_path, disk_path)
+            disk_hit = False
+
+        with self._lock:
+            self._remember(key, entry)
+            self._pending.pop(key, None)
+            if disk_hit:
+                self.disk_hits += 1
+            else:
+                self._writes += 1
+                prune_due = self._writes % PRUNE_EVERY == 0
+        if not disk_hit and prune_due:
+            self._executor.submit(self.prune)
+        return entry
+
+    def _future(self, key, path):
+        # Caller holds self._lock
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = self._executor.submit(self._load, key, path)
+        return future
+
+    def get(self, ref):
+        """(bytes, mime type) of an image reference at display size, or None if it cannot be shown"""
+        key, path = self._key(ref)
+        if key is None:
+            logger.warning("question image %r not found in %s", ref, self.asset_dir)
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            future = self._future(key, path)
+        try:
+            return future.result()
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            logger.exception("could not render question image %r", ref)
+            with self._lock:
+                self._pending.pop(key, None)
+            return None
+
+    def prefetch(self, ref):
+        """Render an image in the background if it is not cached yet"""
+        key, path = self._key(ref)
+        if key is None:
+            return
+        with self._lock:
+            if key not in self._entries:
+                self._future(key, path)
+
+    def prune(self):
+        """Delete least-recently-used variants until the disk cache fits its budget"""
+        return prune_lru(self.directory, self.max_bytes)
+
+    def stats(self):
+        """Return cache counters for display and monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'memory_used': self.memory_used,
+                'memory_budget': self.memory_budget,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
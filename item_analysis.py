@@ -0,0 +1,156 @@
+"""
+Item analysis over attempt matrices
+Responses for one exam are packed into an (attempts x questions) int8 matrix and every
+statistic is computed with whole-array NumPy operations
+"""
+import numpy as np
+
+from exam_schema import OPTION_KEYS
+
+UNANSWERED = -1
+FLAGGED = -2
+
+MIN_ATTEMPTS = 5
+
+# Thresholds used to flag questions in the quality report
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.2
+WEAK_DISTRACTOR = 0.05
+HIGH_FLAG_RATE = 0.1
+
+
+def answer_key(questions):
+    """Correct option index for every question"""
+    return np.fromiter(
+        (OPTION_KEYS.index(q['correct_answer']) for q in questions),
+        dtype=np.int8, count=len(questions)
+    )
+
+
+def load_response_matrix(store, exam_hash, question_count, chunk_size=50000):
+    """Pack an exam's stored responses into an (attempts x questions) code matrix"""
+    with store.connection() as conn:
+        attempt_ids = [row[0] for row in conn.execute(
+            "SELECT attempt_id FROM attempts WHERE exam_hash = ? ORDER BY attempt_id", (exam_hash,)
+        )]
+        matrix = np.full((len(attempt_ids), question_count), UNANSWERED, dtype=np.int8)
+        if not attempt_ids:
+            return matrix
+
+        row_of = {attempt_id: row for row, attempt_id in enumerate(attempt_ids)}
+        cursor = conn.execute(
+            f"""SELECT attempt_id, question_idx,
+                       CASE WHEN flagged THEN {FLAGGED}
+                            WHEN answer IS NULL THEN {UNANSWERED}
+                            ELSE instr('ABCD', answer) - 1 END
+                FROM responses WHERE exam_hash = ?""",
+            (exam_hash,)
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            attempt_col, question_col, code_col = zip(*rows)
+            rows_idx = np.fromiter((row_of.get(a, -1) for a in attempt_col), dtype=np.int64, count=len(rows))
+            questions_idx = np.asarray(question_col, dtype=np.int64)
+            codes = np.asarray(code_col, dtype=np.int8)
+            keep = (rows_idx >= 0) & (questions_idx < question_count)
+            matrix[rows_idx[keep], questions_idx[keep]] = codes[keep]
+    return matrix
+
+
+def analyze(matrix, key):
+    """Compute per-question statistics for a response matrix and answer key
+
+    Returns a dict of arrays indexed by question: p_value, discrimination (corrected
+    point-biserial against the rest score), option_rates (questions x 4), flag_rate,
+    answered_rate and attempts (count of non-flagged responses).
+    """
+    attempts, questions = matrix.shape
+    valid = matrix != FLAGGED
+    answered = matrix >= 0
+    correct = (matrix == key[None, :]).astype(np.float64)
+
+    valid_counts = valid.sum(axis=0)
+    answered_counts = answered.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_value = correct.sum(axis=0) / valid_counts
+
+        # Corrected item-total correlation: item score vs total score excluding the item,
+        # over the attempts where the item was not flagged
+        weights = valid.astype(np.float64)
+        totals = correct.sum(axis=1, keepdims=True)
+        rest = totals - correct
+        n = weights.sum(axis=0)
+        mean_x = (weights * correct).sum(axis=0) / n
+        mean_y = (weights * rest).sum(axis=0) / n
+        cov = (weights * correct * rest).sum(axis=0) / n - mean_x * mean_y
+        var_x = (weights * correct * correct).sum(axis=0) / n - mean_x ** 2
+        var_y = (weights * rest * rest).sum(axis=0) / n - mean_y ** 2
+        discrimination = cov / np.sqrt(var_x * var_y)
+
+        option_counts = np.stack(
+            [(matrix == opt).sum(axis=0) for opt in range(len(OPTION_KEYS))], axis=1
+        )
+        option_rates = option_counts / answered_counts[:, None]
+
+        flag_rate = (~valid).sum(axis=0) / attempts
+        answered_rate = answered_counts / valid_counts
+
+    return {
+        'p_value': p_value,
+        'discrimination': discrimination,
+        'option_rates': option_rates,
+        'flag_rate': flag_rate,
+        'answered_rate': answered_rate,
+        'attempts': valid_counts,
+    }
+
+
+def quality_report(stats, key):
+    """Turn analysis arrays into one row per question with any quality warnings"""
+    p_value = stats['p_value']
+    discrimination = stats['discrimination']
+    option_rates = stats['option_rates']
+    flag_rate = stats['flag_rate']
+
+    distractors = option_rates.copy()
+    distractors[np.arange(len(key)), key] = np.inf
+    weak_distractors = (distractors < WEAK_DISTRACTOR).sum(axis=1)
+
+    rows = []
+    for idx in range(len(key)):
+        issues = []
+        if p_value[idx] > TOO_EASY:
+            issues.append("too easy")
+        elif p_value[idx] < TOO_HARD:
+            issues.append("too hard")
+        if discrimination[idx] < 0:
+            issues.append("negative discrimination")
+        elif discrimination[idx] < LOW_DISCRIMINATION:
+            issues.append("low discrimination")
+        if weak_distractors[idx]:
+            issues.append(f"{weak_distractors[idx]} weak distractor(s)")
+        if flag_rate[idx] > HIGH_FLAG_RATE:
+            issues.append("often flagged")
+
+        rows.append({
+            'question': idx + 1,
+            'p_value': round(float(p_value[idx]), 3),
+            'discrimination': round(float(discrimination[idx]), 3),
+            **{f"{opt}_rate": round(float(option_rates[idx, k]), 3) for k, opt in enumerate(OPTION_KEYS)},
+            'flag_rate': round(float(flag_rate[idx]), 3),
+            'issues': ", ".join(issues),
+        })
+    return rows
+
+
+def exam_quality_report(store, exam_hash, questions):
+    """Item analysis for an exam's recorded attempts, or None if there are too few"""
+    key = answer_key(questions)
+    matrix = load_response_matrix(store, exam_hash, len(key))
+    if matrix.shape[0] < MIN_ATTEMPTS:
+        return None
+    return quality_report(analyze(matrix, key), key)
@@ -0,0 +1,241 @@
+"""
+In-process metrics and rerun profiling
+Timings are aggregated into fixed-bucket histograms and exposed in the Prometheus text
+format, either on a local HTTP endpoint or in a file rewritten periodically. With
+profiling enabled, each rerun runs under cProfile and the slowest ones are kept on disk
+
+    PHYSIO_METRICS_PORT=9464         serve http://127.0.0.1:9464/metrics
+    PHYSIO_METRICS_FILE=metrics.prom rewrite this file every PHYSIO_METRICS_INTERVAL seconds
+    PHYSIO_PROFILE_DIR=.profiles     keep cProfile dumps of the PHYSIO_PROFILE_KEEP slowest reruns
+"""
+import bisect
+import cProfile
+import functools
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.environ.get("PHYSIO_METRICS_PORT", "0"))
+METRICS_FILE = os.environ.get("PHYSIO_METRICS_FILE")
+METRICS_INTERVAL = float(os.environ.get("PHYSIO_METRICS_INTERVAL", "15"))
+PROFILE_DIR = os.environ.get("PHYSIO_PROFILE_DIR")
+PROFILE_KEEP = int(os.environ.get("PHYSIO_PROFILE_KEEP", "10"))
+
+# Seconds; spans cheap fragment reruns up to slow exam loads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+PREFIX = "physio_"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {PREFIX}{self.name} {self.help_text}", f"# TYPE {PREFIX}{self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(series):
+            cumulative = itertools.accumulate(counts)
+            for bound, value in zip((*self.buckets, '+Inf'), cumulative):
+                lines.append(f"{PREFIX}{self.name}_bucket{_label_text(key + (('le', bound),))} {value}")
+            lines.append(f"{PREFIX}{self.name}_sum{_label_text(key)} {total}")
+            lines.append(f"{PREFIX}{self.name}_count{_label_text(key)} {count}")
+        return lines
+
+
+class Gauges:
+    """Values read from callbacks at render time, e.g. cache statistics"""
+
+    def __init__(self):
+        self._sources = []
+        self._lock = threading.Lock()
+
+    def register(self, name, help_text, callback):
+        """callback() returns a number or a {label value: number} dict for label 'key'"""
+        with self._lock:
+            self._sources.append((name, help_text, callback))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            sources = list(self._sources)
+        for name, help_text, callback in sources:
+            try:
+                value = callback()
+            except Exception:
+                logger.exception("metrics gauge %s failed", name)
+                continue
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            if isinstance(value, dict):
+                for key, item in sorted(value.items()):
+                    lines.append(f"{PREFIX}{name}{_label_text((('key', key),))} {item}")
+            else:
+                lines.append(f"{PREFIX}{name} {value}")
+        return lines
+
+
+class Metrics:
+    """Process-wide metrics: rerun, screen and step timings plus registered gauges"""
+
+    def __init__(self):
+        self.rerun_seconds = Histogram("rerun_seconds", "Full script reruns by screen")
+        self.screen_seconds = Histogram("screen_seconds", "Time spent in each screen function")
+        self.step_seconds = Histogram("step_seconds", "Time spent in instrumented steps")
+        self.session_state_bytes = Histogram("session_state_bytes", "Approximate per-session state size",
+                                             SIZE_BUCKETS)
+        self.gauges = Gauges()
+
+    @contextmanager
+    def timer(self, histogram, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+
+    def step(self, name):
+        """Context manager timing one named step, e.g. exam loading or scoring"""
+        return self.timer(self.step_seconds, step=name)
+
+    def timed_screen(self, screen):
+        """Decorator recording how long a screen function takes"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(self.screen_seconds, screen=screen):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for histogram in (self.rerun_seconds, self.screen_seconds, self.step_seconds, self.session_state_bytes):
+            lines.extend(histogram.render())
+        lines.extend(self.gauges.render())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=METRICS_PORT, host="127.0.0.1"):
+        """Expose /metrics on a local port from a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            # Another process (or an earlier start in this one) already owns the port
+            logger.exception("could not serve metrics on %s:%s", host, port)
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+    def write_periodically(self, path=METRICS_FILE, interval=METRICS_INTERVAL):
+        """Rewrite path with the current metrics every interval seconds from a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(self.render())
+                    os.replace(tmp_path, path)
+                except OSError:
+                    logger.exception("could not write metrics to %s", path)
+
+        thread = threading.Thread(target=run, name="metrics-writer", daemon=True)
+        thread.start()
+        return thread
+
+
+class SlowRerunProfiler:
+    """Profiles reruns with cProfile and keeps dumps of only the slowest few"""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._slowest = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def profile(self):
+        """Profile the enclosed block; set info['screen'] inside it to label the dump"""
+        info = {'screen': 'unknown'}
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield info
+        finally:
+            profiler.disable()
+            self._record(profiler, time.perf_counter() - started, info['screen'])
+
+    def _record(self, profiler, elapsed, screen):
+        with self._lock:
+            if len(self._slowest) >= self.keep and elapsed <= self._slowest[0][0]:
+                return
+            path = os.path.join(self.directory, f"{screen}-{elapsed * 1000:.0f}ms-{next(self._counter)}.prof")
+            heapq.heappush(self._slowest, (elapsed, path))
+            evicted = heapq.heappop(self._slowest)[1] if len(self._slowest) > self.keep else None
+        profiler.dump_stats(path)
+        if evicted:
+            try:
+                os.remove(evicted)
+            except FileNotFoundError:
+                pass
+
+
+METRICS = Metrics()
@@ -0,0 +1,125 @@
+"""
+Disk cache of extracted page text
+Entries are keyed by a hash of the page's raw content streams, images and fonts plus the
+extraction settings, so regenerating exams from the same PDFs skips OCR for unchanged
+pages. The cache is shared safely between worker processes and pruned to a size budget
+with least-recently-used eviction
+"""
+import hashlib
+import json
+import os
+
+from pdfminer.pdftypes import PDFStream, resolve1
+
+from disk_cache import prune_lru
+
+PAGE_CACHE_DIR = os.environ.get("PHYSIO_PAGE_CACHE_DIR", ".page_cache")
+PAGE_CACHE_MB = int(os.environ.get("PHYSIO_PAGE_CACHE_MB", "1024"))
+
+# Bump when extraction logic changes so stale entries are not reused
+CACHE_VERSION = 2
+
+# Form XObjects can nest; this bounds the walk on pathological files
+MAX_XOBJECT_DEPTH = 4
+
+# Deep enough for a Type0 font's descendant font descriptor and its embedded font file
+MAX_FONT_DEPTH = 6
+
+
+def _hash_object(digest, obj, depth):
+    """Hash a PDF object tree; streams contribute their raw, undecoded bytes"""
+    obj = resolve1(obj)
+    if isinstance(obj, PDFStream):
+        _hash_object(digest, obj.attrs, depth)
+        digest.update(obj.get_rawdata() or b'')
+    elif isinstance(obj, dict):
+        if depth >= MAX_FONT_DEPTH:
+            return
+        for key in sorted(obj):
+            digest.update(key.encode() if isinstance(key, str) else bytes(key))
+            _hash_object(digest, obj[key], depth + 1)
+    elif isinstance(obj, list):
+        if depth >= MAX_FONT_DEPTH:
+            return
+        for item in obj:
+            _hash_object(digest, item, depth + 1)
+    else:
+        digest.update(repr(obj).encode())
+
+
+def _hash_resources(digest, resources, depth):
+    resources = resolve1(resources) or {}
+    # Fonts decide how content-stream bytes map to text: encodings, ToUnicode CMaps and
+    # embedded font programs all change the extracted text without touching the stream
+    fonts = resolve1(resources.get('Font')) or {}
+    for name in sorted(fonts):
+        digest.update(name.encode() if isinstance(name, str) else bytes(name))
+        _hash_object(digest, fonts[name], 0)
+    xobjects = resolve1(resources.get('XObject')) or {}
+    for name in sorted(xobjects):
+        stream = resolve1(xobjects[name])
+        if not isinstance(stream, PDFStream):
+            continue
+        digest.update(name.encode() if isinstance(name, str) else bytes(name))
+        digest.update(stream.get_rawdata() or b'')
+        if depth < MAX_XOBJECT_DEPTH and 'Resources' in stream.attrs:
+            _hash_resources(digest, stream.attrs['Resources'], depth + 1)
+
+
+def page_fingerprint(page):
+    """Hash a pdfplumber page's raw content streams, embedded images and fonts without decoding them"""
+    digest = hashlib.sha256()
+    page_obj = page.page_obj
+    for stream in page_obj.contents:
+        stream = resolve1(stream)
+        if isinstance(stream, PDFStream):
+            digest.update(stream.get_rawdata() or b'')
+    _hash_resources(digest, page_obj.resources, 0)
+    return digest.hexdigest()
+
+
+def settings_fingerprint(**settings):
+    """Stable string for the settings that affect extracted text"""
+    return json.dumps({'version': CACHE_VERSION, **settings}, sort_keys=True)
+
+
+class PageCache:
+    """Content-addressed store of {text, source} entries on local disk"""
+
+    def __init__(self, directory=PAGE_CACHE_DIR, max_mb=PAGE_CACHE_MB):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, page_hash, settings):
+        return hashlib.sha256(f"{page_hash}:{settings}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached entry, or None; a hit refreshes the entry's LRU position"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry atomically so concurrent workers never see a partial file"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        """Delete least-recently-used entries until the cache fits its budget"""
+        return prune_lru(self.directory, self.max_bytes)
@@ -0,0 +1,153 @@
+"""
+Parallel PDF-to-text ingestion for the Question Generator
+Pages are fanned out across a process pool. Each worker uses pdfplumber's text layer and
+falls back to pdf2image + Tesseract OCR only for pages without one. Results stream back
+in page order through a bounded window, so memory stays flat for long textbooks.
+Extracted text is cached on disk by page content, so re-runs only process changed pages
+
+    python pdf_ingest.py textbook.pdf -o pages.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+import pytesseract
+from pdf2image import convert_from_path
+
+from page_cache import PAGE_CACHE_DIR, PageCache, page_fingerprint, settings_fingerprint
+
+# Pages with fewer extractable characters than this are treated as image-only
+MIN_TEXT_CHARS = 20
+
+PageText = namedtuple('PageText', ['page_number', 'text', 'source', 'cached'], defaults=[False])
+
+
+class OcrSettings(namedtuple('OcrSettings', ['dpi', 'lang', 'oem', 'psm'])):
+    """Tesseract settings; part of the identity of an OCR result"""
+
+    @property
+    def config(self):
+        return f"--oem {self.oem} --psm {self.psm}"
+
+
+DEFAULT_OCR = OcrSettings(dpi=300, lang='eng', oem=1, psm=3)
+
+# Per-worker state, set by _init_worker
+_worker_pdf = None
+_worker_path = None
+_worker_cache = None
+
+
+def _init_worker(path, cache_dir):
+    global _worker_pdf, _worker_path, _worker_cache
+    _worker_path = path
+    _worker_pdf = pdfplumber.open(path)
+    _worker_cache = PageCache(cache_dir) if cache_dir else None
+
+
+def ocr_page(path, page_number, ocr):
+    """Rasterise one page and run Tesseract on it"""
+    images = convert_from_path(path, dpi=ocr.dpi, first_page=page_number + 1, last_page=page_number + 1)
+    try:
+        return pytesseract.image_to_string(images[0], lang=ocr.lang, config=ocr.config)
+    finally:
+        for image in images:
+            image.close()
+
+
+def extract_page(pdf, path, page_number, ocr=DEFAULT_OCR, cache=None):
+    """Extract one page's text, using OCR only when the page has no text layer"""
+    page = pdf.pages[page_number]
+    try:
+        key = None
+        if cache:
+            settings = settings_fingerprint(min_text_chars=MIN_TEXT_CHARS, **ocr._asdict())
+            key = cache.key(page_fingerprint(page), settings)
+            entry = cache.get(key)
+            if entry:
+                return PageText(page_number, entry['text'], entry['source'], True)
+        text = page.extract_text() or ''
+    finally:
+        # pdfplumber caches parsed layout objects per page; drop them so workers stay small
+        page.close()
+
+    if len(text.strip()) >= MIN_TEXT_CHARS:
+        result = PageText(page_number, text, 'text')
+    else:
+        result = PageText(page_number, ocr_page(path, page_number, ocr), 'ocr')
+    if key:
+        cache.put(key, {'text': result.text, 'source': result.source})
+    return result
+
+
+def _extract_in_worker(page_number, ocr):
+    return extract_page(_worker_pdf, _worker_path, page_number, ocr, _worker_cache)
+
+
+def page_count(path):
+    """Number of pages in a PDF"""
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(path, workers=None, ocr=DEFAULT_OCR, pages=None, cache_dir=PAGE_CACHE_DIR):
+    """Yield PageText for every page (or the given page numbers) in order
+
+    At most a few pages per worker are in flight at once, so results are yielded as
+    soon as the next page in order is ready without buffering the whole document.
+    Pass cache_dir=None to bypass the page cache.
+    """
+    if pages is None:
+        pages = range(page_count(path))
+    workers = workers or os.cpu_count() or 1
+    window = workers * 4
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path, cache_dir)) as pool:
+        remaining = iter(pages)
+        in_flight = deque()
+        for page_number in remaining:
+            in_flight.append(pool.submit(_extract_in_worker, page_number, ocr))
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            result = in_flight.popleft().result()
+            next_page = next(remaining, None)
+            if next_page is not None:
+                in_flight.append(pool.submit(_extract_in_worker, next_page, ocr))
+            yield result
+
+    if cache_dir:
+        PageCache(cache_dir).prune()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract text from a PDF textbook, one JSON line per page")
+    parser.add_argument('pdf', help="source PDF")
+    parser.add_argument('-o', '--output', help="output JSONL file (default: stdout)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_OCR.dpi, help="OCR rasterisation DPI")
+    parser.add_argument('--lang', default=DEFAULT_OCR.lang, help="Tesseract language")
+    parser.add_argument('--oem', type=int, default=DEFAULT_OCR.oem, help="Tesseract OCR engine mode")
+    parser.add_argument('--psm', type=int, default=DEFAULT_OCR.psm, help="Tesseract page segmentation mode")
+    parser.add_argument('--cache-dir', default=PAGE_CACHE_DIR, help="extracted page cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="re-extract every page")
+    args = parser.parse_args(argv)
+
+    ocr = OcrSettings(args.dpi, args.lang, args.oem, args.psm)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        cache_dir = None if args.no_cache else args.cache_dir
+        for page in extract_pages(args.pdf, workers=args.workers, ocr=ocr, cache_dir=cache_dir):
+            out.write(json.dumps(page._asdict(), ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
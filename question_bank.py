@@ -0,0 +1,332 @@
+"""
+Indexed binary question-bank format (.pxqb)
+Questions are decoded lazily from a memory-mapped file; opening a bank range-checks its
+index and streams its string data once through a UTF-8 check, but never builds question
+text, whether it holds 50 or 50,000 questions
+
+Layout (little-endian):
+    header          magic, version, question count, string count, meta string id,
+                    offsets of the index, string offset table and string data
+    index           one fixed-size record per question holding string ids for the
+                    stem, options A-D, explanations A-D, the correct answer and
+                    any extra fields (JSON)
+    string offsets  string_count + 1 u64 offsets into the string data
+    string data     UTF-8 strings, de-duplicated
+
+Convert an existing exam:
+    python question_bank.py exam.json exam.pxqb
+"""
+import codecs
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from exam_schema import OPTION_KEYS, ExamValidationError, validate_exam
+
+MAGIC = b'PXQB'
+VERSION = 1
+BANK_EXTENSION = '.pxqb'
+
+HEADER = struct.Struct('<4sHHIIIQQQ')
+RECORD = struct.Struct('<9IB3xI')
+OFFSET = struct.Struct('<Q')
+NO_STRING = 0xFFFFFFFF
+
+# String data is checked for valid UTF-8 this many bytes at a time
+CHECK_CHUNK_SIZE = 1 << 20
+
+CORE_FIELDS = ('question', 'options', 'explanations', 'correct_answer')
+
+
+def is_bank(data):
+    """Return True if the bytes start with the bank magic"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def validate_bank(buffer):
+    """Check a bank's header, index and string table; returns (header fields, meta)
+
+    buffer is the whole file as bytes or a memory map. Every string id and correct
+    answer in the index is range-checked here, so a truncated or corrupt upload fails
+    once with ExamValidationError instead of on whichever question is read first.
+    The string data is checked to be UTF-8 that splits cleanly at every string
+    boundary, so questions decoded later cannot fail either.
+    """
+    size = len(buffer)
+    if size < HEADER.size:
+        raise ExamValidationError(f"question bank is {size} bytes, shorter than its header")
+    header = HEADER.unpack_from(buffer, 0)
+    magic, version, _, question_count, string_count, meta_id, index_offset, offsets_offset, data_offset = header
+    if magic != MAGIC:
+        raise ExamValidationError("not a question bank file")
+    if version != VERSION:
+        raise ExamValidationError(f"unsupported question bank version {version}")
+    if not question_count:
+        raise ExamValidationError("question bank has no questions")
+    if (index_offset < HEADER.size
+            or offsets_offset < index_offset + RECORD.size * question_count
+            or data_offset < offsets_offset + OFFSET.size * (string_count + 1)
+            or data_offset > size):
+        raise ExamValidationError("question bank is truncated or its section offsets are corrupt")
+
+    offsets = np.frombuffer(buffer[offsets_offset:offsets_offset + OFFSET.size * (string_count + 1)], dtype='<u8')
+    if offsets[0] != 0 or offsets[-1] != size - data_offset or np.any(np.diff(offsets.astype(np.int64)) < 0):
+        raise ExamValidationError("question bank string table is truncated or corrupt")
+
+    words = RECORD.size // 4
+    records = np.frombuffer(buffer[index_offset:index_offset + RECORD.size * question_count],
+                            dtype='<u4').reshape(question_count, words)
+    extra_ids = records[:, 10]
+    if (np.any(records[:, :9] >= string_count)
+            or np.any((extra_ids >= string_count) & (extra_ids != NO_STRING))):
+        raise ExamValidationError("question bank index refers to missing strings")
+    bad = np.flatnonzero(records[:, 9] >= len(OPTION_KEYS))
+    if bad.size:
+        raise ExamValidationError(f"question {int(bad[0]) + 1} has an invalid correct answer")
+
+    _check_strings(buffer, data_offset, offsets)
+
+    if meta_id >= string_count:
+        raise ExamValidationError("question bank metadata is missing")
+    start, end = int(offsets[meta_id]), int(offsets[meta_id + 1])
+    try:
+        meta = json.loads(bytes(buffer[data_offset + start:data_offset + end]).decode('utf-8'))
+    except ValueError as e:
+        raise ExamValidationError(f"question bank metadata is corrupt: {e}") from e
+    if not isinstance(meta, dict) or 'exam_title' not in meta:
+        raise ExamValidationError("question bank metadata is missing 'exam_title'")
+    return header, meta
+
+
+def _check_strings(buffer, data_offset, offsets):
+    """Raise ExamValidationError unless every string in the data section is valid UTF-8
+
+    The section is decoded incrementally as a whole, and no non-empty string may start on
+    a continuation byte; together these mean each string decodes on its own.
+    """
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    length = int(offsets[-1])
+    try:
+        for pos in range(0, length, CHECK_CHUNK_SIZE):
+            chunk = bytes(buffer[data_offset + pos:data_offset + min(pos + CHECK_CHUNK_SIZE, length)])
+            decoder.decode(chunk)
+            lo, hi = np.searchsorted(starts, [pos, pos + len(chunk)])
+            first_bytes = np.frombuffer(chunk, dtype=np.uint8)[starts[lo:hi] - pos]
+            if np.any(first_bytes & 0xC0 == 0x80):
+                raise ExamValidationError("question bank string table splits a UTF-8 character")
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise ExamValidationError(f"question bank string data is not valid UTF-8: {e}") from e
+
+
+class _StringTable:
+    """De-duplicating string table used by the converter"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, text):
+        if text is None:
+            return NO_STRING
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[text] = string_id
+            self.strings.append(text.encode('utf-8'))
+        return string_id
+
+
+def convert_exam(exam_data, out_path):
+    """Write an exam in the JSON schema to a .pxqb bank file"""
+    exam_data = validate_exam(exam_data)
+    questions = exam_data['questions']
+    table = _StringTable()
+
+    meta = {k: v for k, v in exam_data.items() if k != 'questions'}
+    meta_id = table.add(json.dumps(meta, ensure_ascii=False))
+
+    records = []
+    for q in questions:
+        extra = {k: v for k, v in q.items() if k not in CORE_FIELDS}
+        records.append(RECORD.pack(
+            table.add(str(q['question'])),
+            *(table.add(str(q['options'][opt])) for opt in OPTION_KEYS),
+            *(table.add(str(q['explanations'][opt])) for opt in OPTION_KEYS),
+            OPTION_KEYS.index(q['correct_answer']),
+            table.add(json.dumps(extra, ensure_ascii=False)) if extra else NO_STRING,
+        ))
+
+    index_offset = HEADER.size
+    offsets_offset = index_offset + RECORD.size * len(records)
+    data_offset = offsets_offset + OFFSET.size * (len(table.strings) + 1)
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(records), len(table.strings), meta_id,
+                            index_offset, offsets_offset, data_offset))
+        f.writelines(records)
+        position = 0
+        for raw in table.strings:
+            f.write(OFFSET.pack(position))
+            position += len(raw)
+        f.write(OFFSET.pack(position))
+        f.writelines(table.strings)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def convert_file(json_path, out_path):
+    """Convert an exam JSON file on disk to a .pxqb bank"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return convert_exam(json.load(f), out_path)
+
+
+class QuestionBank:
+    """Read-only, memory-mapped view of a .pxqb bank"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ExamValidationError(f"{path} is shorter than a question bank header")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            header, self.meta = validate_bank(self._mm)
+        except ExamValidationError:
+            self._mm.close()
+            raise
+        (_, _, _, self.question_count, self.string_count, _,
+         self._index_offset, self._offsets_offset, self._data_offset) = header
+
+    def string(self, string_id):
+        """Decode one string from the string table"""
+        if string_id == NO_STRING:
+            return None
+        start, end = struct.unpack_from('<QQ', self._mm, self._offsets_offset + string_id * OFFSET.size)
+        return self._mm[self._data_offset + start:self._data_offset + end].decode('utf-8')
+
+    def record(self, idx):
+        """Return the raw index record for a question"""
+        if not 0 <= idx < self.question_count:
+            raise IndexError(idx)
+        return RECORD.unpack_from(self._mm, self._index_offset + idx * RECORD.size)
+
+    def correct_answer(self, idx):
+        """Return the correct option letter without decoding any text"""
+        return OPTION_KEYS[self.record(idx)[9]]
+
+    def __len__(self):
+        return self.question_count
+
+    def __getitem__(self, idx):
+        return BankQuestion(self, idx)
+
+    def as_exam(self):
+        """Return a mapping that behaves like the JSON exam_data dict"""
+        return BankExam(self)
+
+    def close(self):
+        self._mm.close()
+
+
+class _LazyOptions(Mapping):
+    """Option letter -> text, decoded on access"""
+
+    def __init__(self, bank, string_ids):
+        self._bank = bank
+        self._ids = dict(zip(OPTION_KEYS, string_ids))
+
+    def __getitem__(self, opt):
+        return self._bank.string(self._ids[opt])
+
+    def __iter__(self):
+        return iter(OPTION_KEYS)
+
+    def __len__(self):
+        return len(OPTION_KEYS)
+
+
+class BankQuestion(Mapping):
+    """A single question; text is decoded only when a field is read"""
+
+    def __init__(self, bank, idx):
+        self._bank = bank
+        self._record = bank.record(idx)
+        self._extra = None
+
+    def _extras(self):
+        if self._extra is None:
+            raw = self._bank.string(self._record[10])
+            self._extra = json.loads(raw) if raw else {}
+        return self._extra
+
+    def __getitem__(self, key):
+        if key == 'question':
+            return self._bank.string(self._record[0])
+        if key == 'options':
+            return _LazyOptions(self._bank, self._record[1:5])
+        if key == 'explanations':
+            return _LazyOptions(self._bank, self._record[5:9])
+        if key == 'correct_answer':
+            return OPTION_KEYS[self._record[9]]
+        return self._extras()[key]
+
+    def __iter__(self):
+        yield from CORE_FIELDS
+        yield from self._extras()
+
+    def __len__(self):
+        return len(CORE_FIELDS) + len(self._extras())
+
+
+class _QuestionSequence(Sequence):
+    """Sequence view over all questions in a bank"""
+
+    def __init__(self, bank):
+        self._bank = bank
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._bank[i] for i in range(*idx.indices(len(self._bank)))]
+        if idx < 0:
+            idx += len(self._bank)
+        return self._bank[idx]
+
+    def __len__(self):
+        return len(self._bank)
+
+
+class BankExam(Mapping):
+    """exam_data-compatible mapping backed by a QuestionBank"""
+
+    def __init__(self, bank):
+        self.bank = bank
+        self._questions = _QuestionSequence(bank)
+
+    def __getitem__(self, key):
+        if key == 'questions':
+            return self._questions
+        return self.bank.meta[key]
+
+    def __iter__(self):
+        yield 'questions'
+        yield from self.bank.meta
+
+    def __len__(self):
+        return len(self.bank.meta) + 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"usage: {sys.argv[0]} EXAM.json BANK{BANK_EXTENSION}", file=sys.stderr)
+        sys.exit(2)
+    convert_file(sys.argv[1], sys.argv[2])
+    print(f"Wrote {sys.argv[2]}")
@@ -0,0 +1,240 @@
+"""
+Streaming export of recorded results
+Per-candidate score sheets and per-question breakdowns are read from the attempt store a
+chunk at a time and written straight out as CSV, JSONL or a paginated printable HTML
+report, so exporting 100k+ attempts never assembles them in memory. Attempts can be
+selected by exam title (exact, or a glob such as "Mock*") and by finish date
+
+    python results_export.py attempts -o scores.csv --title "Mock Exam 3" --since 2026-05-01
+    python results_export.py questions -o questions.jsonl --title "Mock*"
+    python results_export.py report -o report.html --title "Mock Exam 3" --page-size 40
+"""
+import argparse
+import csv
+import html
+import json
+import math
+import sys
+from datetime import date, datetime, timedelta
+
+from attempt_store import DB_PATH, EXPORT_CHUNK_SIZE, AttemptStore
+
+ATTEMPT_FIELDS = ['attempt_id', 'user_id', 'exam_title', 'exam_hash', 'started_at', 'finished_at',
+                  'minutes', 'correct', 'total', 'flagged', 'percentage']
+
+QUESTION_FIELDS = ['exam_title', 'exam_hash', 'question', 'responses', 'answered', 'correct',
+                   'flagged', 'correct_rate', 'mean_time']
+
+REPORT_PAGE_SIZE = 40
+
+
+def parse_date(text):
+    """Local midnight of an ISO date, as an epoch time"""
+    return datetime.combine(date.fromisoformat(text), datetime.min.time()).timestamp()
+
+
+def date_range(since=None, until=None):
+    """(since, until) epoch bounds for ISO dates; until is inclusive of its whole day"""
+    return (parse_date(since) if since else None,
+            parse_date(until) + timedelta(days=1).total_seconds() if until else None)
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).isoformat(sep=' ', timespec='seconds')
+
+
+def attempt_rows(attempts):
+    """Score sheet rows for exported attempts"""
+    for attempt in attempts:
+        yield {
+            'attempt_id': attempt['attempt_id'],
+            'user_id': attempt['user_id'],
+            'exam_title': attempt['exam_title'],
+            'exam_hash': attempt['exam_hash'],
+            'started_at': _timestamp(attempt['started_at']),
+            'finished_at': _timestamp(attempt['finished_at']),
+            'minutes': round((attempt['finished_at'] - attempt['started_at']) / 60, 1),
+            'correct': attempt['correct'],
+            'total': attempt['total'],
+            'flagged': attempt['flagged'],
+            'percentage': round(attempt['percentage'], 1),
+        }
+
+
+def question_rows(stats):
+    """Breakdown rows for per-question statistics; questions are numbered from 1"""
+    for row in stats:
+        graded = row['responses'] - row['flagged']
+        yield {
+            'exam_title': row['exam_title'],
+            'exam_hash': row['exam_hash'],
+            'question': row['question_idx'] + 1,
+            'responses': row['responses'],
+            'answered': row['answered'],
+            'correct': row['correct'],
+            'flagged': row['flagged'],
+            'correct_rate': round(row['correct'] / graded, 3) if graded else None,
+            'mean_time': round(row['mean_time'], 1) if row['mean_time'] is not None else None,
+        }
+
+
+def write_rows(rows, fields, out, fmt='csv'):
+    """Stream dict rows to out as CSV or JSONL; returns the number written"""
+    count = 0
+    if fmt == 'jsonl':
+        for row in rows:
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+    writer = csv.DictWriter(out, fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+REPORT_STYLE = """
+body { font-family: 'Source Sans Pro', Arial, sans-serif; color: #1e293b; margin: 2rem; }
+h1 { margin-bottom: 0.2rem; }
+.subtitle { color: #64748b; margin-bottom: 1.5rem; }
+table { border-collapse: collapse; width: 100%; font-size: 0.85rem; }
+th, td { border-bottom: 1px solid #e2e8f0; padding: 0.3rem 0.5rem; text-align: left; }
+th { background: #f1f5f9; }
+td.num, th.num { text-align: right; }
+.page { page-break-after: always; }
+.page:last-child { page-break-after: auto; }
+.footer { color: #94a3b8; font-size: 0.75rem; margin-top: 0.5rem; }
+.bar { background: #667eea; height: 0.8rem; }
+@media print { body { margin: 0; } }
+"""
+
+
+def _table(out, columns, rows):
+    """Write one HTML table; columns are (key, heading, numeric) triples"""
+    classes = [' class="num"' if numeric else '' for _, _, numeric in columns]
+    out.write("<table><thead><tr>")
+    for (_, heading, _), cls in zip(columns, classes):
+        out.write(f"<th{cls}>{html.escape(heading)}</th>")
+    out.write("</tr></thead><tbody>\n")
+    for row in rows:
+        out.write("<tr>")
+        for (key, _, _), cls in zip(columns, classes):
+            value = row[key]
+            out.write(f"<td{cls}>{html.escape('' if value is None else str(value))}</td>")
+        out.write("</tr>\n")
+    out.write("</tbody></table>\n")
+
+
+def _pages(rows, page_size):
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+SCORE_COLUMNS = [('rank', "#", True), ('user_id', "Candidate", False), ('exam_title', "Exam", False),
+                 ('finished_at', "Finished", False), ('minutes', "Minutes", True), ('correct', "Correct", True),
+                 ('total', "Total", True), ('flagged', "Flagged", True), ('percentage', "Score %", True)]
+
+QUESTION_COLUMNS = [('exam_title', "Exam", False), ('question', "Question", True),
+                    ('responses', "Responses", True), ('correct', "Correct", True), ('flagged', "Flagged", True),
+                    ('correct_rate', "Correct rate", True), ('mean_time', "Mean time (s)", True)]
+
+
+def write_report(store, out, exam_title=None, since=None, until=None, page_size=REPORT_PAGE_SIZE,
+                 chunk_size=EXPORT_CHUNK_SIZE):
+    """Write a printable HTML report: a summary page, score sheet pages and question breakdown pages
+
+    Only one page of rows is held at a time; the page count comes from the summary query.
+    """
+    summary = store.export_summary(exam_title, since, until)
+    pages = max(1, math.ceil(summary['attempts'] / page_size))
+    title = exam_title or "All exams"
+    period = ""
+    if summary['attempts']:
+        period = f"{_timestamp(summary['first_finished'])} – {_timestamp(summary['last_finished'])}"
+
+    out.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)} results</title>"
+              f"<style>{REPORT_STYLE}</style></head><body>\n")
+
+    out.write("<section class=\"page\">\n")
+    out.write(f"<h1>{html.escape(title)}</h1><div class=\"subtitle\">{html.escape(period)}</div>\n")
+    if summary['attempts']:
+        overview = [
+            {'label': "Attempts", 'value': summary['attempts']},
+            {'label': "Candidates", 'value': summary['candidates']},
+            {'label': "Average score", 'value': f"{summary['average']:.1f}%"},
+            {'label': "Best score", 'value': f"{summary['best']:.1f}%"},
+            {'label': "Worst score", 'value': f"{summary['worst']:.1f}%"},
+        ]
+        _table(out, [('label', "", False), ('value', "", True)], overview)
+        out.write("<h2>Score distribution</h2>\n<table>")
+        width = 100 // len(summary['histogram'])
+        most = max(summary['histogram'])
+        for low, count in zip(range(0, 100, width), summary['histogram']):
+            out.write(f"<tr><td>{low}–{low + width}%</td><td class=\"num\">{count}</td>"
+                      f"<td style=\"width: 60%\"><div class=\"bar\" style=\"width: {count / most * 100:.1f}%\"></div></td></tr>\n")
+        out.write("</table>\n")
+    else:
+        out.write("<p>No attempts match these filters.</p>\n")
+    out.write("</section>\n")
+
+    rows = attempt_rows(store.export_attempts(exam_title, since, until, chunk_size))
+    ranked = (dict(row, rank=rank) for rank, row in enumerate(rows, 1))
+    for number, page in enumerate(_pages(ranked, page_size), 1):
+        out.write("<section class=\"page\"><h2>Score sheet</h2>\n")
+        _table(out, SCORE_COLUMNS, page)
+        out.write(f"<div class=\"footer\">{html.escape(title)} · page {number} of {pages}</div></section>\n")
+
+    for page in _pages(question_rows(store.export_question_stats(exam_title, since, until, chunk_size)), page_size):
+        out.write("<section class=\"page\"><h2>Question breakdown</h2>\n")
+        _table(out, QUESTION_COLUMNS, page)
+        out.write("</section>\n")
+
+    out.write("</body></html>\n")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export recorded exam results")
+    parser.add_argument('--db', default=DB_PATH, help="attempt database")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('attempts', "per-candidate score sheet (.csv or .jsonl)"),
+                            ('questions', "per-question breakdown (.csv or .jsonl)"),
+                            ('report', "printable HTML report")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('-o', '--output', help="output file (default: stdout)")
+        command.add_argument('--title', help="exam title, or a glob pattern such as 'Mock*'")
+        command.add_argument('--since', help="first finish date to include, YYYY-MM-DD")
+        command.add_argument('--until', help="last finish date to include, YYYY-MM-DD")
+        command.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="rows read per query")
+        if name == 'report':
+            command.add_argument('--page-size', type=int, default=REPORT_PAGE_SIZE, help="table rows per page")
+    args = parser.parse_args(argv)
+
+    store = AttemptStore(args.db)
+    since, until = date_range(args.since, args.until)
+    fmt = 'jsonl' if args.output and args.output.lower().endswith('.jsonl') else 'csv'
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if args.command == 'attempts':
+            rows = attempt_rows(store.export_attempts(args.title, since, until, args.chunk_size))
+            count = write_rows(rows, ATTEMPT_FIELDS, out, fmt)
+        elif args.command == 'questions':
+            count = write_rows(question_rows(store.export_question_stats(args.title, since, until, args.chunk_size)),
+                               QUESTION_FIELDS, out, fmt)
+        else:
+            count = write_report(store, out, args.title, since, until, args.page_size, args.chunk_size)['attempts']
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {count} {'questions' if args.command == 'questions' else 'attempts'}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
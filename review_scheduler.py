@@ -0,0 +1,190 @@
+"""
+Spaced-repetition review scheduling
+Every question a candidate answers is scheduled with an SM-2 style algorithm. Card
+state is persisted in SQLite; each active user's due queue is held as a heap in memory,
+so the next due question is an O(log n) pop even with tens of thousands of cards
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from attempt_store import DB_PATH, POOL_SIZE, SqliteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_cards (
+    user_id       TEXT NOT NULL,
+    exam_hash     TEXT NOT NULL,
+    question_idx  INTEGER NOT NULL,
+    easiness      REAL NOT NULL,
+    interval_days REAL NOT NULL,
+    repetitions   INTEGER NOT NULL,
+    due_at        REAL NOT NULL,
+    reviewed_at   REAL NOT NULL,
+    PRIMARY KEY (user_id, exam_hash, question_idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_review_cards_due ON review_cards (user_id, due_at);
+"""
+
+DAY = 86400
+
+# SM-2 parameters
+INITIAL_EASINESS = 2.5
+MIN_EASINESS = 1.3
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+
+# A missed question comes back within the same session rather than tomorrow
+RELEARN_DELAY = 10 * 60
+
+# Response times used to grade correct answers: fast recall scores higher
+FAST_ANSWER_SECONDS = 20
+SLOW_ANSWER_SECONDS = 60
+
+
+def grade(answer, is_correct, time_spent=None):
+    """SM-2 quality (0-5) for one response"""
+    if answer is None:
+        return 0
+    if not is_correct:
+        return 1
+    if time_spent is None:
+        return 4
+    if time_spent <= FAST_ANSWER_SECONDS:
+        return 5
+    if time_spent <= SLOW_ANSWER_SECONDS:
+        return 4
+    return 3
+
+
+def sm2(easiness, interval_days, repetitions, quality):
+    """Next (easiness, interval_days, repetitions) for a review of the given quality"""
+    easiness = max(MIN_EASINESS, easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return easiness, 0, 0
+    repetitions += 1
+    if repetitions == 1:
+        interval_days = FIRST_INTERVAL_DAYS
+    elif repetitions == 2:
+        interval_days = SECOND_INTERVAL_DAYS
+    else:
+        interval_days = round(interval_days * easiness)
+    return easiness, interval_days, repetitions
+
+
+class ReviewScheduler(SqliteStore):
+    """Per-user spaced-repetition queues over (exam_hash, question_idx) cards
+
+    SQLite is the source of truth. A user's heap is built from it on first use and kept
+    for max_users recently active users; updates are written through to both.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, path=DB_PATH, pool_size=POOL_SIZE, max_users=256):
+        super().__init__(path, pool_size)
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        # user_id -> (heap of (due_at, exam_hash, idx), {(exam_hash, idx): due_at})
+        self._queues = OrderedDict()
+
+    def _queue(self, user_id):
+        """Return the user's (heap, due) pair, loading it from disk if needed; caller holds the lock"""
+        queue = self._queues.get(user_id)
+        if queue is not None:
+            self._queues.move_to_end(user_id)
+            return queue
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT due_at, exam_hash, question_idx FROM review_cards WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        heap = [tuple(row) for row in rows]
+        heapq.heapify(heap)
+        queue = (heap, {(exam_hash, idx): due_at for due_at, exam_hash, idx in heap})
+        self._queues[user_id] = queue
+        while len(self._queues) > self.max_users:
+            self._queues.popitem(last=False)
+        return queue
+
+    def review(self, user_id, reviews, now=None):
+        """Apply a batch of (exam_hash, question_idx, quality) reviews in one transaction"""
+        now = now or time.time()
+        reviews = list(reviews)
+        if not reviews:
+            return
+        updated = []
+        # The lock spans the write so a concurrent _queue load cannot see these rows and then
+        # have them pushed a second time, and a suspend cannot be undone by a stale push
+        with self._lock:
+            with self.transaction() as conn:
+                for exam_hash, idx, quality in reviews:
+                    row = conn.execute(
+                        """SELECT easiness, interval_days, repetitions FROM review_cards
+                           WHERE user_id = ? AND exam_hash = ? AND question_idx = ?""",
+                        (user_id, exam_hash, idx)
+                    ).fetchone()
+                    state = tuple(row) if row else (INITIAL_EASINESS, 0, 0)
+                    easiness, interval_days, repetitions = sm2(*state, quality)
+                    due_at = now + (interval_days * DAY if repetitions else RELEARN_DELAY)
+                    conn.execute(
+                        """INSERT OR REPLACE INTO review_cards
+                           (user_id, exam_hash, question_idx, easiness, interval_days, repetitions, due_at,
+                            reviewed_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (user_id, exam_hash, idx, easiness, interval_days, repetitions, due_at, now)
+                    )
+                    updated.append((due_at, exam_hash, idx))
+
+            if user_id not in self._queues:
+                return
+            heap, due = self._queues[user_id]
+            for due_at, exam_hash, idx in updated:
+                due[(exam_hash, idx)] = due_at
+                heapq.heappush(heap, (due_at, exam_hash, idx))
+
+    def suspend(self, user_id, cards):
+        """Stop scheduling (exam_hash, question_idx) cards, e.g. questions flagged as irrelevant"""
+        cards = list(cards)
+        with self._lock:
+            with self.transaction() as conn:
+                conn.executemany(
+                    "DELETE FROM review_cards WHERE user_id = ? AND exam_hash = ? AND question_idx = ?",
+                    ((user_id, exam_hash, idx) for exam_hash, idx in cards)
+                )
+            if user_id in self._queues:
+                _, due = self._queues[user_id]
+                for card in cards:
+                    due.pop(card, None)
+
+    def due(self, user_id, limit=50, now=None):
+        """Up to limit (exam_hash, question_idx) cards due by now, most overdue first"""
+        now = now or time.time()
+        cards = []
+        with self._lock:
+            heap, due = self._queue(user_id)
+            while heap and len(cards) < limit and heap[0][0] <= now:
+                entry = heapq.heappop(heap)
+                due_at, exam_hash, idx = entry
+                # Entries superseded by a later review or suspension are dropped here
+                if due.get((exam_hash, idx)) != due_at:
+                    continue
+                cards.append(entry)
+            for entry in cards:
+                heapq.heappush(heap, entry)
+        return [(exam_hash, idx) for _, exam_hash, idx in cards]
+
+    def next_due_at(self, user_id):
+        """Epoch time the user's next card falls due, or None if nothing is scheduled"""
+        with self._lock:
+            heap, due = self._queue(user_id)
+            while heap and due.get((heap[0][1], heap[0][2])) != heap[0][0]:
+                heapq.heappop(heap)
+            return heap[0][0] if heap else None
+
+    def due_count(self, user_id, now=None):
+        """Number of cards due by now"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM review_cards WHERE user_id = ? AND due_at <= ?",
+                (user_id, now or time.time())
+            ).fetchone()[0]
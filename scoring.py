@@ -0,0 +1,63 @@
+"""
+Incremental exam scoring
+Scores are accumulated as answers and flags are submitted, so reading them is O(1)
+"""
+
+UNKNOWN_DIFFICULTY = 'unknown'
+
+
+class ScoreTally:
+    """Running score for one attempt"""
+
+    def __init__(self, total_questions):
+        self.total_questions = total_questions
+        self.correct = 0
+        self.answered = 0
+        self.flagged = 0
+        self.by_difficulty = {}
+
+    def _bucket(self, difficulty):
+        key = difficulty or UNKNOWN_DIFFICULTY
+        bucket = self.by_difficulty.get(key)
+        if bucket is None:
+            bucket = self.by_difficulty[key] = {'correct': 0, 'answered': 0, 'flagged': 0}
+        return bucket
+
+    def record_answer(self, is_correct, difficulty=None):
+        """Count a submitted answer"""
+        bucket = self._bucket(difficulty)
+        self.answered += 1
+        bucket['answered'] += 1
+        if is_correct:
+            self.correct += 1
+            bucket['correct'] += 1
+
+    def record_flag(self, difficulty=None):
+        """Count a question flagged as irrelevant; it no longer counts towards the total"""
+        self.flagged += 1
+        self._bucket(difficulty)['flagged'] += 1
+
+    @property
+    def valid_total(self):
+        return self.total_questions - self.flagged
+
+    @property
+    def percentage(self):
+        return (self.correct / self.valid_total * 100) if self.valid_total > 0 else 0
+
+    def score(self):
+        """Return (correct, valid_total, percentage), as calculate_score did"""
+        return self.correct, self.valid_total, self.percentage
+
+    @classmethod
+    def from_answers(cls, questions, answers, flagged):
+        """Rebuild a tally from recorded answers, e.g. when resuming an attempt"""
+        tally = cls(len(questions))
+        for idx in flagged:
+            tally.record_flag(questions[idx].get('difficulty'))
+        for idx, answer in answers.items():
+            if idx in flagged:
+                continue
+            question = questions[idx]
+            tally.record_answer(answer == question['correct_answer'], question.get('difficulty'))
+        return tally
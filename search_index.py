@@ -0,0 +1,315 @@
+"""
+Full-text question index across banks
+Questions, options and explanations from every indexed bank go into a SQLite FTS5
+inverted index with BM25 ranking. Difficulty and tag filters use ordinary B-tree
+indexes, and results export straight into the exam JSON schema
+
+    python search_index.py index exam1.json exam2.json
+    python search_index.py search "rotator cuff" --difficulty medium
+    python search_index.py assemble "rotator cuff, gait" -n 40 --mix medium=0.6,easy=0.2,hard=0.2 \\
+        --title "Shoulder and Gait" -o exam.json
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from attempt_store import SqliteStore
+from exam_registry import content_hash, thaw
+from exam_schema import OPTION_KEYS, difficulty_breakdown, validate_exam
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DB_PATH = os.environ.get("PHYSIO_SEARCH_DB_PATH", "question_index.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS banks (
+    exam_hash       TEXT PRIMARY KEY,
+    exam_title      TEXT NOT NULL,
+    question_count  INTEGER NOT NULL,
+    indexed_at      REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id            INTEGER PRIMARY KEY,
+    exam_hash     TEXT NOT NULL,
+    question_idx  INTEGER NOT NULL,
+    difficulty    TEXT,
+    payload       TEXT NOT NULL,
+    UNIQUE (exam_hash, question_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions (difficulty);
+
+CREATE TABLE IF NOT EXISTS question_tags (
+    tag          TEXT NOT NULL,
+    question_id  INTEGER NOT NULL,
+    PRIMARY KEY (tag, question_id)
+) WITHOUT ROWID;
+
+-- Contentless: the text lives in questions.payload, the FTS table holds only the postings
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+    question, options, explanations,
+    content='', tokenize='porter unicode61'
+);
+"""
+
+# Column weights for BM25: matches in the stem count most, explanations least
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+    'of', 'on', 'or', 'questions', 'the', 'to', 'with', 'mostly', 'about',
+}
+
+_PHRASE = re.compile(r'"([^"]+)"')
+_WORD = re.compile(r"\w+")
+
+
+def question_tags(question):
+    """Normalised tags from a question's 'tags' list and 'topic' field"""
+    tags = question.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tags]
+    topic = question.get('topic')
+    if topic:
+        tags = [*tags, topic]
+    return sorted({str(tag).strip().lower() for tag in tags if str(tag).strip()})
+
+
+def to_fts_query(text):
+    """Turn free text into an FTS5 query: quoted phrases stay phrases, other words are OR-ed"""
+    terms = [f'"{phrase.strip()}"' for phrase in _PHRASE.findall(text) if phrase.strip()]
+    rest = _PHRASE.sub(' ', text)
+    terms += [f'"{word}"' for word in _WORD.findall(rest.lower()) if word not in STOPWORDS]
+    return " OR ".join(terms)
+
+
+class SearchIndex(SqliteStore):
+    """On-disk inverted index over all indexed question banks"""
+
+    schema = SCHEMA
+
+    def __init__(self, path=SEARCH_DB_PATH, pool_size=4):
+        super().__init__(path, pool_size)
+        self._pending = {}
+        self._lock = threading.Lock()
+        # One writer thread: index transactions serialise on SQLite anyway
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+
+    def submit(self, exam_hash, exam_data):
+        """Index a bank on a background thread so loading it never waits on the index"""
+        with self._lock:
+            future = self._pending.get(exam_hash)
+            if future is None:
+                future = self._pending[exam_hash] = self._executor.submit(self._index_in_background,
+                                                                          exam_hash, exam_data)
+            return future
+
+    def _index_in_background(self, exam_hash, exam_data):
+        try:
+            return self.index_exam(exam_hash, exam_data)
+        except Exception:
+            logger.exception("could not index exam %s", exam_hash)
+            return False
+        finally:
+            with self._lock:
+                self._pending.pop(exam_hash, None)
+
+    def indexing(self):
+        """Number of banks queued or being indexed"""
+        with self._lock:
+            return len(self._pending)
+
+    def is_indexed(self, exam_hash):
+        with self.connection() as conn:
+            return conn.execute("SELECT 1 FROM banks WHERE exam_hash = ?", (exam_hash,)).fetchone() is not None
+
+    def index_exam(self, exam_hash, exam_data):
+        """Add every question of a bank in one transaction; no-op if already indexed"""
+        if self.is_indexed(exam_hash):
+            return False
+        questions = exam_data['questions']
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM banks WHERE exam_hash = ?", (exam_hash,)).fetchone():
+                return False
+            conn.execute(
+                "INSERT INTO banks (exam_hash, exam_title, question_count, indexed_at) VALUES (?, ?, ?, ?)",
+                (exam_hash, exam_data['exam_title'], len(questions), time.time())
+            )
+            start = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM questions").fetchone()[0]
+            rows = []
+            fts_rows = []
+            tag_rows = []
+            for idx, q in enumerate(questions):
+                q = thaw(q)
+                question_id = start + idx
+                rows.append((question_id, exam_hash, idx, q.get('difficulty'), json.dumps(q, ensure_ascii=False)))
+                fts_rows.append((
+                    question_id,
+                    q['question'],
+                    " ".join(q['options'][opt] for opt in OPTION_KEYS),
+                    " ".join(q['explanations'][opt] for opt in OPTION_KEYS),
+                ))
+                tag_rows.extend((tag, question_id) for tag in question_tags(q))
+            conn.executemany(
+                "INSERT INTO questions (id, exam_hash, question_idx, difficulty, payload) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.executemany(
+                "INSERT INTO questions_fts (rowid, question, options, explanations) VALUES (?, ?, ?, ?)",
+                fts_rows
+            )
+            conn.executemany("INSERT OR IGNORE INTO question_tags (tag, question_id) VALUES (?, ?)", tag_rows)
+        return True
+
+    def search(self, text, difficulty=None, tags=None, exam_hashes=None, limit=50, exclude_ids=()):
+        """Ranked hits as dicts with id, exam_hash, question_idx, difficulty, score and question"""
+        fts_query = to_fts_query(text)
+        if not fts_query:
+            return []
+
+        clauses = ["questions_fts MATCH ?"]
+        params = [fts_query]
+        if difficulty:
+            difficulties = [difficulty] if isinstance(difficulty, str) else list(difficulty)
+            clauses.append(f"q.difficulty IN ({', '.join('?' * len(difficulties))})")
+            params.extend(difficulties)
+        if exam_hashes:
+            clauses.append(f"q.exam_hash IN ({', '.join('?' * len(exam_hashes))})")
+            params.extend(exam_hashes)
+        if exclude_ids:
+            clauses.append(f"q.id NOT IN ({', '.join('?' * len(exclude_ids))})")
+            params.extend(exclude_ids)
+        for tag in tags or ():
+            clauses.append("q.id IN (SELECT question_id FROM question_tags WHERE tag = ?)")
+            params.append(tag.strip().lower())
+        params.append(limit)
+
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        sql = f"""
+            SELECT q.id, q.exam_hash, q.question_idx, q.difficulty, q.payload,
+                   bm25(questions_fts, {weights}) AS score
+            FROM questions_fts JOIN questions q ON q.id = questions_fts.rowid
+            WHERE {' AND '.join(clauses)}
+            ORDER BY score
+            LIMIT ?
+        """
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        hits = []
+        for row in rows:
+            hit = dict(row)
+            hit['question'] = json.loads(hit.pop('payload'))
+            hits.append(hit)
+        return hits
+
+    def assemble(self, text, total, difficulty_mix=None, tags=None, fill=False):
+        """Pick the best-ranked questions for a query, honouring a difficulty mix
+
+        difficulty_mix maps difficulty to its share of the exam (e.g. {'medium': 0.6,
+        'easy': 0.2, 'hard': 0.2}). Returns (hits, shortfall), where shortfall maps each
+        difficulty with too few matching questions to how many it is short. With fill,
+        those places go to the best remaining hits of any difficulty instead.
+        """
+        if not difficulty_mix:
+            return self.search(text, tags=tags, limit=total), {}
+
+        # Largest-remainder rounding, so the quotas add up to total
+        weight_sum = sum(difficulty_mix.values())
+        exact = {difficulty: total * weight / weight_sum for difficulty, weight in difficulty_mix.items()}
+        quotas = {difficulty: int(share) for difficulty, share in exact.items()}
+        for difficulty in sorted(exact, key=lambda d: quotas[d] - exact[d])[:total - sum(quotas.values())]:
+            quotas[difficulty] += 1
+
+        chosen = []
+        shortfall = {}
+        for difficulty, quota in quotas.items():
+            hits = self.search(text, difficulty=difficulty, tags=tags, limit=quota,
+                               exclude_ids=[h['id'] for h in chosen])
+            if len(hits) < quota:
+                shortfall[difficulty] = quota - len(hits)
+            chosen += hits
+        if fill and len(chosen) < total:
+            chosen += self.search(text, tags=tags, limit=total - len(chosen),
+                                  exclude_ids=[h['id'] for h in chosen])
+        return chosen[:total], shortfall
+
+
+def hits_to_exam(hits, exam_title, **extra):
+    """Export search hits into the exam JSON schema"""
+    questions = [hit['question'] for hit in hits]
+    return {
+        'exam_title': exam_title,
+        'total_questions': len(questions),
+        'difficulty_breakdown': difficulty_breakdown(questions),
+        'questions': questions,
+        **extra,
+    }
+
+
+def parse_mix(text):
+    """Parse 'medium=0.6,easy=0.2' into a dict"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip().lower()] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search question banks and assemble custom exams")
+    parser.add_argument('--db', default=SEARCH_DB_PATH, help="index database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index_cmd = commands.add_parser('index', help="add exam JSON files to the index")
+    index_cmd.add_argument('exams', nargs='+')
+
+    search_cmd = commands.add_parser('search', help="ranked search")
+    search_cmd.add_argument('query')
+    search_cmd.add_argument('--difficulty')
+    search_cmd.add_argument('--tag', action='append')
+    search_cmd.add_argument('-n', '--limit', type=int, default=20)
+
+    assemble_cmd = commands.add_parser('assemble', help="build an exam from a query")
+    assemble_cmd.add_argument('query')
+    assemble_cmd.add_argument('-n', '--total', type=int, required=True)
+    assemble_cmd.add_argument('--mix', type=parse_mix, help="difficulty shares, e.g. medium=0.6,easy=0.2,hard=0.2")
+    assemble_cmd.add_argument('--tag', action='append')
+    assemble_cmd.add_argument('--fill', action='store_true',
+                              help="top up difficulties that run short with other matching questions")
+    assemble_cmd.add_argument('--title', required=True)
+    assemble_cmd.add_argument('-o', '--output', required=True)
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(args.db)
+    if args.command == 'index':
+        for path in args.exams:
+            with open(path, 'rb') as f:
+                data = f.read()
+            added = index.index_exam(content_hash(data), validate_exam(json.loads(data)))
+            print(f"{path}: {'indexed' if added else 'already indexed'}", file=sys.stderr)
+    elif args.command == 'search':
+        started = time.perf_counter()
+        hits = index.search(args.query, difficulty=args.difficulty, tags=args.tag, limit=args.limit)
+        for hit in hits:
+            print(f"{hit['score']:8.2f}  [{hit['difficulty'] or '-'}]  {hit['question']['question'][:100]}")
+        print(f"{len(hits)} hits in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+    else:
+        hits, shortfall = index.assemble(args.query, args.total, difficulty_mix=args.mix, tags=args.tag,
+                                         fill=args.fill)
+        for difficulty, missing in shortfall.items():
+            print(f"{difficulty}: {missing} short of its quota{' (topped up)' if args.fill else ''}",
+                  file=sys.stderr)
+        exam = hits_to_exam(hits, args.title, source_query=args.query)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(exam, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {len(hits)} questions to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Shared test setup
+The app modules read their storage paths from the environment at import time, so every
+store is pointed at a scratch directory before any test module imports them
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_SCRATCH = tempfile.mkdtemp(prefix="physio-tests-")
+for _name, _leaf in (("PHYSIO_DB_PATH", "attempts.db"), ("PHYSIO_SEARCH_DB_PATH", "index.db"),
+                     ("PHYSIO_JOURNAL_DIR", "journals"), ("PHYSIO_BANK_DIR", "banks"),
+                     ("PHYSIO_PAGE_CACHE_DIR", "pages"), ("PHYSIO_IMAGE_CACHE_DIR", "images"),
+                     ("PHYSIO_CATALOG_DIR", "catalog")):
+    os.environ.setdefault(_name, os.path.join(_SCRATCH, _leaf))
+
+
+@pytest.fixture
+def make_exam():
+    """Factory for small exams in the JSON schema; question i has answer 'ABCD'[i % 4]"""
+    def make(count=6, title="Test Exam"):
+        questions = [
+            {
+                'question': f"Question {i}: which structure is tested in scenario {i}?",
+                'options': {opt: f"Option {opt} for question {i}" for opt in 'ABCD'},
+                'explanations': {opt: f"Why {opt} fits question {i}" for opt in 'ABCD'},
+                'correct_answer': 'ABCD'[i % 4],
+                'difficulty': ('easy', 'medium', 'hard')[i % 3],
+            }
+            for i in range(count)
+        ]
+        return {'exam_title': title, 'questions': questions}
+    return make
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from answer_sheet import HEADER, AnswerSheet
+from item_analysis import FLAGGED, UNANSWERED
+
+
+@pytest.fixture
+def sheet():
+    sheet = AnswerSheet(11)
+    sheet.set_answer(0, 'B')
+    sheet.set_answer(9, 'D')
+    sheet.set_answer(9, 'A')
+    sheet.flag(3)
+    sheet.flag(10)
+    sheet.flag(10)
+    sheet.reveal(0)
+    return sheet
+
+
+def test_counts_and_accessors(sheet):
+    assert sheet.answered_count == 2
+    assert sheet.flagged_count == 2
+    assert sheet.answer(9) == 'A' and sheet.answer(1) is None
+    assert sheet.is_closed(3) and not sheet.is_closed(4)
+    assert sheet.is_revealed(0) and not sheet.is_revealed(9)
+    assert list(sheet.answers()) == [(0, 'B'), (9, 'A')]
+    assert sheet.flagged() == [3, 10]
+
+
+def test_codes_use_the_item_analysis_encoding(sheet):
+    codes = sheet.codes()
+    assert codes.dtype == np.int8
+    assert codes[0] == 1 and codes[9] == 0
+    assert codes[3] == FLAGGED and codes[10] == FLAGGED
+    assert codes[1] == UNANSWERED
+
+
+def test_bytes_round_trip(sheet):
+    data = sheet.to_bytes()
+    assert len(data) == HEADER.size + 11 + 2 * 2
+    restored = AnswerSheet.from_bytes(data)
+    assert restored == sheet
+    assert restored.answered_count == 2 and restored.flagged_count == 2
+    assert restored.is_revealed(0)
+
+
+@pytest.mark.parametrize('change', [lambda data: data[:-1], lambda data: data + b'\0',
+                                    lambda data: b'XXXX' + data[4:]])
+def test_malformed_bytes_are_rejected(sheet, change):
+    with pytest.raises(ValueError):
+        AnswerSheet.from_bytes(change(sheet.to_bytes()))
+
+
+def test_from_answers_reveals_answered_questions():
+    sheet = AnswerSheet.from_answers(4, {1: 'C', 2: 'A'}, flagged=[3])
+    assert [sheet.is_revealed(idx) for idx in range(4)] == [False, True, True, False]
+    assert sheet.flagged() == [3]
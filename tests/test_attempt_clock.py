@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+
+from attempt_clock import DeadlineSweeper, watchdog_interval
+
+
+@pytest.mark.parametrize('target, now, expected', [
+    (100.0, 95.0, 6),
+    (100.0, 95.2, 6),
+    (100.0, 99.9, 2),
+    (100.0, 100.0, 1),
+    (100.0, 250.0, 1),
+])
+def test_watchdog_interval(target, now, expected):
+    assert watchdog_interval(target, now) == expected
+
+
+@pytest.mark.parametrize('now', [90.0, 90.01, 90.5, 90.99, 99.999])
+def test_watchdog_never_fires_before_the_target(now):
+    assert now + watchdog_interval(100.0, now) > 100.0
+
+
+def test_sweeper_expires_and_notifies():
+    sweeper = DeadlineSweeper()
+    expired = threading.Event()
+    sweeper.add_listener(lambda attempt_id: attempt_id == 'a' and expired.set())
+    sweeper.register('a', time.time() + 0.05)
+    sweeper.register('b', time.time() + 60)
+    assert expired.wait(5)
+    assert sweeper.is_expired('a')
+    assert not sweeper.is_expired('b')
+    assert sweeper.deadline('a') is None
+
+
+def test_cancelled_attempt_never_expires():
+    sweeper = DeadlineSweeper()
+    sweeper.register('a', time.time() + 0.05)
+    sweeper.cancel('a')
+    time.sleep(0.2)
+    assert not sweeper.is_expired('a')
@@ -0,0 +1,74 @@
+import pytest
+
+from attempt_journal import RECORD, AttemptJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return AttemptJournal(str(tmp_path), fsync_interval=60)
+
+
+def test_replay_rebuilds_the_sheet(journal):
+    journal.start('a1', question_count=5, exam_hash='h', user_id='u')
+    journal.record_answer('a1', 0, 'C')
+    journal.record_flag('a1', 2)
+    journal.record_answer('a1', 4, 'A')
+    journal.record_navigation('a1', 3)
+
+    state = journal.restore('a1')
+    sheet = state['sheet']
+    assert state['exam_hash'] == 'h' and state['user_id'] == 'u'
+    assert list(sheet.answers()) == [(0, 'C'), (4, 'A')]
+    assert sheet.flagged() == [2]
+    assert sheet.is_revealed(0) and not sheet.is_revealed(1)
+    assert state['current_question'] == 3
+    assert not state['finished']
+
+
+def test_snapshot_then_more_records(journal):
+    journal.start('a1', question_count=3)
+    journal.record_answer('a1', 0, 'B')
+    state = journal.restore('a1')
+    journal.snapshot(state)
+    journal.record_answer('a1', 1, 'D')
+    journal.record_finish('a1')
+
+    state = journal.restore('a1')
+    assert list(state['sheet'].answers()) == [(0, 'B'), (1, 'D')]
+    assert state['finished']
+
+
+def test_torn_final_record_is_ignored(journal, tmp_path):
+    journal.start('a1', question_count=3)
+    journal.record_answer('a1', 1, 'A')
+    with open(tmp_path / "a1.log", 'ab') as f:
+        f.write(RECORD.pack(1, 2, 3)[:-2])
+
+    state = journal.restore('a1')
+    assert list(state['sheet'].answers()) == [(1, 'A')]
+
+
+def test_legacy_state_without_a_question_count(journal):
+    journal.start('a1')
+    journal.record_answer('a1', 7, 'D')
+    journal.record_flag('a1', 2)
+    journal.record_flag('a1', 2)
+
+    state = journal.restore('a1')
+    assert state['answers'] == {7: 'D'}
+    assert state['flagged'] == [2]
+
+
+def test_discard_and_unknown_attempts(journal, tmp_path):
+    journal.start('a1', question_count=2)
+    journal.record_answer('a1', 0, 'A')
+    journal.discard('a1')
+    assert journal.restore('a1') is None
+    assert journal.restore('missing') is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_append_reports_when_a_snapshot_is_due(tmp_path):
+    journal = AttemptJournal(str(tmp_path), fsync_interval=60, snapshot_every=3)
+    journal.start('a1', question_count=5)
+    assert [journal.record_navigation('a1', idx) for idx in range(3)] == [False, False, True]
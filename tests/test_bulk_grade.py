@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from bulk_grade import encode_json_sheets, grade_stream
+
+
+@pytest.fixture
+def exam(make_exam):
+    # Answer key A B C D
+    return make_exam(4)
+
+
+def grade(path, exam, **kwargs):
+    rows = []
+    report = grade_stream(str(path), exam, rows.append, **kwargs)
+    return rows, report
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return path
+
+
+def test_json_sheets(tmp_path, exam):
+    path = write_lines(tmp_path / "sheets.jsonl", [
+        json.dumps({'candidate_id': 'c1', 'answers': ['A', 'B', 'C', 'D']}),
+        json.dumps({'candidate_id': 'c2', 'answers': {'1': 'a', '4': 'D'}, 'flagged': [2]}),
+    ])
+    rows, report = grade(path, exam)
+    assert rows == [('c1', 4, 4, 4, 0, 100.0), ('c2', 2, 3, 2, 1, 66.67)]
+    assert report['sheets'] == 2
+    assert report['invalid_sheets'] == 0 and report['invalid_marks'] == 0
+
+
+def test_unreadable_sheets_are_counted_and_skipped(tmp_path, exam):
+    path = write_lines(tmp_path / "sheets.jsonl", [
+        json.dumps({'candidate_id': 'c1', 'answers': ['A', 'B', 'C', 'D']}),
+        '{"candidate_id": "torn", "answers": [',
+        json.dumps(["A", "B"]),
+        json.dumps({'candidate_id': 'c2', 'answers': 17}),
+        json.dumps({'candidate_id': 'c3', 'answers': ['A'], 'flagged': 2}),
+        json.dumps({'candidate_id': 'c4', 'answers': ['B']}),
+    ])
+    rows, report = grade(path, exam)
+    assert [row[0] for row in rows] == ['c1', 'c4']
+    assert report['sheets'] == 2
+    assert report['invalid_sheets'] == 4
+
+
+def test_bad_question_numbers_are_invalid_marks(tmp_path, exam):
+    path = write_lines(tmp_path / "sheets.jsonl", [
+        json.dumps({'candidate_id': 'c1', 'answers': {'1': 'A', 'two': 'B', '9': 'C', '3': 'X'},
+                    'flagged': ['x', 0, 4]}),
+    ])
+    rows, report = grade(path, exam)
+    assert rows == [('c1', 1, 3, 1, 1, 33.33)]
+    assert report['invalid_marks'] == 5
+    assert report['invalid_sheets'] == 0
+
+
+def test_encode_json_sheets_trims_skipped_rows():
+    candidates, matrix, invalid, invalid_sheets = encode_json_sheets(['not json', '{"answers": ["A"]}'], 2)
+    assert candidates == ['']
+    assert matrix.shape == (1, 2)
+    assert (invalid, invalid_sheets) == (0, 1)
+
+
+def test_csv_sheets(tmp_path, exam):
+    path = write_lines(tmp_path / "sheets.csv", [
+        "candidate_id,Q1,Q2,Q3,Q4,Q9",
+        "c1,A,B,F,,A",
+        "c2,d,c,b,Z",
+    ])
+    rows, report = grade(path, exam)
+    assert rows == [('c1', 2, 3, 2, 1, 66.67), ('c2', 0, 4, 3, 0, 0.0)]
+    assert report['invalid_marks'] == 1
+
+
+@pytest.mark.parametrize('content', ["", "candidate_id,Q1,Q2\n"])
+def test_empty_csv_is_zero_sheets(tmp_path, exam, content):
+    path = tmp_path / "sheets.csv"
+    path.write_text(content, encoding='utf-8')
+    assert grade(path, exam) == ([], {'sheets': 0, 'invalid_sheets': 0})
+
+
+def test_workers_match_single_process(tmp_path, exam):
+    lines = [json.dumps({'candidate_id': f"c{i}", 'answers': ['ABCD'[(i + k) % 4] for k in range(4)]})
+             for i in range(50)]
+    lines[7] = "garbage"
+    path = write_lines(tmp_path / "sheets.jsonl", lines)
+    single = grade(path, exam, chunk_size=8)
+    parallel = grade(path, exam, workers=2, chunk_size=8)
+    assert single == parallel
+    assert single[1]['invalid_sheets'] == 1
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import dedup
+from dedup import SCAN_FAILED, DeduplicatingWriter, DuplicateScanner, MinHashLSH, find_duplicates, merge_duplicates
+
+STEM = ("A 45 year old runner presents with lateral knee pain that worsens when running downhill and "
+        "eases with rest after a long weekend of trail races in the hills; which structure is most "
+        "likely irritated")
+OPTIONS = {'A': "iliotibial band", 'B': "patellar tendon", 'C': "lateral meniscus", 'D': "popliteus"}
+
+
+def question(stem):
+    return {'question': stem, 'options': dict(OPTIONS), 'explanations': dict(OPTIONS), 'correct_answer': 'A'}
+
+
+@pytest.fixture
+def questions(make_exam):
+    # Question 0 is unrelated, 1 and 2 are exact copies, 3 is a rewording of 1 (similarity about 0.8)
+    return [make_exam(1)['questions'][0], question(STEM), question(STEM),
+            question(STEM.replace("worsens", "gets worse"))]
+
+
+def test_exact_copies_are_found(questions):
+    duplicates = find_duplicates(questions[:3])
+    assert [(idx, key) for idx, key, _ in duplicates] == [(2, '1')]
+    assert duplicates[0][2] == 1.0
+
+
+@pytest.mark.parametrize('threshold, expected', [(0.95, [2]), (0.7, [2, 3])])
+def test_empty_index_passed_in_is_used(questions, threshold, expected):
+    index = MinHashLSH(threshold=threshold)
+    duplicates = find_duplicates(questions, index)
+    assert [idx for idx, _, _ in duplicates] == expected
+    assert len(index) == len(questions)
+
+
+def test_key_prefix_checks_against_earlier_banks(questions):
+    index = MinHashLSH()
+    find_duplicates(questions[:2], index, key_prefix='old:')
+    assert [key for _, key, _ in find_duplicates(questions[2:3], index, key_prefix='new:')] == ['old:1']
+
+
+def test_merge_keeps_first_occurrence(make_exam, questions):
+    exam = dict(make_exam(0), questions=questions[:3])
+    merged, duplicates = merge_duplicates(exam)
+    assert merged['questions'] == questions[:2]
+    assert merged['total_questions'] == 2
+    assert len(duplicates) == 1
+
+
+def test_deduplicating_writer_uses_an_empty_index(questions):
+    class Collect(list):
+        write = list.append
+
+    index = MinHashLSH(threshold=0.7)
+    writer = DeduplicatingWriter(Collect(), index)
+    for q in questions:
+        writer.write(q)
+    assert writer.writer == questions[:2]
+    assert writer.skipped == 2
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize('threshold, expected', [('0.95', 1), ('0.7', 2)])
+def test_cli_threshold(tmp_path, capsys, make_exam, questions, threshold, expected):
+    path = tmp_path / "exam.json"
+    path.write_text(json.dumps(dict(make_exam(0), questions=questions)))
+    dedup.main([str(path), '--threshold', threshold])
+    assert f"{expected} near-duplicates in 4 questions" in capsys.readouterr().err
+
+
+def test_duplicate_scanner(questions):
+    scanner = DuplicateScanner(max_entries=1)
+    assert scanner.submit('exam', questions[:3]).result() == 1
+    assert scanner.count('exam', questions[:3]) == 1
+    scanner.submit('other', questions[:1]).result()
+    assert 'exam' not in scanner._futures
+
+
+def test_duplicate_scanner_contains_failures():
+    scanner = DuplicateScanner()
+    assert scanner.submit('broken', [{'question': "no options"}]).result() == SCAN_FAILED
+    assert scanner.count('broken', []) == SCAN_FAILED
@@ -0,0 +1,28 @@
+import os
+
+from disk_cache import prune_lru
+
+
+def write(directory, name, size, mtime):
+    path = directory / name[:2] / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_removes_oldest_first(tmp_path):
+    old = write(tmp_path, 'aa1', 100, 1000)
+    middle = write(tmp_path, 'bb2', 100, 2000)
+    new = write(tmp_path, 'aa3', 100, 3000)
+    assert prune_lru(tmp_path, 250) == 1
+    assert not old.exists() and middle.exists() and new.exists()
+    assert prune_lru(tmp_path, 250) == 0
+
+
+def test_prune_skips_files_being_written(tmp_path):
+    partial = write(tmp_path, 'aa1.123.tmp', 500, 1000)
+    entry = write(tmp_path, 'bb2', 100, 2000)
+    (tmp_path / 'stray').write_bytes(b'x' * 500)
+    assert prune_lru(tmp_path, 100) == 0
+    assert partial.exists() and entry.exists()
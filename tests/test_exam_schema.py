@@ -0,0 +1,43 @@
+import pytest
+
+from exam_schema import ExamValidationError, validate_exam, validate_question
+
+
+def test_valid_exam_gets_derived_fields(make_exam):
+    exam = validate_exam(make_exam(3))
+    assert exam['total_questions'] == 3
+    assert exam['difficulty_breakdown'] == {}
+
+
+@pytest.mark.parametrize('field, value', [
+    ('options', "ABCD"),
+    ('options', ['A', 'B', 'C', 'D']),
+    ('options', None),
+    ('explanations', "ABCD"),
+    ('explanations', 42),
+    ('correct_answer', ['A']),
+    ('correct_answer', {'A': 1}),
+    ('correct_answer', 0),
+    ('correct_answer', 'E'),
+    ('image', ""),
+    ('image', 7),
+])
+def test_bad_field_types_raise_validation_error(make_exam, field, value):
+    question = make_exam(1)['questions'][0]
+    question[field] = value
+    with pytest.raises(ExamValidationError):
+        validate_question(question)
+
+
+def test_missing_option_is_named(make_exam):
+    question = make_exam(1)['questions'][0]
+    del question['options']['C']
+    with pytest.raises(ExamValidationError, match="missing C"):
+        validate_question(question)
+
+
+@pytest.mark.parametrize('exam', [[], {'questions': []}, {'exam_title': "T", 'questions': []},
+                                  {'exam_title': "T", 'questions': "q"}])
+def test_bad_exam_shape(exam):
+    with pytest.raises(ExamValidationError):
+        validate_exam(exam)
@@ -0,0 +1,55 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from generation_client import GenerationClient, GenerationError
+
+
+@pytest.fixture
+def backend():
+    """Stub generation backend answering every POST with the body set in replies[0]"""
+    replies = [b'{}']
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            requests_seen.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(replies[0])))
+            self.end_headers()
+            self.wfile.write(replies[0])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/generate", replies, requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_generate_batch_returns_questions(backend, make_exam):
+    url, replies, requests_seen = backend
+    questions = make_exam(2)['questions']
+    replies[0] = json.dumps({'questions': questions, 'usage': {'output_tokens': 321}}).encode()
+    client = GenerationClient(url=url, backoff=0)
+    assert client.generate_batch(["chunk one", "chunk two"]) == questions
+    assert requests_seen[0]['chunks'] == ["chunk one", "chunk two"]
+    assert client.stats.summary()['output_tokens'] == 321
+
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'"questions"', b'{"usage": {}}', b'{"questions": {}}', b'not json'])
+def test_malformed_body_fails_the_batch_without_retrying(backend, body):
+    url, replies, requests_seen = backend
+    replies[0] = body
+    client = GenerationClient(url=url, backoff=0)
+    with pytest.raises(GenerationError):
+        client.generate_batch(["chunk"])
+    assert len(requests_seen) == 1
+    summary = client.stats.summary()
+    assert summary['failed_batches'] == 1 and summary['retries'] == 0
@@ -0,0 +1,110 @@
+import os
+import struct
+
+import pytest
+
+import exam_registry
+from exam_registry import ExamRegistry, content_hash, thaw
+from exam_schema import ExamValidationError
+from question_bank import HEADER, OFFSET, RECORD, QuestionBank, convert_exam, is_bank
+
+
+@pytest.fixture
+def bank_bytes(tmp_path, make_exam):
+    exam = make_exam(5)
+    exam['questions'][2]['image'] = "shoulder/xray.png"
+    path = tmp_path / "exam.pxqb"
+    convert_exam(exam, str(path))
+    return path.read_bytes()
+
+
+@pytest.fixture
+def bank_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "banks"
+    monkeypatch.setattr(exam_registry, 'BANK_DIR', str(directory))
+    return directory
+
+
+def test_round_trip(tmp_path, make_exam):
+    exam = make_exam(7)
+    path = tmp_path / "exam.pxqb"
+    convert_exam(exam, str(path))
+    bank = QuestionBank(str(path))
+    try:
+        assert len(bank) == 7
+        assert bank.meta['exam_title'] == "Test Exam"
+        loaded = thaw(bank.as_exam())
+        assert loaded['questions'] == exam['questions']
+        assert [bank.correct_answer(i) for i in range(7)] == [q['correct_answer'] for q in exam['questions']]
+    finally:
+        bank.close()
+
+
+def test_registry_loads_bank_bytes(bank_bytes, bank_dir):
+    assert is_bank(bank_bytes)
+    key, exam = ExamRegistry().load(bank_bytes)
+    assert key == content_hash(bank_bytes)
+    assert len(exam['questions']) == 5
+    assert exam['questions'][2]['image'] == "shoulder/xray.png"
+    assert os.listdir(bank_dir) == [key + '.pxqb']
+
+
+@pytest.mark.parametrize('length', [4, HEADER.size - 1, HEADER.size, HEADER.size + RECORD.size, -1])
+def test_truncated_bank_is_rejected_before_spooling(bank_bytes, bank_dir, length):
+    with pytest.raises(ExamValidationError):
+        ExamRegistry().load(bank_bytes[:length])
+    assert not bank_dir.exists() or not os.listdir(bank_dir)
+
+
+def test_invalid_correct_answer_is_rejected(bank_bytes, bank_dir):
+    data = bytearray(bank_bytes)
+    # The correct-answer byte follows the nine string ids of the first record
+    data[HEADER.size + 9 * 4] = 7
+    with pytest.raises(ExamValidationError, match="correct answer"):
+        ExamRegistry().load(bytes(data))
+
+
+def test_string_id_out_of_range_is_rejected(bank_bytes, bank_dir):
+    data = bytearray(bank_bytes)
+    struct.pack_into('<I', data, HEADER.size, 0xFFFF)
+    with pytest.raises(ExamValidationError):
+        ExamRegistry().load(bytes(data))
+
+
+def test_invalid_utf8_string_is_rejected(bank_bytes, bank_dir):
+    data = bytearray(bank_bytes)
+    data[-1] = 0xFF
+    with pytest.raises(ExamValidationError, match="UTF-8"):
+        ExamRegistry().load(bytes(data))
+
+
+def test_string_split_inside_a_character_is_rejected(tmp_path, make_exam, bank_dir):
+    exam = make_exam(3)
+    exam['questions'][0]['question'] = "Where is the pain felt during the test of Gaenslen é"
+    path = tmp_path / "exam.pxqb"
+    convert_exam(exam, str(path))
+    data = bytearray(path.read_bytes())
+    *_, string_count, _, _, offsets_offset, data_offset = HEADER.unpack_from(data, 0)
+    for string_id in range(1, string_count):
+        position = offsets_offset + OFFSET.size * string_id
+        (offset,) = OFFSET.unpack_from(data, position)
+        if data[data_offset + offset - 2:data_offset + offset] == "é".encode():
+            # Move the boundary so the next string starts on the é's continuation byte
+            OFFSET.pack_into(data, position, offset - 1)
+            break
+    else:
+        pytest.fail("no string ends with é")
+    with pytest.raises(ExamValidationError, match="splits a UTF-8 character"):
+        ExamRegistry().load(bytes(data))
+
+
+def test_bad_magic_is_not_a_bank(bank_bytes, bank_dir):
+    with pytest.raises(ValueError):
+        ExamRegistry().load(b'XXXX' + bank_bytes[4:])
+
+
+def test_question_bank_rejects_short_file(tmp_path):
+    path = tmp_path / "short.pxqb"
+    path.write_bytes(b'PXQB')
+    with pytest.raises(ExamValidationError):
+        QuestionBank(str(path))
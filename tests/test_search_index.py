@@ -0,0 +1,39 @@
+import pytest
+
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path, make_exam):
+    index = SearchIndex(str(tmp_path / "index.db"))
+    # Difficulties cycle easy, medium, hard
+    assert index.submit('bank', make_exam(9)).result()
+    return index
+
+
+def test_background_indexing(index, make_exam):
+    assert index.indexing() == 0
+    assert index.is_indexed('bank')
+    assert not index.submit('bank', make_exam(9)).result()
+    assert len(index.search("structure scenario", limit=20)) == 9
+
+
+def test_background_indexing_failure_is_contained(index):
+    assert not index.submit('broken', {'exam_title': "Broken", 'questions': [{'question': "q"}]}).result()
+    assert not index.is_indexed('broken')
+    assert index.indexing() == 0
+
+
+def test_assemble_reports_shortfall(index):
+    # Quotas of 4 easy and 3 medium against 3 questions of each
+    hits, shortfall = index.assemble("structure scenario", 7, difficulty_mix={'easy': 1, 'medium': 1})
+    assert shortfall == {'easy': 1}
+    assert len(hits) == 6
+    assert {hit['difficulty'] for hit in hits} == {'easy', 'medium'}
+
+
+def test_assemble_fill_tops_up(index):
+    hits, shortfall = index.assemble("structure scenario", 7, difficulty_mix={'easy': 1, 'medium': 1}, fill=True)
+    assert shortfall == {'easy': 1}
+    assert len(hits) == 7
+    assert sum(hit['difficulty'] == 'hard' for hit in hits) == 1